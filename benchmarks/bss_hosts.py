@@ -0,0 +1,169 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Benchmark of streamed, field filtered BSS hosts ingestion against
+decoding the whole BSS hosts response at once, on a synthetic system.
+
+A BSS hosts response for the requested number of hosts (a small
+fraction of them non-compute) is generated.  It is ingested both the
+old way (decode the whole document, keep every host dictionary) and
+the new way (parse the response in 64KiB chunks, keep only the fields
+CRUS uses, for compute hosts only).  The time taken and the peak
+memory allocated are reported.  Run it from the top of the source
+tree:
+
+    python benchmarks/bss_hosts.py [host_count]
+
+The JSON parser is loaded straight from its source file so that the
+benchmark does not need the CRUS application (and ETCD) to be set up.
+
+"""
+import codecs
+import importlib.util
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+SOURCE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..",
+    "crus", "controllers", "upgrade_agent"
+)
+
+CHUNK_SIZE = 64 * 1024
+NON_COMPUTE_EVERY = 32
+
+
+def load(name, path):
+    """Load a module from its source file.
+
+    """
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SOURCE_DIR, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Host:
+    """The same record as bss_hosts.BSSHost, which cannot be imported
+    without the CRUS application.
+
+    """
+    __slots__ = ['nid', 'role', 'state', 'flag', 'enabled']
+
+    def __init__(self, host):
+        self.nid = host['NID']
+        self.role = sys.intern(host['Role'])
+        self.state = sys.intern(host['State'])
+        self.flag = sys.intern(host['Flag'])
+        self.enabled = host['Enabled']
+
+
+def synthetic_hosts(count):
+    """Generate the body of a BSS hosts response for 'count' hosts.
+
+    """
+    hosts = []
+    for nid in range(1, count + 1):
+        cabinet, rest = divmod(nid - 1, 256)
+        chassis, rest = divmod(rest, 32)
+        slot, node = divmod(rest, 4)
+        hosts.append({
+            "ID": "x%dc%ds%db0n%d" % (1000 + cabinet, chassis, slot, node),
+            "NID": nid,
+            "State": "Ready",
+            "Flag": "OK",
+            "Type": "Node",
+            "Enabled": True,
+            "Role": "Application" if nid % NON_COMPUTE_EVERY == 0 else "Compute",
+            "NetType": "Sling",
+            "Arch": "X86",
+            "FQDN": "nid%06d.local" % nid,
+            "MAC": ["a4:bf:01:%02x:%02x:19" % divmod(nid % 65536, 256),
+                    "a4:bf:01:%02x:%02x:1a" % divmod(nid % 65536, 256)]
+        })
+    return json.dumps(hosts).encode('utf-8')
+
+
+def chunked(body):
+    """Generate the body in pieces the way a streamed response would.
+
+    """
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start:start + CHUNK_SIZE]
+
+
+def whole(body):
+    """Ingest the way BSSHostTable used to: decode everything, keep every
+    host dictionary.
+
+    """
+    text = b"".join(chunked(body)).decode('utf-8')
+    return {host['ID']: host for host in json.loads(text)}
+
+
+def streamed(body, json_stream):
+    """Ingest the way BSSHostTable does now.
+
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = (decoder.decode(chunk) for chunk in chunked(body))
+    return {
+        sys.intern(host['ID']): Host(host)
+        for host in json_stream.iter_json_array(chunks)
+        if host['Role'] == "Compute"
+    }
+
+
+def measure(ingest, *args):
+    """Run 'ingest' and return (seconds, peak bytes allocated, hosts).
+
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    hosts = ingest(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, len(hosts)
+
+
+def main(argv):
+    """Run the benchmark.
+
+    """
+    count = int(argv[0]) if argv else 100000
+    json_stream = load("json_stream", os.path.join("bss_hosts", "json_stream.py"))
+    body = synthetic_hosts(count)
+    print("%d hosts, %.1f MiB response" % (count, len(body) / 2.0**20))
+    for name, ingest, args in [("whole", whole, (body,)),
+                               ("streamed", streamed, (body, json_stream))]:
+        seconds, peak, kept = measure(ingest, *args)
+        print("%-9s %7.2fs  peak %7.1f MiB  %d hosts kept" %
+              (name, seconds, peak / 2.0**20, kept))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
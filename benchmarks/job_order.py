@@ -0,0 +1,125 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Benchmark of 'job_end' node ordering against 'listed' node ordering
+on a synthetic busy system.
+
+Jobs with random remaining run times are placed on most of the nodes
+of the system.  'squeue' output for them is parsed, and a serial
+rolling upgrade of the system is simulated with the nodes in their
+listed (starting node group) order and in job end order.  Each step
+finishes quiescing when the last job on any of its nodes ends, then
+boots for a fixed time before the next step starts.  Run it from the
+top of the source tree:
+
+    python benchmarks/job_order.py [node_count [step_size]]
+
+The modules are loaded straight from their source files so that the
+benchmark does not need the CRUS application (and ETCD) to be set up.
+
+"""
+import importlib.util
+import os
+import random
+import sys
+import time
+
+SOURCE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..",
+    "crus", "controllers", "upgrade_agent"
+)
+
+BUSY_FRACTION = 0.7
+MEAN_JOB_HOURS = 4.0
+MAX_JOB_HOURS = 24.0
+BOOT_SECONDS = 20 * 60
+
+
+def load(name, path):
+    """Load a module from its source file.
+
+    """
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SOURCE_DIR, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_squeue(count, now, rng):
+    """Generate 'squeue -h -o "%e %N"' output for single node jobs on
+    about BUSY_FRACTION of 'count' nodes.
+
+    """
+    lines = []
+    for nid in range(1, count + 1):
+        if rng.random() >= BUSY_FRACTION:
+            continue
+        hours = min(rng.expovariate(1.0 / MEAN_JOB_HOURS), MAX_JOB_HOURS)
+        end = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now + hours * 3600))
+        lines.append("%s nid%06d" % (end, nid))
+    return lines
+
+
+def simulate(nodes, step_size, job_ends, now):
+    """Simulate a serial upgrade of 'nodes' in steps of 'step_size'.
+    Returns the time the upgrade takes and the node hours spent
+    drained but waiting for other nodes in the same step.
+
+    """
+    clock = now
+    waiting = 0.0
+    for first in range(0, len(nodes), step_size):
+        step = nodes[first:first + step_size]
+        drained = [max(clock, job_ends.get(node, clock)) for node in step]
+        quiesced = max(drained)
+        waiting += sum(quiesced - node_drained for node_drained in drained)
+        clock = quiesced + BOOT_SECONDS
+    return clock - now, waiting / 3600
+
+
+def main(argv):
+    """Run the benchmark for the node count and step size in 'argv'
+    (default 2048 nodes in steps of 64).
+
+    """
+    support = load("slurm_support", os.path.join("wlm", "slurm_support.py"))
+    job_order = load("job_order", "job_order.py")
+    count = int(argv[0]) if argv else 2048
+    step_size = int(argv[1]) if len(argv) > 1 else 64
+    rng = random.Random(2022)
+    now = time.time()
+    job_ends = support.parse_squeue_job_ends(synthetic_squeue(count, now, rng))
+    listed = ["nid%06d" % nid for nid in range(1, count + 1)]
+    rng.shuffle(listed)
+    ordered = job_order.order_by_job_end(listed, job_ends)
+    print("%d nodes (%d busy), steps of %d, %d minute boots" %
+          (count, len(job_ends), step_size, BOOT_SECONDS // 60))
+    print("%10s %14s %20s" % ("order", "makespan (h)", "drained waiting (h)"))
+    for name, nodes in [("listed", listed), ("job_end", ordered)]:
+        makespan, waiting = simulate(nodes, step_size, job_ends, now)
+        print("%10s %14.1f %20.1f" % (name, makespan / 3600, waiting))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
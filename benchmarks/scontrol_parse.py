@@ -0,0 +1,147 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Benchmark of the scontrol 'show node' parsers on synthetic output.
+
+Compares parse_show_all_nodes() on multi line 'scontrol show node'
+output with iter_show_nodes() on one line 'scontrol -o show node'
+output for systems of 2k, 20k and 100k nodes.  Run it from the top of
+the source tree:
+
+    python benchmarks/scontrol_parse.py [node_count ...]
+
+The parsers are loaded straight from their source file so that the
+benchmark does not need the CRUS application (and ETCD) to be set up.
+
+"""
+import importlib.util
+import os
+import sys
+import time
+
+SUPPORT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..",
+    "crus", "controllers", "upgrade_agent", "wlm", "slurm_support.py"
+)
+
+NODE_FMT = """
+NodeName=nid{nid:06d} Arch=x86_64 CoresPerSocket=64
+   CPUAlloc=0 CPUTot=256 CPULoad=0.00
+   AvailableFeatures=(null)
+   ActiveFeatures=(null)
+   Gres=(null)
+   NodeAddr=nid{nid:06d} NodeHostName=nid{nid:06d} Version=20.11
+   OS=Linux 5.3.18-24.75_10.0.189-cray_shasta_c #1 SMP Sun Sep 26 14:27:04 UTC 2021 (0388af5)
+   RealMemory=246000 AllocMem=0 FreeMem=240000 Sockets=2 Boards=1
+   State={state} ThreadsPerCore=2 TmpDisk=0 Weight=1 Owner=N/A MCS_label=N/A
+   Partitions=workq
+   BootTime=2022-01-10T01:16:48 SlurmdStartTime=2022-01-10T04:04:20
+   CfgTRES=cpu=256,mem=246000M,billing=256
+   AllocTRES=
+   CapWatts=n/a
+   CurrentWatts=0 AveWatts=0
+   ExtSensorsJoules=n/s ExtSensorsWatts=0 ExtSensorsTemp=n/s
+   {reason}
+"""[1:-1]
+
+STATES = ["IDLE", "ALLOCATED", "IDLE+DRAIN", "MIXED"]
+
+
+def load_support():
+    """Load the slurm_support module from its source file.
+
+    """
+    spec = importlib.util.spec_from_file_location("slurm_support", SUPPORT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_nodes(count):
+    """Generate the multi line text of 'count' synthetic nodes.
+
+    """
+    for nid in range(1, count + 1):
+        state = STATES[nid % len(STATES)]
+        reason = "Reason=rolling-upgrade [root@2022-01-10T04:04:20]" if "DRAIN" in state else ""
+        yield NODE_FMT.format(nid=nid, state=state, reason=reason)
+
+
+def multi_line_output(count):
+    """Synthetic 'scontrol show node' output as a list of lines.
+
+    """
+    lines = []
+    for node in synthetic_nodes(count):
+        lines.extend(node.split("\n"))
+        lines.append("")
+    return lines
+
+
+def one_line_output(count):
+    """Synthetic 'scontrol -o show node' output as a list of lines.
+
+    """
+    return [
+        " ".join(part.strip() for part in node.split("\n") if part.strip())
+        for node in synthetic_nodes(count)
+    ]
+
+
+def best_of(func, repeat=3):
+    """Run 'func' 'repeat' times and return the best time in seconds and
+    its result.
+
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv):
+    """Run the benchmark for the node counts in 'argv' (default 2000,
+    20000 and 100000).
+
+    """
+    support = load_support()
+    counts = [int(arg) for arg in argv] or [2000, 20000, 100000]
+    print("%10s %18s %18s %8s" % ("nodes", "multi line (s)", "one line (s)", "speedup"))
+    for count in counts:
+        multi = multi_line_output(count)
+        oneline = one_line_output(count)
+        multi_time, nodes = best_of(lambda: support.parse_show_all_nodes(multi))
+        one_time, records = best_of(lambda: list(support.iter_show_nodes(oneline)))
+        assert len(nodes) == len(records) == count
+        for record in records[:len(STATES)]:
+            assert record['State'] == nodes[record['NodeName']]['State']
+        print("%10d %18.3f %18.3f %7.1fx" % (count, multi_time, one_time, multi_time / one_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -30,4 +30,5 @@ from .app import APP
 from . import models
 from . import views
 from .controllers.upgrade_agent.upgrade_agent import watch_sessions
+from .controllers.upgrade_agent.async_engine import watch_sessions_async
 from .controllers.upgrade_agent.errors import ComputeUpgradeError
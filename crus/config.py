@@ -55,6 +55,17 @@ def bool_from_env(env_name, true="yes", default="yes"):
     return os.environ.get(env_name, default).lower() == true.lower()
 
 
+def poll_interval_from_env(env_name, default):
+    """Take a polling interval range from an environment variable whose
+    value is '<initial>,<maximum>' in seconds (e.g. '10,600').  The
+    'default' parameter sets the value to use if the environment
+    variable is not present.  Returns a tuple of floats.
+
+    """
+    initial, maximum = os.environ.get(env_name, default).split(',')
+    return float(initial), float(maximum)
+
+
 class DefaultConfig:
     """Default application configuration (used as template for all
     others).  This is used if the CRUS_CONFIGURATION environment
@@ -97,6 +108,35 @@ class DefaultConfig:
     MOCK_BOS_SERVICE = bool_from_env('MOCK_BOS_SERVICE', default='no')
     BOA_JOBS_NAMESPACE = os.environ.get('BOA_JOBS_NAMESPACE', 'services')
     MOCK_KUBERNETES_CLIENT = bool_from_env('MOCK_KUBERNETES_CLIENT', default='no')
+    AGENT_WORKERS = int(os.environ.get('CRUS_AGENT_WORKERS', "1"))
+    POLL_BACKOFF = float(os.environ.get('CRUS_POLL_BACKOFF', "2.0"))
+    POLL_JITTER = float(os.environ.get('CRUS_POLL_JITTER', "0.1"))
+    POLL_QUIESCING = poll_interval_from_env('CRUS_POLL_QUIESCING', "10,600")
+    POLL_BOOTING = poll_interval_from_env('CRUS_POLL_BOOTING', "2,10")
+    POLL_WLM_WAITING = poll_interval_from_env('CRUS_POLL_WLM_WAITING', "10,60")
+    POLL_STREAMING = poll_interval_from_env('CRUS_POLL_STREAMING', "10,120")
+    POLL_ERROR = poll_interval_from_env('CRUS_POLL_ERROR', "10,300")
+    STREAM_BOOT_BATCH_SIZE = int(os.environ.get('CRUS_STREAM_BOOT_BATCH_SIZE', "16"))
+    STREAM_BOOT_BATCH_WINDOW = float(os.environ.get('CRUS_STREAM_BOOT_BATCH_WINDOW', "120.0"))
+    AGENT_SHARDING = bool_from_env('CRUS_AGENT_SHARDING', default='no')
+    AGENT_LEASE_TTL = float(os.environ.get('CRUS_AGENT_LEASE_TTL', "30.0"))
+    AGENT_HEARTBEAT_INTERVAL = float(os.environ.get('CRUS_AGENT_HEARTBEAT_INTERVAL', "10.0"))
+    AGENT_DIRECT_DISPATCH = int(os.environ.get('CRUS_AGENT_DIRECT_DISPATCH', "8"))
+    WLM_STATE_MAX_AGE = float(os.environ.get('CRUS_WLM_STATE_MAX_AGE', "5.0"))
+    WLM_STATE_INTEREST = float(os.environ.get('CRUS_WLM_STATE_INTEREST', "60.0"))
+    NODE_TABLE_TTL = float(os.environ.get('CRUS_NODE_TABLE_TTL', "300.0"))
+    NODE_TABLE_MISS_INTERVAL = float(os.environ.get('CRUS_NODE_TABLE_MISS_INTERVAL', "10.0"))
+    NODE_TABLE_SNAPSHOT = bool_from_env('CRUS_NODE_TABLE_SNAPSHOT', default='yes')
+    WLM_COMMAND_WORKERS = int(os.environ.get('CRUS_WLM_COMMAND_WORKERS', "8"))
+    WLM_COMMAND_TIMEOUT = float(os.environ.get('CRUS_WLM_COMMAND_TIMEOUT', "60.0"))
+    WLM_COMMAND_MAX_NODES = int(os.environ.get('CRUS_WLM_COMMAND_MAX_NODES', "1024"))
+    SLURM_REST_URI = os.environ.get('CRUS_SLURM_REST_URI',
+                                    'http://slurmrestd.user.svc.cluster.local:6820')
+    SLURM_REST_API_VERSION = os.environ.get('CRUS_SLURM_REST_API_VERSION', 'v0.0.39')
+    SLURM_REST_USER = os.environ.get('CRUS_SLURM_REST_USER', 'root')
+    SLURM_REST_TOKEN = os.environ.get('CRUS_SLURM_REST_TOKEN', '')
+    SLURM_REST_POOL_SIZE = int(os.environ.get('CRUS_SLURM_REST_POOL_SIZE', "16"))
+    SLURM_REST_TIMEOUT = float(os.environ.get('CRUS_SLURM_REST_TIMEOUT', "30.0"))
 
 
 class DevelopmentConfig(DefaultConfig):
@@ -140,6 +180,35 @@ class DevelopmentConfig(DefaultConfig):
                                    "bos/v1/session")
     MOCK_BOS_SERVICE = bool_from_env('MOCK_BOS_SERVICE', default='no')
     MOCK_KUBERNETES_CLIENT = bool_from_env('MOCK_KUBERNETES_CLIENT', default='no')
+    AGENT_WORKERS = int(os.environ.get('CRUS_AGENT_WORKERS', "1"))
+    POLL_BACKOFF = float(os.environ.get('CRUS_POLL_BACKOFF', "2.0"))
+    POLL_JITTER = float(os.environ.get('CRUS_POLL_JITTER', "0.1"))
+    POLL_QUIESCING = poll_interval_from_env('CRUS_POLL_QUIESCING', "10,600")
+    POLL_BOOTING = poll_interval_from_env('CRUS_POLL_BOOTING', "2,10")
+    POLL_WLM_WAITING = poll_interval_from_env('CRUS_POLL_WLM_WAITING', "10,60")
+    POLL_STREAMING = poll_interval_from_env('CRUS_POLL_STREAMING', "10,120")
+    POLL_ERROR = poll_interval_from_env('CRUS_POLL_ERROR', "10,300")
+    STREAM_BOOT_BATCH_SIZE = int(os.environ.get('CRUS_STREAM_BOOT_BATCH_SIZE', "16"))
+    STREAM_BOOT_BATCH_WINDOW = float(os.environ.get('CRUS_STREAM_BOOT_BATCH_WINDOW', "120.0"))
+    AGENT_SHARDING = bool_from_env('CRUS_AGENT_SHARDING', default='no')
+    AGENT_LEASE_TTL = float(os.environ.get('CRUS_AGENT_LEASE_TTL', "30.0"))
+    AGENT_HEARTBEAT_INTERVAL = float(os.environ.get('CRUS_AGENT_HEARTBEAT_INTERVAL', "10.0"))
+    AGENT_DIRECT_DISPATCH = int(os.environ.get('CRUS_AGENT_DIRECT_DISPATCH', "8"))
+    WLM_STATE_MAX_AGE = float(os.environ.get('CRUS_WLM_STATE_MAX_AGE', "5.0"))
+    WLM_STATE_INTEREST = float(os.environ.get('CRUS_WLM_STATE_INTEREST', "60.0"))
+    NODE_TABLE_TTL = float(os.environ.get('CRUS_NODE_TABLE_TTL', "300.0"))
+    NODE_TABLE_MISS_INTERVAL = float(os.environ.get('CRUS_NODE_TABLE_MISS_INTERVAL', "10.0"))
+    NODE_TABLE_SNAPSHOT = bool_from_env('CRUS_NODE_TABLE_SNAPSHOT', default='yes')
+    WLM_COMMAND_WORKERS = int(os.environ.get('CRUS_WLM_COMMAND_WORKERS', "8"))
+    WLM_COMMAND_TIMEOUT = float(os.environ.get('CRUS_WLM_COMMAND_TIMEOUT', "60.0"))
+    WLM_COMMAND_MAX_NODES = int(os.environ.get('CRUS_WLM_COMMAND_MAX_NODES', "1024"))
+    SLURM_REST_URI = os.environ.get('CRUS_SLURM_REST_URI',
+                                    'http://slurmrestd.user.svc.cluster.local:6820')
+    SLURM_REST_API_VERSION = os.environ.get('CRUS_SLURM_REST_API_VERSION', 'v0.0.39')
+    SLURM_REST_USER = os.environ.get('CRUS_SLURM_REST_USER', 'root')
+    SLURM_REST_TOKEN = os.environ.get('CRUS_SLURM_REST_TOKEN', '')
+    SLURM_REST_POOL_SIZE = int(os.environ.get('CRUS_SLURM_REST_POOL_SIZE', "16"))
+    SLURM_REST_TIMEOUT = float(os.environ.get('CRUS_SLURM_REST_TIMEOUT', "30.0"))
 
 
 class TestingConfig(DefaultConfig):
@@ -205,6 +274,35 @@ class TestingConfig(DefaultConfig):
                                    "bos/v1/session")
     MOCK_BOS_SERVICE = bool_from_env('MOCK_BOS_SERVICE', default='yes')
     MOCK_KUBERNETES_CLIENT = bool_from_env('MOCK_KUBERNETES_CLIENT', default='yes')
+    AGENT_WORKERS = int(os.environ.get('CRUS_AGENT_WORKERS', "1"))
+    POLL_BACKOFF = float(os.environ.get('CRUS_POLL_BACKOFF', "2.0"))
+    POLL_JITTER = float(os.environ.get('CRUS_POLL_JITTER', "0.1"))
+    POLL_QUIESCING = poll_interval_from_env('CRUS_POLL_QUIESCING', "0.01,0.04")
+    POLL_BOOTING = poll_interval_from_env('CRUS_POLL_BOOTING', "0.01,0.04")
+    POLL_WLM_WAITING = poll_interval_from_env('CRUS_POLL_WLM_WAITING', "0.01,0.04")
+    POLL_STREAMING = poll_interval_from_env('CRUS_POLL_STREAMING', "0.01,0.04")
+    POLL_ERROR = poll_interval_from_env('CRUS_POLL_ERROR', "0.01,0.04")
+    STREAM_BOOT_BATCH_SIZE = int(os.environ.get('CRUS_STREAM_BOOT_BATCH_SIZE', "2"))
+    STREAM_BOOT_BATCH_WINDOW = float(os.environ.get('CRUS_STREAM_BOOT_BATCH_WINDOW', "0.05"))
+    AGENT_SHARDING = bool_from_env('CRUS_AGENT_SHARDING', default='no')
+    AGENT_LEASE_TTL = float(os.environ.get('CRUS_AGENT_LEASE_TTL', "1.0"))
+    AGENT_HEARTBEAT_INTERVAL = float(os.environ.get('CRUS_AGENT_HEARTBEAT_INTERVAL', "0.2"))
+    AGENT_DIRECT_DISPATCH = int(os.environ.get('CRUS_AGENT_DIRECT_DISPATCH', "0"))
+    WLM_STATE_MAX_AGE = float(os.environ.get('CRUS_WLM_STATE_MAX_AGE', "0.0"))
+    WLM_STATE_INTEREST = float(os.environ.get('CRUS_WLM_STATE_INTEREST', "0.0"))
+    NODE_TABLE_TTL = float(os.environ.get('CRUS_NODE_TABLE_TTL', "300.0"))
+    NODE_TABLE_MISS_INTERVAL = float(os.environ.get('CRUS_NODE_TABLE_MISS_INTERVAL', "10.0"))
+    NODE_TABLE_SNAPSHOT = bool_from_env('CRUS_NODE_TABLE_SNAPSHOT', default='no')
+    WLM_COMMAND_WORKERS = int(os.environ.get('CRUS_WLM_COMMAND_WORKERS', "8"))
+    WLM_COMMAND_TIMEOUT = float(os.environ.get('CRUS_WLM_COMMAND_TIMEOUT', "10.0"))
+    WLM_COMMAND_MAX_NODES = int(os.environ.get('CRUS_WLM_COMMAND_MAX_NODES', "1024"))
+    SLURM_REST_URI = os.environ.get('CRUS_SLURM_REST_URI',
+                                    'http://slurmrestd.user.svc.cluster.local:6820')
+    SLURM_REST_API_VERSION = os.environ.get('CRUS_SLURM_REST_API_VERSION', 'v0.0.39')
+    SLURM_REST_USER = os.environ.get('CRUS_SLURM_REST_USER', 'root')
+    SLURM_REST_TOKEN = os.environ.get('CRUS_SLURM_REST_TOKEN', '')
+    SLURM_REST_POOL_SIZE = int(os.environ.get('CRUS_SLURM_REST_POOL_SIZE', "16"))
+    SLURM_REST_TIMEOUT = float(os.environ.get('CRUS_SLURM_REST_TIMEOUT', "30.0"))
 
 
 class ProductionConfig(DefaultConfig):
@@ -248,3 +346,32 @@ class ProductionConfig(DefaultConfig):
                                    "bos/v1/session")
     MOCK_BOS_SERVICE = bool_from_env('MOCK_BOS_SERVICE', default='no')
     MOCK_KUBERNETES_CLIENT = bool_from_env('MOCK_KUBERNETES_CLIENT', default='no')
+    AGENT_WORKERS = int(os.environ.get('CRUS_AGENT_WORKERS', "1"))
+    POLL_BACKOFF = float(os.environ.get('CRUS_POLL_BACKOFF', "2.0"))
+    POLL_JITTER = float(os.environ.get('CRUS_POLL_JITTER', "0.1"))
+    POLL_QUIESCING = poll_interval_from_env('CRUS_POLL_QUIESCING', "10,600")
+    POLL_BOOTING = poll_interval_from_env('CRUS_POLL_BOOTING', "2,10")
+    POLL_WLM_WAITING = poll_interval_from_env('CRUS_POLL_WLM_WAITING', "10,60")
+    POLL_STREAMING = poll_interval_from_env('CRUS_POLL_STREAMING', "10,120")
+    POLL_ERROR = poll_interval_from_env('CRUS_POLL_ERROR', "10,300")
+    STREAM_BOOT_BATCH_SIZE = int(os.environ.get('CRUS_STREAM_BOOT_BATCH_SIZE', "16"))
+    STREAM_BOOT_BATCH_WINDOW = float(os.environ.get('CRUS_STREAM_BOOT_BATCH_WINDOW', "120.0"))
+    AGENT_SHARDING = bool_from_env('CRUS_AGENT_SHARDING', default='no')
+    AGENT_LEASE_TTL = float(os.environ.get('CRUS_AGENT_LEASE_TTL', "30.0"))
+    AGENT_HEARTBEAT_INTERVAL = float(os.environ.get('CRUS_AGENT_HEARTBEAT_INTERVAL', "10.0"))
+    AGENT_DIRECT_DISPATCH = int(os.environ.get('CRUS_AGENT_DIRECT_DISPATCH', "8"))
+    WLM_STATE_MAX_AGE = float(os.environ.get('CRUS_WLM_STATE_MAX_AGE', "5.0"))
+    WLM_STATE_INTEREST = float(os.environ.get('CRUS_WLM_STATE_INTEREST', "60.0"))
+    NODE_TABLE_TTL = float(os.environ.get('CRUS_NODE_TABLE_TTL', "300.0"))
+    NODE_TABLE_MISS_INTERVAL = float(os.environ.get('CRUS_NODE_TABLE_MISS_INTERVAL', "10.0"))
+    NODE_TABLE_SNAPSHOT = bool_from_env('CRUS_NODE_TABLE_SNAPSHOT', default='yes')
+    WLM_COMMAND_WORKERS = int(os.environ.get('CRUS_WLM_COMMAND_WORKERS', "8"))
+    WLM_COMMAND_TIMEOUT = float(os.environ.get('CRUS_WLM_COMMAND_TIMEOUT', "60.0"))
+    WLM_COMMAND_MAX_NODES = int(os.environ.get('CRUS_WLM_COMMAND_MAX_NODES', "1024"))
+    SLURM_REST_URI = os.environ.get('CRUS_SLURM_REST_URI',
+                                    'http://slurmrestd.user.svc.cluster.local:6820')
+    SLURM_REST_API_VERSION = os.environ.get('CRUS_SLURM_REST_API_VERSION', 'v0.0.39')
+    SLURM_REST_USER = os.environ.get('CRUS_SLURM_REST_USER', 'root')
+    SLURM_REST_TOKEN = os.environ.get('CRUS_SLURM_REST_TOKEN', '')
+    SLURM_REST_POOL_SIZE = int(os.environ.get('CRUS_SLURM_REST_POOL_SIZE', "16"))
+    SLURM_REST_TIMEOUT = float(os.environ.get('CRUS_SLURM_REST_TIMEOUT', "30.0"))
@@ -33,6 +33,7 @@ from crus import (
     API_VERSION,
     VERSION,
     watch_sessions,
+    watch_sessions_async,
     ComputeUpgradeError
 )
 
@@ -41,7 +42,7 @@ DEFAULT_LOG_LEVEL = "INFO"
 LOGGER = logging.getLogger(__name__)
 
 USAGE_STATIC = """
-Usage: driver
+Usage: driver [--engine=<engine>] [--workers=<count>]
        driver --help|-h
        driver --version
 
@@ -54,6 +55,23 @@ Where:
     --version
 
         Prints version information on standard output and exits.
+
+    --engine=<engine>
+
+        Select the engine that drives the upgrade sessions.  The
+        'blocking' engine (the default) handles each session event
+        on a thread.  The 'async' engine runs the sessions as asyncio
+        tasks, running WLM commands as asyncio subprocesses.  HSM,
+        BSS, BOS and Kubernetes requests still run on threads with
+        either engine.
+
+    --workers=<count>
+
+        Process up to <count> upgrade sessions concurrently using the
+        'blocking' engine.  The default is taken from the
+        CRUS_AGENT_WORKERS environment variable (1 if that is not
+        set).  Not allowed with the 'async' engine, which runs the
+        sessions concurrently on its event loop.
 """
 
 
@@ -99,18 +117,35 @@ def driver(argv):
     shortopts = "h"
     longopts = [
         "help",
-        "version"
+        "version",
+        "engine=",
+        "workers="
     ]
     try:
         opts, args = getopt(argv, shortopts, longopts)
     except GetoptError as exc:
         return usage(str(exc))
+    workers = None
+    engine = "blocking"
     for opt in opts:
         LOGGER.debug("opt = %s", opt)
         if opt[0] == "-h" or opt[0] == "--help":
             return usage(retval=0)
         if opt[0] == "--version":
             return version()
+        if opt[0] == "--engine":
+            engine = opt[1]
+            if engine not in ["blocking", "async"]:
+                return usage("--engine must be 'blocking' or 'async', got '%s'" % engine)
+            continue
+        if opt[0] == "--workers":
+            try:
+                workers = int(opt[1])
+            except ValueError:
+                workers = 0
+            if workers < 1:
+                return usage("--workers requires a positive integer, got '%s'" % opt[1])
+            continue
         LOGGER.error("Unrecognized option: %s", opt)
 
     # There should be no arguments...
@@ -118,9 +153,16 @@ def driver(argv):
         LOGGER.error("args = %s", args)
         return usage("Compute Upgrade takes no non-option arguments")
 
+    # The asyncio engine runs sessions as tasks, not on workers...
+    if engine == "async" and workers is not None:
+        return usage("--workers cannot be used with --engine=async")
+
     try:  # pragma no unit test (this code never returns, can't test here)
         # Start the controller loop
-        watch_sessions()
+        if engine == "async":
+            watch_sessions_async()
+        else:
+            watch_sessions(workers)
     except ComputeUpgradeError:  # pragma no unit test
         LOGGER.exception("An error occurred while processing upgrades")
         return 1
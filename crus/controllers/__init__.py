@@ -26,4 +26,5 @@ Initialization for the Compute Node Upgrade module
 
 """
 from .upgrade_agent.upgrade_agent import watch_sessions
+from .upgrade_agent.async_engine import watch_sessions_async
 from .upgrade_agent.errors import ComputeUpgradeError
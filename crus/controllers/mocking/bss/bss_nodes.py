@@ -152,6 +152,21 @@ class BSSNodeTable:
             ret.append(cls._instance.nodes[xname].get_data())
         return ret
 
+    @classmethod
+    def add_node(cls, xname, nid):
+        """Add a node with the specified XNAME and NID to the node table
+        (as if it had been installed after startup).
+
+        """
+        cls._instance.nodes[xname] = Node(xname, nid)
+
+    @classmethod
+    def remove_node(cls, xname):
+        """Remove the node with the specified XNAME from the node table.
+
+        """
+        del cls._instance.nodes[xname]
+
     @classmethod
     def node_count(cls):
         """Return the number of nodes in the node table.
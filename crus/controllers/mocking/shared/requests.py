@@ -157,6 +157,20 @@ class Response:
         """
         return json.loads(self.text)
 
+    def iter_content(self, chunk_size=1):
+        """Iterate over the response text, encoded as UTF-8, in pieces of
+        'chunk_size' bytes.
+
+        """
+        content = (self.text or "").encode('utf-8')
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+    def close(self):
+        """Release the response (nothing to do in the mock).
+
+        """
+
 
 def get(uri, **kwargs):
     """Mock 'get' method to support 'get' requests on a given URI path.
@@ -216,3 +230,81 @@ def patch(uri, **kwargs):
                         text="URI '%s' unknown" % uri)
     status_code, text = handler.patch(path_args, kwargs)
     return Response(status_code=status_code, text=text)
+
+
+class HTTPAdapter:
+    """Minimalist mock of 'requests.adapters.HTTPAdapter'.  It does no
+    connection pooling, it only keeps its settings so they can be
+    checked.
+
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=10, max_retries=0, pool_block=False):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.pool_block = pool_block
+
+
+class Session:
+    """Minimalist mock of 'requests.Session'.  Requests made through a
+    Session go to the same registered paths as the module level
+    methods, with the session headers merged into the headers of each
+    request.
+
+    """
+    def __init__(self):
+        self.headers = {}
+        self.verify = True
+        self.adapters = {}
+
+    def mount(self, prefix, adapter):
+        """Use 'adapter' for all URIs starting with 'prefix'.
+
+        """
+        self.adapters[prefix] = adapter
+
+    def close(self):
+        """Close the session, dropping its adapters.
+
+        """
+        self.adapters = {}
+
+    def _request(self, method, uri, kwargs):
+        """Utility - make a request using the module level 'method' with the
+        session headers merged into the request headers.
+
+        """
+        headers = dict(self.headers)
+        headers.update(kwargs.get('headers') or {})
+        kwargs['headers'] = headers
+        return method(uri, **kwargs)
+
+    def get(self, uri, **kwargs):
+        """Mock 'get' method on a Session.
+
+        """
+        return self._request(get, uri, kwargs)
+
+    def post(self, uri, **kwargs):
+        """Mock 'post' method on a Session.
+
+        """
+        return self._request(post, uri, kwargs)
+
+    def delete(self, uri, **kwargs):
+        """Mock 'delete' method on a Session.
+
+        """
+        return self._request(delete, uri, kwargs)
+
+    def put(self, uri, **kwargs):
+        """Mock 'put' method on a Session.
+
+        """
+        return self._request(put, uri, kwargs)
+
+    def patch(self, uri, **kwargs):
+        """Mock 'patch' method on a Session.
+
+        """
+        return self._request(patch, uri, kwargs)
@@ -28,6 +28,14 @@ Compute Rolling Upgrade.  Extend it as needed to support new features.
 
 """
 import sys
+from ....app import APP
+
+
+class CommandTimeout(Exception):
+    """Raised by a mock command's run() method to simulate a command
+    that hangs until it is killed for running past its timeout.
+
+    """
 
 
 class CommandRegistry:
@@ -161,14 +169,18 @@ class Shell:
     """ Mock Shell class modeled on the shell python library
 
     """
-    def __init__(self, argv):
-        """Constructor
+    def __init__(self, argv, timeout=None):
+        """Constructor - 'timeout' is the timeout reported if the command
+        raises CommandTimeout.
 
         """
         self.argv = argv
         self.handler = CommandRegistry.find(argv[0])
         self.out = []
         self.err = []
+        self.returncode = None
+        self.timeout = timeout
+        self.timed_out = False
 
     def run_cmd(self):
         """Run the command attached to this Shell object redirecting stdout
@@ -184,8 +196,13 @@ class Shell:
         with StdioRedirect(self.out, self.err):
             if self.handler is None:
                 print("%s: command not found" % self.argv[0], file=sys.stderr)
+                self.returncode = 127
                 return
-            self.handler.run(self.argv)
+            try:
+                self.returncode = self.handler.run(self.argv) or 0
+            except CommandTimeout:
+                self.returncode = None
+                self.timed_out = True
 
     def output(self):
         """ Report the output produced by the command.
@@ -194,19 +211,75 @@ class Shell:
             yield out
 
     def errors(self):
-        """ Report the output produced by the command.
+        """Report the errors produced by the command, followed by its exit
+        status if it failed, the same way a CommandExecutor result
+        does.
+
         """
         for err in self.err:
             yield err
+        if self.timed_out:
+            yield "%s: timed out after %.1f seconds" % (self.argv[0], self.timeout)
+        elif self.returncode != 0:
+            yield "%s: exited with status %d" % (self.argv[0], self.returncode)
 
 
-def shell(argv):
+def shell(argv, timeout=None):
     """Mock shell() function patterned on the shell() function from the
     'shell' library.  This implements only the 'list' form of a
     command because that is all that I use in the caller.
 
     """
     assert isinstance(argv, list)
-    ret = Shell(argv)
+    ret = Shell(argv, timeout)
     ret.run_cmd()
     return ret
+
+
+async def async_shell(argv, timeout=None):
+    """Mock coroutine counterpart of shell() used by the asyncio engine.
+    Mock commands complete immediately, so this simply runs the
+    command in line and returns the resulting Shell object.
+
+    """
+    return shell(argv, timeout)
+
+
+class CommandExecutor:
+    """Mock of the WLM command executor.  Mock commands complete
+    immediately and redirect the process wide stdout and stderr while
+    they run, so this runs commands one at a time in the calling
+    thread.  A mock command simulates a hung command by raising
+    CommandTimeout, which is reported with the timeout it would have
+    run into.
+
+    """
+    def __init__(self, workers=None, timeout=None):
+        """Constructor
+
+        """
+        self.workers = workers
+        self.timeout = timeout
+
+    def _timeout(self, timeout):
+        """Utility - use 'timeout' if it was given, otherwise the
+        executor's timeout or the WLM_COMMAND_TIMEOUT setting.
+
+        """
+        if timeout is not None:
+            return timeout
+        return self.timeout if self.timeout is not None else APP.config['WLM_COMMAND_TIMEOUT']
+
+    def run(self, argv, timeout=None):
+        """Run the command described by the list 'argv' and return the
+        resulting Shell object.
+
+        """
+        return shell(argv, self._timeout(timeout))
+
+    def run_many(self, argvs, timeout=None):
+        """Run the commands described by the lists in 'argvs' and return a
+        list of the resulting Shell objects in the same order.
+
+        """
+        return [self.run(argv, timeout) for argv in argvs]
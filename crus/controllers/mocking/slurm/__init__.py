@@ -22,8 +22,12 @@
 # OTHER DEALINGS IN THE SOFTWARE.
 #
 """
-Initialization for the Slurm Command Line Mock module
+Initialization for the Slurm Command Line and REST API Mock module
 
 """
 from .scontrol import install_scontrol
+from .squeue import install_squeue
+from .slurm_rest_api import start_service
 install_scontrol()
+install_squeue()
+start_service()
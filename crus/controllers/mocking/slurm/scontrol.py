@@ -27,6 +27,7 @@
 import sys
 from ..shared import shell
 from .slurm_state import SlurmNodeTable
+from ...upgrade_agent.wlm.slurm_support import expand_hostlist
 
 SHOW_FMT = """
 NodeName={nodename} Arch=x86_64 CoresPerSocket=4
@@ -61,20 +62,29 @@ class ScontrolCmd(shell.Command):
 
         - scontrol show node
 
-        - scontrol show node node_name
+        - scontrol show node <hostlist>
 
-        - scontrol update Nodename=<node_name> State=DRAIN|FAIL Reason="<reason>"
+        - scontrol -o show node [<hostlist>] (one line per node)
 
-        - scontrol update Nodename=<node_name> State=RESUME
+        - scontrol update Nodename=<hostlist> State=DRAIN|FAIL Reason="<reason>"
+
+        - scontrol update Nodename=<hostlist> State=RESUME
+
+        where <hostlist> is a node name or a slurm hostlist expression
+        (e.g. nid[000001-000004,000009]).
 
         all other commands will fail.
         """
         cmdname = None
         sub_cmd = None
         spec = None
+        oneline = False
         try:
             err = "empty argv -- should not happen"
             cmdname = argv.pop(0)
+            if argv and argv[0] == '-o':
+                oneline = True
+                argv.pop(0)
             err = "%s: requires sub-command: 'show' or 'update'" % cmdname
             sub_cmd = argv.pop(0)
             if sub_cmd == 'show':
@@ -93,14 +103,15 @@ class ScontrolCmd(shell.Command):
             print(err, file=sys.stderr)
             return 1
         if sub_cmd == 'show':
-            return self.show(cmdname, spec)
+            return self.show(cmdname, spec, oneline)
         return self.update(cmdname, spec)
 
-    def show(self, cmdname, spec):  # pylint: disable=unused-argument
-        """Implement the 'show' sub-command.
+    def show(self, cmdname, spec, oneline=False):  # pylint: disable=unused-argument
+        """Implement the 'show' sub-command.  If 'oneline' is set, print
+        each node on a single line like 'scontrol -o' does.
 
         """
-        nodenames = ([spec[0]] if spec else SlurmNodeTable.get_all_names())
+        nodenames = (expand_hostlist(spec[0]) if spec else SlurmNodeTable.get_all_names())
         for name in nodenames:
             node_addr = SlurmNodeTable.get_node_addr(name)
             node_host = SlurmNodeTable.get_node_host(name)
@@ -129,6 +140,10 @@ class ScontrolCmd(shell.Command):
                                        substate=substate,
                                        node_state=node_state,
                                        reasonstring=reason_string)
+            if oneline:
+                show_str = " ".join(
+                    [part.strip() for part in show_str.split("\n") if part.strip()]
+                )
             print(show_str)
         return 0
 
@@ -149,7 +164,7 @@ class ScontrolCmd(shell.Command):
             print("%s: node name must be present in spec" % (cmdname),
                   file=sys.stderr)
             return 1
-        nodename = nvps['nodename']
+        nodenames = expand_hostlist(nvps['nodename'])
         if 'state' not in nvps:
             print("%s: state must be present in spec" % (cmdname),
                   file=sys.stderr)
@@ -166,16 +181,17 @@ class ScontrolCmd(shell.Command):
             print("%s: reason must not be in spec for RESUME"
                   % cmdname, file=sys.stderr)
             return 1
-        if state == 'DRAIN':
-            SlurmNodeTable.drain(nodename, reason)
-        elif state == 'FAIL':
-            SlurmNodeTable.fail(nodename, reason)
-        elif state == 'RESUME':
-            SlurmNodeTable.resume(nodename)
-        else:
+        if state not in ['DRAIN', 'FAIL', 'RESUME']:
             print("%s: unexpected state '%s' specified for update" %
                   (cmdname, state), file=sys.stderr)
             return 1
+        for nodename in nodenames:
+            if state == 'DRAIN':
+                SlurmNodeTable.drain(nodename, reason)
+            elif state == 'FAIL':
+                SlurmNodeTable.fail(nodename, reason)
+            else:
+                SlurmNodeTable.resume(nodename)
         return 0
 
 
@@ -0,0 +1,162 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Mock Slurm REST API (slurmrestd) node endpoints to support testing of
+Rolling Compute Upgrade
+
+"""
+import json
+from ..shared import requests
+from .slurm_state import SlurmNodeTable
+from ...upgrade_agent.node_table import NodeTable
+from ...upgrade_agent.node_set import NodeSet
+from ...upgrade_agent.wlm.slurm_support import expand_hostlist
+from ....app import APP
+
+SLURM_REST_PREFIX = "%s/slurm/%s" % (APP.config['SLURM_REST_URI'], APP.config['SLURM_REST_API_VERSION'])
+SLURM_REST_NODES_URI = "%s/nodes" % SLURM_REST_PREFIX
+SLURM_REST_NODE_URI = "%s/node/<node_name>" % SLURM_REST_PREFIX
+SLURM_REST_JOBS_URI = "%s/jobs" % SLURM_REST_PREFIX
+
+
+def _error(status, message):
+    """Compose an error response the way slurmrestd does.
+
+    """
+    return requests.codes[status], json.dumps({'errors': [{'error': message}]})
+
+
+def _node_data(name):
+    """Compose the slurmrestd description of the node 'name', or None
+    if there is no such node.
+
+    """
+    node_addr = SlurmNodeTable.get_node_addr(name)
+    if node_addr is None:
+        return None
+    state, substate, node_state = SlurmNodeTable.get_state(name)
+    flags = [state]
+    if substate:
+        flags.append(substate)
+    if node_state == "*":
+        flags.append("NOT_RESPONDING")
+    reason, _ = SlurmNodeTable.get_reason(name)
+    return {
+        'name': name,
+        'address': node_addr,
+        'hostname': SlurmNodeTable.get_node_host(name),
+        'state': flags,
+        'reason': reason if reason else "",
+    }
+
+
+class SlurmNodesPath(requests.Path):  # pylint: disable=abstract-method
+    """Path handler class to list all of the slurm nodes.
+
+    """
+    def get(self, path_args, kwargs):  # pylint: disable=unused-argument
+        """Get method
+
+        """
+        nodes = [_node_data(name) for name in SlurmNodeTable.get_all_names()]
+        return requests.codes['ok'], json.dumps({'nodes': nodes, 'errors': []})
+
+
+class SlurmNodePath(requests.Path):  # pylint: disable=abstract-method
+    """Path handler class to show or update the slurm nodes named by a
+    node name or hostlist expression.
+
+    """
+    def get(self, path_args, kwargs):  # pylint: disable=unused-argument
+        """Get method
+
+        """
+        nodes = []
+        for name in expand_hostlist(path_args['node_name']):
+            node = _node_data(name)
+            if node is None:
+                return _error('not_found', "unknown node %s" % name)
+            nodes.append(node)
+        return requests.codes['ok'], json.dumps({'nodes': nodes, 'errors': []})
+
+    def post(self, path_args, kwargs):
+        """Post method, update the nodes.  Supports setting the state to
+        DRAIN or FAIL with a reason or to RESUME without one.
+
+        """
+        names = expand_hostlist(path_args['node_name'])
+        for name in names:
+            if SlurmNodeTable.get_node_addr(name) is None:
+                return _error('not_found', "unknown node %s" % name)
+        update = kwargs.get('json') or {}
+        states = update.get('state', [])
+        if len(states) != 1 or states[0] not in ['DRAIN', 'FAIL', 'RESUME']:
+            return _error('bad_request', "unexpected state %s specified for update" % states)
+        state = states[0]
+        reason = update.get('reason')
+        if state in ['DRAIN', 'FAIL'] and not reason:
+            return _error('bad_request', "reason must be present for FAIL and DRAIN")
+        if state == 'RESUME' and reason:
+            return _error('bad_request', "reason must not be present for RESUME")
+        for name in names:
+            if state == 'DRAIN':
+                SlurmNodeTable.drain(name, reason)
+            elif state == 'FAIL':
+                SlurmNodeTable.fail(name, reason)
+            else:
+                SlurmNodeTable.resume(name)
+        return requests.codes['ok'], json.dumps({'errors': []})
+
+
+class SlurmJobsPath(requests.Path):  # pylint: disable=abstract-method
+    """Path handler class to list the running slurm jobs.
+
+    """
+    def get(self, path_args, kwargs):  # pylint: disable=unused-argument
+        """Get method
+
+        """
+        jobs = []
+        for job_id, names, end_time in SlurmNodeTable.get_jobs():
+            nodes = NodeSet.from_nids([NodeTable.nidname_to_nid(name) for name in names])
+            jobs.append({
+                'job_id': job_id,
+                'job_state': "RUNNING",
+                'nodes': nodes.hostlist(),
+                'end_time': {
+                    'set': True,
+                    'infinite': end_time is None,
+                    'number': int(end_time) if end_time is not None else 0,
+                },
+            })
+        return requests.codes['ok'], json.dumps({'jobs': jobs, 'errors': []})
+
+
+def start_service():
+    """Initiate the mock slurmrestd service using the paths and handlers
+    we have.
+
+    """
+    SlurmNodesPath(SLURM_REST_NODES_URI)
+    SlurmNodePath(SLURM_REST_NODE_URI)
+    SlurmJobsPath(SLURM_REST_JOBS_URI)
@@ -46,6 +46,7 @@ class SlurmNode:
         self.draining = False
         self.failing = False
         self.pending_states = []
+        self.job_end = None
 
     def get_node_addr(self):
         """Retrieve the node address of the node.
@@ -67,6 +68,12 @@ class SlurmNode:
         """
         if self.pending_states:
             self.state = self.pending_states.pop(0)
+        state = self.state
+        if self.job_end is not None:
+            if self.job_end > time.time():
+                state = 'ALLOCATED'
+            else:
+                self.job_end = None
         node_state = ""
         host_table = BSSHostTable()
         if host_table.get_state(self.xname) != 'Ready':
@@ -81,7 +88,7 @@ class SlurmNode:
             substate = 'FAIL'
         else:
             substate = None
-        return self.state, substate, node_state
+        return state, substate, node_state
 
     def get_reason(self):
         """Retrieve the node's 'reason' field if any and the time at which
@@ -131,6 +138,21 @@ class SlurmNode:
         """
         self.pending_states = []
 
+    def run_job(self, end_time):
+        """Run a job on the node until 'end_time' (seconds since the
+        epoch), or forever if 'end_time' is None.  The node stays
+        ALLOCATED until the last of its jobs ends.
+
+        """
+        end_time = end_time if end_time is not None else float('inf')
+        self.job_end = max(end_time, self.job_end or end_time)
+
+    def end_jobs(self):
+        """End any jobs running on the node.
+
+        """
+        self.job_end = None
+
 
 class SlurmNodeTable:
     """A class that manages slurm nodes by node group
@@ -145,6 +167,7 @@ class SlurmNodeTable:
         nidnames = [NodeTable.get_nidname(xname)
                     for xname in NodeTable.get_all_xnames()]
         self.nodes = {nidname: SlurmNode(nidname) for nidname in nidnames}
+        self.jobs = {}  # job_id -> (node names, end time)
 
     def get_node(self, nidname):
         """Return the node whose name is 'nidname'
@@ -269,3 +292,42 @@ class SlurmNodeTable:
         node = cls._node_table().get_node(name)
         if node:
             node.clear_pending_states()
+
+    @classmethod
+    def add_job(cls, names, end_time):
+        """Start a job on the named nodes that is expected to end at
+        'end_time' (seconds since the epoch), or never if 'end_time' is
+        None.  Returns the job ID.
+
+        """
+        table = cls._node_table()
+        job_id = len(table.jobs) + 1
+        table.jobs[job_id] = (list(names), end_time)
+        for name in names:
+            node = table.get_node(name)
+            if node:
+                node.run_job(end_time)
+        return job_id
+
+    @classmethod
+    def get_jobs(cls):
+        """Get a list of the jobs that are still running, each as a tuple of
+        job ID, node names and expected end time (None if unknown).
+
+        """
+        now = time.time()
+        return [
+            (job_id, names, end_time)
+            for job_id, (names, end_time) in cls._node_table().jobs.items()
+            if end_time is None or end_time > now
+        ]
+
+    @classmethod
+    def clear_jobs(cls):
+        """End all jobs on all nodes.
+
+        """
+        table = cls._node_table()
+        table.jobs = {}
+        for node in table.nodes.values():
+            node.end_jobs()
@@ -0,0 +1,82 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Mock squeue command to support testing of Rolling Compute Upgrade
+
+"""
+import sys
+import time
+from ..shared import shell
+from .slurm_state import SlurmNodeTable
+from ...upgrade_agent.node_table import NodeTable
+from ...upgrade_agent.node_set import NodeSet
+from ...upgrade_agent.wlm.slurm_support import expand_hostlist, SLURM_TIME_FORMAT
+
+
+class SqueueCmd(shell.Command):
+    """Mock up of the 'squeue' command.
+
+    """
+    def run(self, argv):
+        """Run method executes commands like squeue would.  This is a
+        limited squeue mock-up that supports the following:
+
+        - squeue -h -t <states> -o "%e %N" [-w <hostlist>]
+
+        which lists the expected end time and nodes of each running
+        job (on any of the nodes in <hostlist> if it is given).  Jobs
+        are always running, so <states> is ignored.  All other options
+        will fail.
+
+        """
+        cmdname = argv.pop(0)
+        options = {}
+        while argv:
+            option = argv.pop(0)
+            if option == '-h':
+                continue
+            if option not in ['-t', '-o', '-w'] or not argv:
+                print("%s: unsupported option '%s'" % (cmdname, option), file=sys.stderr)
+                return 1
+            options[option] = argv.pop(0)
+        if options.get('-o') != "%e %N":
+            print("%s: only the output format '%%e %%N' is supported" % cmdname,
+                  file=sys.stderr)
+            return 1
+        wanted = set(expand_hostlist(options['-w'])) if '-w' in options else None
+        for _, names, end_time in SlurmNodeTable.get_jobs():
+            if wanted is not None and not wanted & set(names):
+                continue
+            end = "Unknown"
+            if end_time is not None:
+                end = time.strftime(SLURM_TIME_FORMAT, time.localtime(end_time))
+            nodes = NodeSet.from_nids([NodeTable.nidname_to_nid(name) for name in names])
+            print("%s %s" % (end, nodes.hostlist()))
+        return 0
+
+
+def install_squeue():
+    """Install the 'squeue' mock command in the system
+
+    """
+    SqueueCmd("squeue")
@@ -0,0 +1,371 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""An asyncio implementation of the Rolling Compute Upgrade Agent
+loop.  This runs the same state machine as the blocking loop in
+upgrade_agent.py, but the stages that fan out over the nodes in a step
+(requesting quiesce and returning nodes to the WLM) issue the same
+batched WLM updates as the blocking loop as coroutines.  Node state checks
+use the WLM's batched checks in the executor, so that they share the
+WLM's state snapshot with the blocking loop.
+
+Only the WLM commands are non-blocking.  There is no asynchronous
+client for HSM, BSS, BOS or Kubernetes here, so those requests (and
+the ETCD reads and writes) are still made by the blocking clients,
+each one on a thread of the event loop's executor while it is in
+flight.  The loop itself is never blocked, but it does not remove
+the thread per blocking call.
+
+"""
+import asyncio
+import functools
+import logging
+import time
+from queue import Empty
+
+from ...app import APP
+from .errors import ComputeUpgradeError
+from .node_group import NodeGroup
+from .wlm import get_wlm_handler
+from .upgrade_agent import (
+    UPDATE_MAP,
+    DELETE_MAP,
+    WLM_WAIT_TIMEOUT,
+    start_watching,
+    load_session,
+    advanced,
+    get_step_nodes,
+    get_stage_handler,
+    stage_error_message,
+    finish_session,
+    _trigger_pending,
+    _next_timeout,
+    _fail_nodes_and_step
+)
+from ...models.upgrade_session import (
+    STARTING,
+    QUIESCING,
+    QUIESCED,
+    BOOTING,
+    BOOTED,
+    WLM_WAITING,
+    STREAMING,
+    CLEANUP,
+    STREAMED,
+    SLIDING
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncEngine:
+    """Drives upgrade session events from the watch queue into the
+    asyncio version of the state machine.  Each upgrade session is
+    handled by at most one task at a time, events for a session that
+    is already being handled are deferred and collapsed into a single
+    follow-up pass, as they are in SessionWorkerPool.
+
+    """
+    def __init__(self, pending, loop=None):
+        """Constructor - 'pending' is the pending event scheduler from
+        start_watching().
+
+        """
+        self.pending = pending
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        self.active = set()
+        self.deferred = {}
+        self.tasks = set()
+
+    async def dispatch(self, queue):
+        """Trigger any pending sessions that are due, then wait for the
+        next upgrade session event on 'queue' and start handling it.
+        The (blocking) queue wait runs in the executor so that session
+        tasks keep running while we wait.  A session task that
+        schedules a poll ahead of the current timeout wakes the queue
+        (see CoalescingQueue.wake()), so the wait ends early and the
+        timeout is recomputed on the next dispatch.
+
+        """
+        await self.loop.run_in_executor(None, _trigger_pending, self.pending)
+        get = functools.partial(queue.get, timeout=_next_timeout(self.pending))
+        try:
+            upgrade_session = await self.loop.run_in_executor(None, get)
+        except Empty:
+            return
+        self.submit(upgrade_session)
+
+    def submit(self, upgrade_session):
+        """Start a task to handle 'upgrade_session' unless that session is
+        already being handled, in which case the event is deferred.
+        Returns True if a task was started, False if the event was
+        deferred.
+
+        """
+        upgrade_id = upgrade_session.upgrade_id
+        if upgrade_id in self.active:
+            # Only the latest event matters, the handler always
+            # re-reads the session from ETCD anyway.
+            self.deferred[upgrade_id] = upgrade_session
+            return False
+        self.active.add(upgrade_id)
+        task = self.loop.create_task(self._run(upgrade_session))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return True
+
+    async def _run(self, upgrade_session):
+        """Handle 'upgrade_session' and any events deferred for it while it
+        was being handled.
+
+        """
+        upgrade_id = upgrade_session.upgrade_id
+        try:
+            while upgrade_session is not None:
+                try:
+                    await handle_session_async(upgrade_session, self.pending)
+                except Exception:  # pylint: disable=broad-except
+                    LOGGER.exception("AsyncEngine: handling id=%s failed", upgrade_id)
+                upgrade_session = self.deferred.pop(upgrade_id, None)
+        finally:
+            self.active.discard(upgrade_id)
+
+    async def wait_idle(self):
+        """Wait until no upgrade session tasks are running.
+
+        """
+        while self.tasks:
+            await asyncio.wait(list(self.tasks))
+
+    async def serve(self, queue):  # pragma no unit test (never returns)
+        """Dispatch upgrade session events from 'queue' forever.
+
+        """
+        while True:
+            await self.dispatch(queue)
+
+
+def watch_sessions_async():  # pragma no unit test (never returns)
+    """Drive the upgrade processing in a forever loop using the asyncio
+    engine.
+
+    """
+    queue, pending = start_watching()
+    engine = AsyncEngine(pending)
+    LOGGER.info("watch_sessions_async: processing sessions with the asyncio engine")
+    engine.loop.run_until_complete(engine.serve(queue))
+
+
+async def _blocking(func, *args):
+    """Utility - run the blocking function 'func' with 'args' in the
+    event loop's executor and return its result.
+
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+
+class _ExecutorLock:
+    """Utility - async context manager around the blocking ETCD lock
+    context 'context' (e.g. from UpgradeSession.lock()) that takes and
+    releases the lock in the event loop's executor.
+
+    """
+    def __init__(self, context):
+        """Constructor
+
+        """
+        self.context = context
+
+    async def __aenter__(self):
+        return await _blocking(self.context.__enter__)
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return await _blocking(self.context.__exit__, exc_type, exc_value, traceback)
+
+
+def _in_executor(stage_handler):
+    """Utility - wrap the blocking 'stage_handler' from upgrade_agent.py
+    as a coroutine that runs it in the event loop's executor.
+
+    """
+    @functools.wraps(stage_handler)
+    async def wrapper(upgrade_session, upgrade_progress, step_nodes):
+        return await _blocking(stage_handler, upgrade_session, upgrade_progress, step_nodes)
+    return wrapper
+
+
+async def handle_session_async(upgrade_session, pending):
+    """Coroutine version of handle_session() that runs the asyncio stage
+    handlers, including running the next stage right away (up to
+    AGENT_DIRECT_DISPATCH times) while the session keeps moving to a
+    new stage.
+
+    """
+    async with _ExecutorLock(upgrade_session.lock(timeout=0)) as lock:
+        if not await _blocking(lock.is_acquired):  # pragma no unit test
+            # We didn't get the lock, so someone else has this one...
+            return
+        loaded = await _blocking(load_session, upgrade_session, pending)
+        if loaded is None:
+            return
+        upgrade_session, upgrade_progress = loaded
+        message, error_message, position = await run_stage_async(upgrade_session, upgrade_progress)
+        for _ in range(APP.config['AGENT_DIRECT_DISPATCH']):
+            if not advanced(upgrade_session, upgrade_progress, message, error_message, position):
+                break
+            # We still hold the lock, so the watch event from this
+            # message will find the lock held and be dropped, which
+            # is fine because we go on to the next stage here.
+            LOGGER.info("handle_session_async: id=%s: %s", upgrade_session.upgrade_id, message)
+            await _blocking(upgrade_session.post_message_once, message)
+            pending.reset(upgrade_session.upgrade_id)
+            message, error_message, position = await run_stage_async(upgrade_session, upgrade_progress)
+    await _blocking(finish_session, upgrade_session, pending, message, error_message, position)
+
+
+async def run_stage_async(upgrade_session, upgrade_progress):
+    """Coroutine version of run_stage() that runs the asyncio stage
+    handler for the current stage of 'upgrade_session' once.
+
+    """
+    error_message = False
+    position = (upgrade_progress.stage, upgrade_progress.step)
+    try:
+        step_nodes = await _blocking(get_step_nodes, upgrade_session, upgrade_progress)
+        stage_handler = get_stage_handler(upgrade_session, upgrade_progress,
+                                          ASYNC_UPDATE_MAP, ASYNC_DELETE_MAP)
+        message = await stage_handler(
+            upgrade_session,
+            upgrade_progress,
+            step_nodes
+        )
+    except ComputeUpgradeError as err:  # pragma no unit test
+        error_message = True  # schedule this after reporting error
+        message = stage_error_message(upgrade_session, upgrade_progress, err)
+    return message, error_message, position
+
+
+async def _update_starting(upgrade_session, upgrade_progress, step_nodes):
+    """Coroutine version of upgrade_agent._update_starting() that
+    requests quiescing of all of the nodes in the step without
+    blocking the event loop.
+
+    """
+    LOGGER.debug("_update_starting: id=%s step_nodes=%s", upgrade_session.upgrade_id, step_nodes)
+    step = upgrade_progress.step
+    failed_nodegroup = NodeGroup(upgrade_session.failed_label)
+    members = await _blocking(failed_nodegroup.get_members)
+    if ((step == 0 and members != []) or not step_nodes or
+            upgrade_progress.lookahead_step == step or
+            upgrade_session.upgrade_mode in (STREAMED, SLIDING)):
+        # Clearing the failed node group, moving to CLEANUP and
+        # picking up nodes that were quiesced ahead of time don't
+        # involve requests to the nodes in the step, and streaming
+        # and sliding modes have their own start, so let the blocking handler
+        # take care of them.
+        return await _blocking(UPDATE_MAP[STARTING], upgrade_session, upgrade_progress, step_nodes)
+
+    # Have some nodes, start quiescing them...
+    wlm = get_wlm_handler(upgrade_session.workload_manager_type)
+    await wlm.async_quiesce_many(step_nodes)
+    LOGGER.info("_update_starting: id=%s Change stage to QUIESCING", upgrade_session.upgrade_id)
+    upgrade_progress.stage = QUIESCING
+    await _blocking(upgrade_progress.put)
+    return "Quiesce requested in step %d: moving to QUIESCING" % step
+
+
+async def _update_quiescing(upgrade_session, upgrade_progress, step_nodes):
+    """Coroutine version of upgrade_agent._update_quiescing() that checks
+    the nodes in the step without blocking the event loop.
+
+    """
+    LOGGER.debug("_update_quiescing: id=%s step=%d step_nodes=%s",
+                 upgrade_session.upgrade_id, upgrade_progress.step, step_nodes)
+    step = upgrade_progress.step
+    wlm = get_wlm_handler(upgrade_session.workload_manager_type)
+    quiet = await _blocking(wlm.are_quiet, step_nodes)
+    if not all(quiet.values()):
+        # At least one node is not quiet yet, return None to request
+        # a pause and retry.
+        return None
+    LOGGER.info("_update_quiescing: id=%s Change stage to QUIESCED", upgrade_session.upgrade_id)
+    upgrade_progress.stage = QUIESCED
+    await _blocking(upgrade_progress.put)
+    return "All nodes quiesced in step %d: moving to QUIESCED" % step
+
+
+async def _update_wlm_waiting(upgrade_session, upgrade_progress, step_nodes):
+    """Coroutine version of upgrade_agent._update_wlm_waiting() that
+    checks and resumes the nodes in the step without blocking the
+    event loop.
+
+    """
+    LOGGER.debug("_update_wlm_waiting: id=%s step=%d step_nodes=%s",
+                 upgrade_session.upgrade_id, upgrade_progress.step, step_nodes)
+    step = upgrade_progress.step
+    elapsed = time.time() - upgrade_progress.boot_complete_time
+    if elapsed > WLM_WAIT_TIMEOUT:
+        await _blocking(_fail_nodes_and_step, upgrade_session, upgrade_progress, step_nodes,
+                        "upgrading-time-out-wlm-waiting")
+        return "Waiting for WLM nodes timed out in step %d: marking " \
+            "remaining nodes as failed, advancing to step %d and " \
+            "moving to STARTING" % (step, step + 1)
+
+    check_nodes = [xname for xname in step_nodes
+                   if xname not in upgrade_progress.completed_nodes]
+    LOGGER.debug("_update_wlm_waiting: id=%s check_nodes=%s", upgrade_session.upgrade_id, check_nodes)
+    if check_nodes:
+        wlm = get_wlm_handler(upgrade_session.workload_manager_type)
+        ready = await _blocking(wlm.are_ready, check_nodes)
+        ready_nodes = [xname for xname in check_nodes if ready[xname]]
+        if not ready_nodes:
+            # Nothing came back this time, return None to request a
+            # pause (with backoff) and retry.
+            return None
+        await wlm.async_resume_many(ready_nodes)
+        upgrade_progress.completed_nodes.extend(ready_nodes)
+        await _blocking(upgrade_progress.put)
+        return "Nodes %s returned to the WLM" % str(ready_nodes)
+
+    # Out of nodes to wait for, the blocking handler advances to the
+    # next step.
+    return await _blocking(UPDATE_MAP[WLM_WAITING], upgrade_session, upgrade_progress, step_nodes)
+
+
+# Stage handler coroutine mappings.  Stages that don't fan out over
+# nodes run their blocking handlers in the executor.
+ASYNC_UPDATE_MAP = {
+    STARTING: _update_starting,
+    QUIESCING: _update_quiescing,
+    QUIESCED: _in_executor(UPDATE_MAP[QUIESCED]),
+    BOOTING: _in_executor(UPDATE_MAP[BOOTING]),
+    BOOTED: _in_executor(UPDATE_MAP[BOOTED]),
+    WLM_WAITING: _update_wlm_waiting,
+    STREAMING: _in_executor(UPDATE_MAP[STREAMING]),
+    CLEANUP: _in_executor(UPDATE_MAP[CLEANUP]),
+}
+
+ASYNC_DELETE_MAP = {
+    stage: _in_executor(handler) for stage, handler in DELETE_MAP.items()
+}
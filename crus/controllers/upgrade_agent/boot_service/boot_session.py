@@ -189,6 +189,7 @@ class BootSession:
         LOGGER.debug("BootSession(%s).booting(): api_response = %s", self.upgrade_id, str(api_response))
 
         LOGGER.debug("BootSession(%s).booting(): Setting booting to 'True'", self.upgrade_id)
+        before = (self.progress.booting, self.progress.success)
         self.progress.booting = True
         status = api_response.status
         if status.conditions:
@@ -203,7 +204,10 @@ class BootSession:
                     LOGGER.debug("BootSession(%s).booting(): Failed, setting booting to 'False'", self.upgrade_id)
                     self.progress.success = False
                     self.progress.booting = False
-        self.progress.put()
+        if (self.progress.booting, self.progress.success) != before:
+            # Only write the progress when the job status changed,
+            # most checks find the job still running.
+            self.progress.put()
         LOGGER.debug("BootSession(%s).booting(): returning %s", self.upgrade_id, self.progress.booting)
         return self.progress.booting
 
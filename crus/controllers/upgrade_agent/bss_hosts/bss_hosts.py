@@ -24,27 +24,57 @@
 """BSS Hosts data to support Compute Rolling Upgrade.  Provide node
 state and other information about nodes.
 
+The BSS hosts list is streamed and parsed one host at a time, and only
+the fields CRUS uses are kept for each host, so a large system's host
+list is never held in memory as a whole.
+
 """
+import codecs
 import logging
+import sys
 from ....app import APP, HEADERS
 from ..errors import ComputeUpgradeError
 from ..requests_logger import do_request
+from .json_stream import iter_json_array
 from .wrap_requests import requests
 
 LOGGER = logging.getLogger(__name__)
 BSS_HOSTS_URI = APP.config['BSS_HOSTS_URI']
 HTTPS_VERIFY = APP.config['HTTPS_VERIFY']
+CHUNK_SIZE = 64 * 1024
+
+
+class BSSHost:
+    """The fields of a BSS host that CRUS uses.  The string values are
+    interned, since nearly every host has the same Role, State and
+    Flag.  Only ID, NID and Role are required, a host missing any of
+    the other fields gets a default value for it instead.
+
+    """
+    __slots__ = ['nid', 'role', 'state', 'flag', 'enabled']
+
+    def __init__(self, host):
+        """Constructor - 'host' is the host data from BSS
+
+        """
+        self.nid = host['NID']
+        self.role = sys.intern(host['Role'])
+        self.state = sys.intern(host.get('State', "Unknown"))
+        self.flag = sys.intern(host.get('Flag', "OK"))
+        self.enabled = host.get('Enabled', True)
 
 
 class BSSHostTable:
     """A Host Table containing the information from the BSS hosts API
-    in an easy to use form.
+    in an easy to use form.  If 'role' is specified, only hosts with
+    that Role are kept.
 
     """
-    def __init__(self):
+    def __init__(self, role=None):
         """Constructor - obtains new host information from BSS when run
 
         """
+        self.role = role
         self.hosts = {}
         self.refresh()
 
@@ -52,21 +82,38 @@ class BSSHostTable:
         """ Load the current state of hosts from BSS
 
         """
-        response = do_request(requests.get, BSS_HOSTS_URI, headers=HEADERS, verify=HTTPS_VERIFY)
-        if response.status_code != requests.codes['ok']:  # pragma no unit test
-            # Cannot be reached by unit tests without simulating a
-            # network or service failure.
-            message = "error getting host data from BSS - %s[%d]" % \
-                (response.text, response.status_code)
-            LOGGER.error("BSSHostTable.refresh(): %s", message)
-            raise ComputeUpgradeError(message)
+        response = do_request(requests.get, BSS_HOSTS_URI, headers=HEADERS,
+                              verify=HTTPS_VERIFY, stream=True)
         try:
-            result_data = response.json()
-        except Exception:
-            message = "error getting host data from BSS - error decoding JSON in response"
-            LOGGER.exception("BSSHostTable.refresh(): %s", message)
-            raise ComputeUpgradeError(message)
-        self.hosts = {host['ID']: host for host in result_data}
+            if response.status_code != requests.codes['ok']:  # pragma no unit test
+                # Cannot be reached by unit tests without simulating a
+                # network or service failure.
+                message = "error getting host data from BSS - %s[%d]" % \
+                    (response.text, response.status_code)
+                LOGGER.error("BSSHostTable.refresh(): %s", message)
+                raise ComputeUpgradeError(message)
+            try:
+                self.hosts = self._read_hosts(response)
+            except Exception:
+                message = "error getting host data from BSS - error decoding JSON in response"
+                LOGGER.exception("BSSHostTable.refresh(): %s", message)
+                raise ComputeUpgradeError(message)
+        finally:
+            response.close()
+
+    def _read_hosts(self, response):
+        """Parse the hosts in a streamed BSS hosts response, keeping those
+        with the requested role.
+
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        chunks = (decoder.decode(chunk)
+                  for chunk in response.iter_content(chunk_size=CHUNK_SIZE))
+        hosts = {}
+        for host in iter_json_array(chunks):
+            if self.role is None or host['Role'] == self.role:
+                hosts[sys.intern(host['ID'])] = BSSHost(host)
+        return hosts
 
     def get_all_xnames(self):
         """ Get all of the XNAMEs for hosts in the BSS hosts list.
@@ -82,28 +129,28 @@ class BSSHostTable:
         """Retrieve the NID from a host.
 
         """
-        return self.hosts[xname]['NID']
+        return self.hosts[xname].nid
 
     def get_role(self, xname):
         """Retrieve the Role setting from a host.
 
         """
-        return self.hosts[xname]['Role']
+        return self.hosts[xname].role
 
     def get_state(self, xname):
         """Retrieve the State setting from a host.
 
         """
-        return self.hosts[xname]['State']
+        return self.hosts[xname].state
 
     def get_flag(self, xname):
         """Retrieve the Flag setting from a host.
 
         """
-        return self.hosts[xname]['Flag']
+        return self.hosts[xname].flag
 
     def get_enabled(self, xname):
         """Retrieve the Enabled setting from a host.
 
         """
-        return self.hosts[xname]['Enabled']
+        return self.hosts[xname].enabled
@@ -0,0 +1,98 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Incremental parsing of a JSON array whose text arrives in pieces
+(for example from a streamed HTTP response), so that the items can be
+used and dropped one at a time instead of decoding the whole document
+into memory first.
+
+"""
+import itertools
+import json
+import re
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+DELIMITERS = " \t\n\r,]"
+
+# Parser states: expecting the opening '[', the first item or ']',
+# an item after a ',', a ',' or ']' after an item, and nothing more.
+_START = "start"
+_FIRST = "first"
+_ITEM = "item"
+_SEPARATOR = "separator"
+_DONE = "done"
+
+
+def iter_json_array(chunks):
+    """Generator that yields the decoded items of the top level JSON
+    array whose text is the concatenation of the strings in 'chunks'.
+    Only the item being decoded is held in memory.  Raises ValueError
+    if the text is not a well formed JSON array.
+
+    """
+    decoder = json.JSONDecoder()
+    state = _START
+    text = ""
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+        if not final:
+            text += chunk
+        pos = 0
+        while True:
+            pos = WHITESPACE.match(text, pos).end()
+            if pos == len(text):
+                break
+            char = text[pos]
+            if state == _START:
+                if char != '[':
+                    raise ValueError("expected '[' at start of JSON array")
+                state = _FIRST
+                pos += 1
+            elif state == _DONE:
+                raise ValueError("unexpected data after JSON array")
+            elif state == _SEPARATOR:
+                if char not in ",]":
+                    raise ValueError("expected ',' or ']' in JSON array")
+                state = _ITEM if char == ',' else _DONE
+                pos += 1
+            elif state == _FIRST and char == ']':
+                state = _DONE
+                pos += 1
+            else:
+                try:
+                    item, end = decoder.raw_decode(text, pos)
+                except ValueError:
+                    if final:
+                        raise
+                    break  # incomplete item, wait for more text
+                if not final and char not in '{["' and \
+                   (end == len(text) or text[end] not in DELIMITERS):
+                    # A number may continue in the next chunk, so wait
+                    # until something that ends it has arrived.
+                    break
+                yield item
+                pos = end
+                state = _SEPARATOR
+        text = text[pos:]
+    if state != _DONE:
+        raise ValueError("JSON array is incomplete")
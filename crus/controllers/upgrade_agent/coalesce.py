@@ -0,0 +1,204 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Coalescing of upgrade session watch events
+
+"""
+from collections import OrderedDict
+from queue import Empty
+import threading
+import time
+
+
+class CoalescingQueue:
+    """A stage between the UpgradeSession watch queue and the agent loop
+    that collapses queued events for the same upgrade session into a
+    single entry holding the latest event, and drops events for
+    sessions that are pending in the scheduler (the agent would skip
+    them anyway), unless the event shows the session in a new state
+    (see PendingScheduler.holds()).  A burst of updates to a session thus costs one pass
+    through the state machine instead of one pass per update.
+
+    When several agent replicas share the sessions (see shard.py),
+    events for sessions owned by other replicas are dropped as well.
+
+    Sessions are handed out in the order in which their first queued
+    event arrived, so a busy session can't starve the others.  The
+    get() method is a drop in replacement for the watch queue's get().
+
+    Once start() has been called, a forwarding thread moves events
+    from the watch queue into the coalesced set, and get() waits for
+    them there, so that wake() can cut the wait short.  The queue
+    registers wake() with the PendingScheduler, so a dispatcher
+    sleeping until the earliest due time notices when a session is
+    scheduled ahead of it.
+
+    """
+    def __init__(self, source, pending, membership=None):
+        """Constructor - 'source' is the watch queue and 'pending' the
+        PendingScheduler whose sessions should not be handed out.
+        'membership' is an optional ShardMembership deciding which
+        sessions belong to this agent.
+
+        """
+        self.source = source
+        self.pending = pending
+        self.membership = membership
+        self.events = OrderedDict()
+        self.mutex = threading.Condition()
+        self.forwarder = None
+        self.woken = False
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.foreign = 0
+
+    def start(self):
+        """Start the thread that forwards events from the watch queue and
+        register for wake ups from the pending scheduler.  Calling
+        start() more than once has no further effect.
+
+        """
+        with self.mutex:
+            if self.forwarder is not None:
+                return
+            self.forwarder = threading.Thread(target=self._forward,
+                                              name="coalesce-forwarder",
+                                              daemon=True)
+        self.pending.add_listener(self.wake)
+        self.forwarder.start()
+
+    def wake(self):
+        """Make a get() that is waiting (or the next one that would wait)
+        raise queue.Empty right away so that its caller can go back
+        and look at the pending scheduler.
+
+        """
+        with self.mutex:
+            self.woken = True
+            self.mutex.notify_all()
+
+    def _forward(self):  # pragma no unit test (runs forever)
+        """Forever move events from the watch queue into the coalesced set
+        and let a waiting get() know about them.
+
+        """
+        while True:
+            upgrade_session = self.source.get()
+            with self.mutex:
+                self._add(upgrade_session)
+                self._drain()
+                self.mutex.notify_all()
+
+    def __len__(self):
+        """The number of distinct sessions with an event waiting.
+
+        """
+        with self.mutex:
+            return len(self.events)
+
+    def _add(self, upgrade_session):
+        """Add an event to the coalesced set, replacing any earlier event
+        for the same session but keeping that session's place in line.
+
+        """
+        self.received += 1
+        upgrade_id = upgrade_session.upgrade_id
+        if upgrade_id in self.events:
+            self.coalesced += 1
+        self.events[upgrade_id] = upgrade_session
+
+    def _drain(self):
+        """Move everything that is already waiting in the source queue into
+        the coalesced set without blocking.
+
+        """
+        while True:
+            try:
+                self._add(self.source.get(block=False))
+            except Empty:
+                return
+
+    def _take(self):
+        """Remove and return the oldest coalesced event for a session that
+        is not held by the pending scheduler, or None if there is none.
+
+        """
+        while self.events:
+            upgrade_id, upgrade_session = self.events.popitem(last=False)
+            if self.pending.holds(upgrade_id, upgrade_session.state):
+                self.dropped += 1
+                continue
+            if self.membership is not None and not self.membership.owns(upgrade_id):
+                self.foreign += 1
+                continue
+            return upgrade_session
+        return None
+
+    def get(self, timeout=None):
+        """Return the next (latest) upgrade session event, waiting up to
+        'timeout' seconds (forever if 'timeout' is None) for one to
+        arrive.  Raises queue.Empty if the timeout expires or wake()
+        is called.
+
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.mutex:
+            self._drain()
+            upgrade_session = self._take()
+            if upgrade_session is not None:
+                return upgrade_session
+            if self.forwarder is not None:
+                return self._wait(deadline)
+        # Nothing usable yet and nothing forwarding events, wait for
+        # the source outside the mutex so that stats and len() remain
+        # available while we wait.
+        upgrade_session = self.source.get(timeout=timeout)
+        with self.mutex:
+            self._add(upgrade_session)
+            self._drain()
+            upgrade_session = self._take()
+        if upgrade_session is None:
+            # Everything that arrived was for pending sessions (or
+            # other agents' sessions), let the caller go back and
+            # process pending.
+            raise Empty
+        return upgrade_session
+
+    def _wait(self, deadline):
+        """Called with the mutex held, wait until the forwarding thread
+        provides a usable event, wake() is called or 'deadline' (a
+        time, or None for no deadline) passes.
+
+        """
+        while True:
+            if self.woken:
+                self.woken = False
+                raise Empty
+            remaining = deadline - time.time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise Empty
+            self.mutex.wait(remaining)
+            upgrade_session = self._take()
+            if upgrade_session is not None:
+                return upgrade_session
@@ -0,0 +1,40 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Ordering of the nodes of an upgrade by when the jobs running on them
+are expected to end, so that each step is made of nodes that finish
+quiescing at about the same time.
+
+"""
+
+
+def order_by_job_end(xnames, job_ends):
+    """Order the nodes in 'xnames' by when they are expected to become
+    idle.  'job_ends' is a dictionary of the time at which the last
+    job running on each busy node is expected to end, indexed by
+    xname.  Nodes that are not in 'job_ends' are idle and come first.
+    Nodes expected to become idle at the same time keep their order
+    from 'xnames'.
+
+    """
+    return sorted(xnames, key=lambda xname: job_ends.get(xname, 0.0))
@@ -0,0 +1,260 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Compact sets of nodes held as ranges of NIDs
+
+"""
+import bisect
+import heapq
+import re
+from .errors import ComputeUpgradeError
+from .node_table import NodeTable
+
+# The width of the NID in a slurm node name (e.g. nid000001)
+NID_WIDTH = 6
+
+# An item of a slurm hostlist expression, which is either a name or a
+# prefix followed by a bracketed list of numbers and ranges of numbers,
+# and the parts of each kind of item.
+_HOSTLIST_ITEM = re.compile(r"[^,\[]+(?:\[[^\]]*\])?")
+_RANGED_ITEM = re.compile(r"^([^\[]*)\[([0-9,-]+)\]$")
+_PLAIN_ITEM = re.compile(r"^(.*?)([0-9]*)$")
+
+
+def parse_hostlist(expr):
+    """Parse a slurm hostlist expression (e.g. 'nid[000001-000003,000007]'
+    or a comma separated list of names and expressions) into a list
+    of (prefix, first, last) tuples, one for each name or range of
+    names, where 'first' and 'last' are the digits that follow
+    'prefix' in the first and last names of the range.  The digits
+    of a name that does not end in a number are empty strings.
+
+    """
+    spans = []
+    for item in _HOSTLIST_ITEM.findall(expr):
+        match = _RANGED_ITEM.match(item)
+        if match is None:
+            prefix, number = _PLAIN_ITEM.match(item).groups()
+            spans.append((prefix, number, number))
+            continue
+        prefix, ranges = match.groups()
+        for span in ranges.split(','):
+            first, _, last = span.partition('-')
+            spans.append((prefix, first, last or first))
+    return spans
+
+
+class NodeSet:
+    """An immutable set of nodes stored as a sorted list of disjoint,
+    non-adjacent, inclusive (first, last) ranges of NIDs, so that its
+    size, and the size of its hostlist and ETCD encodings, grows with
+    the number of ranges rather than the number of nodes.  Membership
+    is a binary search and union, difference and intersection are a
+    single pass over the ranges of both sets.
+
+    """
+    def __init__(self, ranges=()):
+        """Constructor - 'ranges' is any iterable of (first, last) NID
+        pairs, which need not be sorted and may overlap.
+
+        """
+        self._set_ranges(sorted((int(first), int(last)) for first, last in ranges))
+
+    def _set_ranges(self, ranges):
+        """Set the ranges of the NodeSet from 'ranges', (first, last) NID
+        pairs already sorted by first NID, merging any that overlap or
+        are adjacent in one pass.
+
+        """
+        merged = []
+        for first, last in ranges:
+            if first > last:
+                continue
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        self.ranges = [tuple(span) for span in merged]
+        self.firsts = [first for first, _ in self.ranges]
+
+    @classmethod
+    def _from_sorted(cls, ranges):
+        """Utility - make a NodeSet from 'ranges', (first, last) NID pairs
+        already sorted by first NID, without sorting them again.
+
+        """
+        node_set = cls()
+        node_set._set_ranges(ranges)  # pylint: disable=protected-access
+        return node_set
+
+    @classmethod
+    def from_nids(cls, nids):
+        """Make a NodeSet from an iterable of integer NIDs.
+
+        """
+        return cls((nid, nid) for nid in nids)
+
+    @classmethod
+    def from_xnames(cls, xnames):
+        """Make a NodeSet from an iterable of XNAMEs.
+
+        """
+        return cls.from_nids(NodeTable.get_nid(xname) for xname in xnames)
+
+    @classmethod
+    def from_hostlist(cls, expr):
+        """Make a NodeSet from a slurm hostlist expression of nid names
+        (e.g. 'nid[000001-000004,000009],nid000012').
+
+        """
+        ranges = []
+        for prefix, first, last in parse_hostlist(expr):
+            if prefix != "nid" or not first:
+                raise ComputeUpgradeError("'%s' is not a nid hostlist" % expr)
+            ranges.append((first, last))
+        return cls(ranges)
+
+    @classmethod
+    def decode(cls, encoded):
+        """Make a NodeSet from the output of encode() (e.g. as read back
+        from ETCD).
+
+        """
+        return cls((first, last) for first, last in encoded)
+
+    def encode(self):
+        """Encode the NodeSet as a JSON friendly list of [first, last] NID
+        pairs.
+
+        """
+        return [[first, last] for first, last in self.ranges]
+
+    def hostlist(self):
+        """Format the NodeSet as a slurm hostlist expression of nid names.
+
+        """
+        spans = [
+            "%0*d" % (NID_WIDTH, first) if first == last
+            else "%0*d-%0*d" % (NID_WIDTH, first, NID_WIDTH, last)
+            for first, last in self.ranges
+        ]
+        if not spans:
+            return ""
+        if len(self) == 1:
+            return "nid%s" % spans[0]
+        return "nid[%s]" % ",".join(spans)
+
+    def nids(self):
+        """Generate the NIDs in the NodeSet in ascending order.
+
+        """
+        for first, last in self.ranges:
+            for nid in range(first, last + 1):
+                yield nid
+
+    def xnames(self):
+        """Get the XNAMEs of the nodes in the NodeSet in NID order.
+
+        """
+        return [NodeTable.get_xname(nid) for nid in self.nids()]
+
+    def __iter__(self):
+        """Iterate over the NIDs in the NodeSet.
+
+        """
+        return self.nids()
+
+    def __len__(self):
+        """The number of nodes in the NodeSet.
+
+        """
+        return sum(last - first + 1 for first, last in self.ranges)
+
+    def __contains__(self, nid):
+        """Check whether the integer NID 'nid' is in the NodeSet.
+
+        """
+        index = bisect.bisect_right(self.firsts, nid) - 1
+        return index >= 0 and nid <= self.ranges[index][1]
+
+    def __eq__(self, other):
+        """NodeSets are equal if they hold the same nodes.
+
+        """
+        return isinstance(other, NodeSet) and self.ranges == other.ranges
+
+    def __hash__(self):
+        """NodeSets are immutable, so they can be hashed.
+
+        """
+        return hash(tuple(self.ranges))
+
+    def __repr__(self):
+        """Show the NodeSet as its hostlist.
+
+        """
+        return "NodeSet('%s')" % self.hostlist()
+
+    def __str__(self):
+        """The NodeSet as a string is its hostlist.
+
+        """
+        return self.hostlist()
+
+    def union(self, other):
+        """The nodes in either this NodeSet or 'other'.
+
+        """
+        return NodeSet._from_sorted(heapq.merge(self.ranges, other.ranges))
+
+    def difference(self, other):
+        """The nodes in this NodeSet that are not in 'other'.
+
+        """
+        ranges = []
+        others = other.ranges
+        index = 0
+        for first, last in self.ranges:
+            # Skip the other ranges that end before this one starts.
+            while index < len(others) and others[index][1] < first:
+                index += 1
+            probe = index
+            while probe < len(others) and others[probe][0] <= last:
+                other_first, other_last = others[probe]
+                if other_first > first:
+                    ranges.append((first, other_first - 1))
+                first = max(first, other_last + 1)
+                probe += 1
+            if first <= last:
+                ranges.append((first, last))
+        return NodeSet._from_sorted(ranges)
+
+    def intersection(self, other):
+        """The nodes in both this NodeSet and 'other'.
+
+        """
+        return self.difference(self.difference(other))
+
+    __or__ = union
+    __sub__ = difference
+    __and__ = intersection
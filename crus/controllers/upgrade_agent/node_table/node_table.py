@@ -24,9 +24,127 @@
 """Node data to support Compute Rolling Upgrade.  Provides mappings
 between different naming methods (XNAME, NID, NID Name) for nodes.
 
+The mappings are reloaded from BSS in the background once they are
+older than NODE_TABLE_TTL seconds, and right away (at most once every
+NODE_TABLE_MISS_INTERVAL seconds) when a node that is not in them is
+looked up, so nodes added after the agent starts are picked up without
+a restart.  A reload builds a new NodeMap and swaps it in as a whole,
+so lookups never see a partially loaded table.  Each NodeMap also
+holds the Topology of its nodes, parsed from their XNAMEs when the
+map is built, for cabinet, chassis, slot and board level queries.
+
+Each node list that differs from the last one is saved as a snapshot
+in ETCD (unless NODE_TABLE_SNAPSHOT is off).  When the agent starts it
+serves lookups from that snapshot right away and reconciles it with
+BSS in the background, so a restart neither waits for BSS nor fails
+while BSS is unavailable.
+
 """
+import logging
 import re
+import sys
+import threading
+import time
+from ....app import APP
+from ....models.node_table_snapshot import NodeTableSnapshot
 from ..bss_hosts import BSSHostTable
+from ..errors import ComputeUpgradeError
+from .topology import Topology
+
+LOGGER = logging.getLogger(__name__)
+SNAPSHOT_ID = "compute"
+
+
+def make_nidname(nid):
+    """Compose the NID based name ('nidNNNNNN') of a node from its NID.
+
+    """
+    return "nid%6.6d" % nid
+
+
+class NodeMap:
+    """An unchanging snapshot of the node name mappings.  NIDs are small
+    dense integers, so the NID to XNAME and NID to NID Name mappings are
+    lists indexed by NID (holding None where there is no node) and only
+    the XNAME to NID mapping is a dictionary.  XNAMEs are interned and
+    shared between the list and the dictionary.  The topology
+    coordinates of the nodes are held in a NID indexed Topology.
+
+    """
+    __slots__ = ['xnames', 'nidnames', 'nids', 'topology', 'loaded']
+
+    def __init__(self, nodes, previous=None, loaded=None):
+        """Constructor - 'nodes' is a dictionary of NIDs indexed by XNAME.
+        The name strings of nodes that are unchanged since the
+        'previous' NodeMap are reused from it rather than built again.
+        'loaded' is the time.monotonic() time at which 'nodes' was read
+        from BSS, by default now.
+
+        """
+        size = max(nodes.values(), default=-1) + 1
+        old_xnames = previous.xnames if previous is not None else []
+        old_nidnames = previous.nidnames if previous is not None else []
+        self.xnames = [None] * size
+        self.nidnames = [None] * size
+        self.nids = {}
+        for xname, nid in nodes.items():
+            if nid < len(old_xnames) and old_xnames[nid] == xname:
+                xname = old_xnames[nid]
+                nidname = old_nidnames[nid]
+            else:
+                xname = sys.intern(xname)
+                nidname = make_nidname(nid)
+            self.xnames[nid] = xname
+            self.nidnames[nid] = nidname
+            self.nids[xname] = nid
+        self.topology = Topology(
+            self.xnames, previous.topology if previous is not None else None
+        )
+        self.loaded = time.monotonic() if loaded is None else loaded
+
+    def __len__(self):
+        """The number of nodes in the map.
+
+        """
+        return len(self.nids)
+
+    def get_nid(self, xname):
+        """Get the NID of a node from its XNAME, raising KeyError if there
+        is no such node.
+
+        """
+        return self.nids[xname]
+
+    def get_nidname(self, xname):
+        """Get the NID Name of a node from its XNAME, raising KeyError if
+        there is no such node.
+
+        """
+        return self.nidnames[self.nids[xname]]
+
+    def get_xname(self, nid):
+        """Get the XNAME of a node from its NID, raising KeyError if there
+        is no such node.
+
+        """
+        xname = self.xnames[nid] if 0 <= nid < len(self.xnames) else None
+        if xname is None:
+            raise KeyError(nid)
+        return xname
+
+    def get_topology(self, xname):
+        """Get the topology coordinates of a node from its XNAME (None if
+        the XNAME is not a node XNAME), raising KeyError if there is no
+        such node.
+
+        """
+        return self.topology.coordinates(self.nids[xname])
+
+    def get_all_xnames(self):
+        """Get a new list of the XNAMEs of all of the nodes in NID order.
+
+        """
+        return [xname for xname in self.xnames if xname is not None]
 
 
 class NodeTable:
@@ -35,51 +153,140 @@ class NodeTable:
     know about nodes.
 
     """
-    _instance = None
+    _map = None
+    _refreshing = False
+    _last_miss = None
+    _last_failure = None
+    _lock = threading.Lock()
 
     @classmethod
     def create(cls):
-        """ Singleton table creator.
+        """ Singleton table creator.  Starts from the saved snapshot if
+        there is one, otherwise loads the node list from BSS.
+        """
+        if cls._map is not None:
+            return
+        with cls._lock:
+            if cls._map is not None:
+                return
+            node_map = cls._load_snapshot()
+            if node_map is not None:
+                cls._map = node_map
+                return
+            cls._map = NodeMap(cls._learn_nodes())
+        cls.save_snapshot()
+
+    @classmethod
+    def refresh(cls):
+        """Reload the node list from BSS now and swap the new mappings in
+        for the old ones.
+
         """
-        if cls._instance is None:
-            cls._instance = cls()
+        cls.create()
+        previous = cls._map
+        node_map = NodeMap(cls._learn_nodes(), previous)
+        cls._map = node_map
+        added = len(node_map.nids.keys() - previous.nids.keys())
+        removed = len(previous.nids.keys() - node_map.nids.keys())
+        if added or removed:
+            LOGGER.info("NodeTable: refreshed from BSS - %d nodes, "
+                        "%d added, %d removed", len(node_map), added, removed)
+        if node_map.nids != previous.nids:
+            cls.save_snapshot()
+
+    @classmethod
+    def save_snapshot(cls):
+        """Save the current node list as the snapshot to start from next
+        time.  A failure to save is logged and otherwise ignored.
+
+        """
+        if not APP.config['NODE_TABLE_SNAPSHOT']:
+            return
+        snapshot = NodeTableSnapshot(snapshot_id=SNAPSHOT_ID, saved=time.time())
+        snapshot.set_nodes(cls._map.nids)
+        try:
+            snapshot.put()
+        # pylint: disable=broad-except
+        except Exception:  # pragma no unit test (ETCD does not fail in mock)
+            LOGGER.exception("NodeTable: failed to save the node table snapshot")
 
     @classmethod
     def get_nid(cls, xname):
         """Get a NID for a node based on its XNAME
 
         """
-        cls.create()
-        return cls._instance.nids_by_xname[xname]
+        return cls._lookup(NodeMap.get_nid, xname)
 
     @classmethod
     def get_nidname(cls, xname):
         """Get a NID based name for a node based on its XNAME
 
         """
-        cls.create()
-        nid = cls._instance.nids_by_xname[xname]
-        return "nid%6.6d" % nid
+        return cls._lookup(NodeMap.get_nidname, xname)
 
     @classmethod
     def get_xname(cls, nid):
         """Get an XNAME for a node based on its NID
 
         """
-        cls.create()
-        return cls._instance.xnames_by_nid[nid]
+        return cls._lookup(NodeMap.get_xname, nid)
 
     @classmethod
     def get_all_xnames(cls):
         """ Get the list of all recognized XNAMEs in the NodeTable.
 
         """
-        cls.create()
-        # Comprehension used here to avoid returning the list
-        # reference
-        #
-        # pylint: disable=unnecessary-comprehension
-        return [xname for xname in cls._instance.nodes]
+        return cls._current().get_all_xnames()
+
+    @classmethod
+    def get_topology(cls, xname):
+        """Get the (cabinet, chassis, slot, board, node) coordinates of a
+        node based on its XNAME, or None if the XNAME is not a node
+        XNAME.  As for get_nid(), raises KeyError if the XNAME is not in
+        the NodeTable.
+
+        """
+        return cls._lookup(NodeMap.get_topology, xname)
+
+    @classmethod
+    def get_xnames_in(cls, *coordinates):
+        """Get the XNAMEs, in NID order, of the nodes in the component
+        identified by 'coordinates' (for example get_xnames_in(1000, 3)
+        for the nodes in chassis 3 of cabinet 1000).
+
+        """
+        node_map = cls._current()
+        return [node_map.xnames[nid] for nid in node_map.topology.nids_in(*coordinates)]
+
+    @classmethod
+    def group_by(cls, xnames, level):
+        """Group XNAMEs by the component at 'level' ('cabinet', 'chassis',
+        'slot', 'board' or 'node') that holds them.  Returns a
+        dictionary of lists of XNAMEs, in the order they appear in
+        'xnames', indexed by the coordinates of the component (for
+        example (cabinet, chassis) for 'chassis').  XNAMEs that are not
+        node XNAMEs are grouped under None.  Raises ComputeUpgradeError
+        if a node in 'xnames' is not in the NodeTable.
+
+        """
+        xnames = list(xnames)
+        node_map, nids = cls._map_nids(xnames)
+        groups = {}
+        for xname, key in zip(xnames, node_map.topology.keys(nids, level)):
+            groups.setdefault(key, []).append(xname)
+        return groups
+
+    @classmethod
+    def count_by(cls, level, xnames=None):
+        """Count the nodes (all of them, or those in 'xnames') in each
+        component at 'level'.  Returns a dictionary of counts indexed as
+        for group_by().
+
+        """
+        if xnames is None:
+            return cls._current().topology.count(level)
+        node_map, nids = cls._map_nids(list(xnames))
+        return node_map.topology.count(level, nids)
 
     @staticmethod
     def nidname_to_nid(nidname):
@@ -96,20 +303,120 @@ class NodeTable:
         """Learn the node list from the BSS
 
         """
-        host_table = BSSHostTable()
+        host_table = BSSHostTable(role="Compute")
         xnames = host_table.get_all_xnames()
-        nodes = {xname: host_table.get_nid(xname) for xname in xnames
-                 if host_table.get_role(xname) == "Compute"}
+        nodes = {xname: host_table.get_nid(xname) for xname in xnames}
         return nodes
 
-    def __init__(self):
-        """Constructor
+    @staticmethod
+    def _load_snapshot():
+        """Get a NodeMap from the saved snapshot, or None if there is no
+        usable snapshot.  The NodeMap is marked as never loaded from
+        BSS so that it is reconciled with BSS as soon as it is used.
+
+        """
+        if not APP.config['NODE_TABLE_SNAPSHOT']:
+            return None
+        try:
+            snapshot = NodeTableSnapshot.get(SNAPSHOT_ID)
+            if snapshot is None:
+                return None
+            nodes = snapshot.get_nodes()
+        # pylint: disable=broad-except
+        except Exception:
+            LOGGER.warning("NodeTable: ignoring the node table snapshot",
+                           exc_info=True)
+            return None
+        LOGGER.info("NodeTable: starting from the %d node snapshot saved at "
+                    "%s, reconciling with BSS in the background",
+                    len(nodes), time.ctime(snapshot.saved))
+        return NodeMap(nodes, loaded=float('-inf'))
+
+    @classmethod
+    def _current(cls):
+        """Get the current NodeMap, starting a background reload if it is
+        older than NODE_TABLE_TTL.  The current map keeps serving
+        lookups until the reload swaps in its replacement.  After a
+        failed reload, the next one waits NODE_TABLE_MISS_INTERVAL.
+
+        """
+        cls.create()
+        node_map = cls._map
+        now = time.monotonic()
+        if now - node_map.loaded >= APP.config['NODE_TABLE_TTL']:
+            with cls._lock:
+                start = not cls._refreshing and (
+                    cls._last_failure is None or
+                    now - cls._last_failure >= APP.config['NODE_TABLE_MISS_INTERVAL']
+                )
+                cls._refreshing = cls._refreshing or start
+            if start:
+                threading.Thread(target=cls._background_refresh,
+                                 name="node-table-refresh",
+                                 daemon=True).start()
+        return node_map
+
+    @classmethod
+    def _background_refresh(cls):
+        """Thread body for a background reload of the node list.
+
+        """
+        try:
+            cls.refresh()
+            cls._last_failure = None
+        # pylint: disable=broad-except
+        except Exception:  # pragma no unit test (BSS does not fail in mock)
+            cls._last_failure = time.monotonic()
+            LOGGER.exception("NodeTable: background refresh failed, "
+                             "keeping the current node list")
+        finally:
+            with cls._lock:
+                cls._refreshing = False
+
+    @classmethod
+    def _map_nids(cls, xnames):
+        """Get the current NodeMap and the NIDs in it of the nodes in the
+        list 'xnames', reloading the node list (as for get_nid()) if any
+        of them is unknown.  Raises ComputeUpgradeError naming the node
+        if one is still not known.
+
+        """
+        node_map = cls._current()
+        try:
+            return node_map, [node_map.nids[xname] for xname in xnames]
+        except KeyError as err:
+            unknown = err.args[0]
+        try:
+            cls._lookup(NodeMap.get_nid, unknown)
+            node_map = cls._map
+            return node_map, [node_map.get_nid(xname) for xname in xnames]
+        except KeyError as err:
+            message = "node '%s' is not in the node table" % err.args[0]
+            raise ComputeUpgradeError(message) from err
+
+    @classmethod
+    def _lookup(cls, lookup, key):
+        """Look up 'key' in the current NodeMap using the NodeMap method
+        'lookup'.  If the key is not there, reload the node list right
+        away (unless that was done less than NODE_TABLE_MISS_INTERVAL
+        seconds ago) and try once more, so that a newly added node is
+        found.  Raises KeyError if the node is still not known.
 
         """
-        self.nodes = self._learn_nodes()
-        self.nids_by_xname = {}
-        self.xnames_by_nid = {}
-        for xname in self.nodes:
-            nid = self.nodes[xname]
-            self.nids_by_xname[xname] = nid
-            self.xnames_by_nid[nid] = xname
+        try:
+            return lookup(cls._current(), key)
+        except KeyError:
+            now = time.monotonic()
+            with cls._lock:
+                interval = APP.config['NODE_TABLE_MISS_INTERVAL']
+                if cls._last_miss is not None and \
+                   now - cls._last_miss < interval:
+                    raise
+                cls._last_miss = now
+            try:
+                cls.refresh()
+            except ComputeUpgradeError as err:
+                LOGGER.warning("NodeTable: failed to refresh for unknown "
+                               "node %s: %s", key, err)
+                raise KeyError(key) from err
+        return lookup(cls._map, key)
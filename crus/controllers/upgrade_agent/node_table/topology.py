@@ -0,0 +1,179 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Hardware topology of nodes, parsed from their XNAMEs.
+
+An XNAME such as 'x1000c3s28b0n1' names node 1 on board 0 in slot 28
+of chassis 3 in cabinet 1000.  The Topology of a set of nodes holds
+those coordinates in one integer array per level, indexed by NID, so
+that they are parsed once per node.  Queries for the nodes in a
+component use a sorted index of the coordinates rather than scanning
+every node.
+
+"""
+from array import array
+from bisect import bisect_left
+from collections import Counter
+import re
+
+# The levels of the topology, from largest to smallest.
+LEVELS = ("cabinet", "chassis", "slot", "board", "node")
+XNAME_PATTERN = re.compile(r"^x([0-9]+)c([0-9]+)s([0-9]+)b([0-9]+)n([0-9]+)$")
+# The coordinate stored for a node that has no XNAME or whose XNAME is
+# not a node XNAME.
+NO_COORDINATE = -1
+
+
+def parse_xname(xname):
+    """Parse a node XNAME into its (cabinet, chassis, slot, board, node)
+    coordinates.  Returns None if 'xname' is not a node XNAME.
+
+    """
+    match = XNAME_PATTERN.match(xname)
+    if match is None:
+        return None
+    return tuple(int(coordinate, 10) for coordinate in match.groups())
+
+
+def level_depth(level):
+    """Get the number of coordinates that identify a component at
+    'level' (for example 2, cabinet and chassis, for 'chassis').
+
+    """
+    try:
+        return LEVELS.index(level) + 1
+    except ValueError:
+        raise ValueError("unknown topology level '%s', expected one of %s" %
+                         (level, ", ".join(LEVELS)))
+
+
+class Topology:
+    """The topology coordinates of the nodes named by a NID indexed list
+    of XNAMEs, held as one array per level.  The coordinates of nodes
+    whose XNAME is unchanged since the 'previous' Topology are copied
+    from it rather than parsed again.  The index used by nids_in() is
+    built on first use.
+
+    """
+    __slots__ = ['xnames', 'columns', 'index']
+
+    def __init__(self, xnames, previous=None):
+        """Constructor
+
+        """
+        self.xnames = xnames
+        self.columns = [array('i', [NO_COORDINATE]) * len(xnames) for _ in LEVELS]
+        self.index = None
+        old_xnames = previous.xnames if previous is not None else []
+        for nid, xname in enumerate(xnames):
+            if xname is None:
+                continue
+            if nid < len(old_xnames) and old_xnames[nid] is xname:
+                for column, old_column in zip(self.columns, previous.columns):
+                    column[nid] = old_column[nid]
+                continue
+            coordinates = parse_xname(xname)
+            if coordinates is None:
+                continue
+            for column, coordinate in zip(self.columns, coordinates):
+                column[nid] = coordinate
+
+    def coordinates(self, nid):
+        """Get the (cabinet, chassis, slot, board, node) coordinates of the
+        node with NID 'nid', or None if its XNAME is not a node XNAME.
+
+        """
+        if self.columns[0][nid] == NO_COORDINATE:
+            return None
+        return tuple(column[nid] for column in self.columns)
+
+    def key(self, nid, level):
+        """Get the coordinates of the component at 'level' that holds the
+        node with NID 'nid' (for example (cabinet, chassis) for
+        'chassis'), or None if its XNAME is not a node XNAME.
+
+        """
+        if self.columns[0][nid] == NO_COORDINATE:
+            return None
+        return tuple(column[nid] for column in self.columns[:level_depth(level)])
+
+    def nids_in(self, *coordinates):
+        """Get the NIDs, in ascending order, of the nodes in the component
+        identified by 'coordinates' (for example cabinet 1000 chassis 3
+        is (1000, 3)).
+
+        """
+        if not coordinates:
+            raise ValueError("at least a cabinet number is required")
+        if len(coordinates) > len(LEVELS):
+            raise ValueError("too many topology coordinates: %s" % (coordinates,))
+        if self.index is None:
+            self.index = sorted(
+                (self.coordinates(nid), nid)
+                for nid, value in enumerate(self.columns[0])
+                if value != NO_COORDINATE
+            )
+        # Every node in the component sorts at or after
+        # (coordinates, ...) and before the next component at the same
+        # level.
+        end = coordinates[:-1] + (coordinates[-1] + 1,)
+        first = bisect_left(self.index, (coordinates,))
+        last = bisect_left(self.index, (end,), first)
+        return sorted(nid for _, nid in self.index[first:last])
+
+    def keys(self, nids, level):
+        """Get the key() of the component at 'level' holding each node in
+        'nids', as a list in the same order as 'nids'.
+
+        """
+        columns = self.columns[:level_depth(level)]
+        first = columns[0]
+        return [
+            None if first[nid] == NO_COORDINATE
+            else tuple(column[nid] for column in columns)
+            for nid in nids
+        ]
+
+    def group(self, nids, level):
+        """Group the NIDs in 'nids' by the component at 'level' that holds
+        them.  Returns a dictionary of lists of NIDs, in the order they
+        appear in 'nids', indexed by the key() of the component.  Nodes
+        whose XNAMEs are not node XNAMEs are grouped under None.
+
+        """
+        nids = list(nids)
+        groups = {}
+        for nid, key in zip(nids, self.keys(nids, level)):
+            groups.setdefault(key, []).append(nid)
+        return groups
+
+    def count(self, level, nids=None):
+        """Count the nodes (all of them, or those in 'nids') in each
+        component at 'level'.  Returns a dictionary of counts indexed by
+        the key() of the component, with nodes whose XNAMEs are not node
+        XNAMEs counted under None.
+
+        """
+        if nids is None:
+            nids = [nid for nid, xname in enumerate(self.xnames) if xname is not None]
+        return dict(Counter(self.keys(nids, level)))
@@ -0,0 +1,237 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Scheduler for upgrade sessions that are waiting to be re-examined
+
+"""
+import heapq
+import itertools
+import threading
+
+
+class PendingScheduler:
+    """A timer scheduler holding the upgrade sessions that have asked to
+    be re-examined at some time in the future.  Entries are kept in a
+    heap ordered by due time and indexed by Upgrade ID, so checking
+    whether a session is pending costs O(1) and scheduling or
+    retrieving a session costs O(log n).
+
+    Each Upgrade ID is present at most once.  Scheduling an Upgrade
+    ID that is already pending keeps whichever deadline is earliest.
+    Superseded heap entries are left in place and discarded lazily as
+    they reach the top of the heap.
+
+    The scheduler also counts, per Upgrade ID, the consecutive polls
+    that found no progress, so that waiting sessions can back off
+    under a PollPolicy.  The count restarts when the session makes
+    progress or starts polling for something different.
+
+    A session is scheduled along with the session state (UPDATING,
+    DELETING...) it was in.  While it is pending, watch events for the
+    session in that same state are held until the poll, but an event
+    showing a new state (e.g. a user deleting a session that is
+    waiting on a long drain) cancels the poll so it can be handled
+    right away (see holds()).
+
+    The scheduler is safe to share between the dispatching thread and
+    the workers of a SessionWorkerPool.  Since the dispatching thread
+    sleeps until the earliest due time, listeners added with
+    add_listener() are called whenever a session is scheduled ahead
+    of everything else, so that the dispatcher can be woken up to
+    recompute its timeout.
+
+    """
+    def __init__(self):
+        """Constructor
+
+        """
+        self.heap = []
+        self.due_by_id = {}
+        # A tie breaker for entries with identical due times so that
+        # heap comparisons never fall through to the Upgrade ID.
+        self.sequence = itertools.count()
+        # Upgrade ID -> (poll key, consecutive polls without progress)
+        self.backoff = {}
+        # Upgrade ID -> session state when it was scheduled
+        self.state_by_id = {}
+        self.listeners = []
+        self.mutex = threading.Lock()
+
+    def __len__(self):
+        """The number of distinct upgrade sessions that are pending.
+
+        """
+        with self.mutex:
+            return len(self.due_by_id)
+
+    def __contains__(self, upgrade_id):
+        """Membership test, same as is_pending().
+
+        """
+        return self.is_pending(upgrade_id)
+
+    def is_pending(self, upgrade_id):
+        """Check whether the session identified by 'upgrade_id' is
+        currently scheduled.
+
+        """
+        with self.mutex:
+            return upgrade_id in self.due_by_id
+
+    def holds(self, upgrade_id, state):
+        """Check whether a watch event for the session identified by
+        'upgrade_id', now in session state 'state', should be held
+        until the session's scheduled poll.  If the session was
+        scheduled in a different state, it is removed from the
+        schedule and its backoff is forgotten, so that the event is
+        handled right away instead.
+
+        """
+        with self.mutex:
+            if upgrade_id not in self.due_by_id:
+                return False
+            scheduled_state = self.state_by_id.get(upgrade_id, None)
+            if scheduled_state is None or scheduled_state == state:
+                return True
+            del self.due_by_id[upgrade_id]
+            del self.state_by_id[upgrade_id]
+            self.backoff.pop(upgrade_id, None)
+            return False
+
+    def add_listener(self, listener):
+        """Register 'listener', a function taking no arguments, to be
+        called whenever scheduling a session makes the earliest due
+        time earlier.
+
+        """
+        with self.mutex:
+            self.listeners.append(listener)
+
+    def schedule(self, upgrade_id, due, state=None):
+        """Schedule the session identified by 'upgrade_id' to be triggered
+        at time 'due'.  If the session is already scheduled, the
+        earlier of the two deadlines wins.  The session state 'state'
+        (if given) is remembered for holds().  Returns the resulting
+        due time for the session.
+
+        """
+        with self.mutex:
+            if state is not None:
+                self.state_by_id[upgrade_id] = state
+            current = self.due_by_id.get(upgrade_id, None)
+            if current is not None and current <= due:
+                return current
+            self._discard_stale()
+            earliest = not self.heap or due < self.heap[0][0]
+            self.due_by_id[upgrade_id] = due
+            heapq.heappush(self.heap, (due, next(self.sequence), upgrade_id))
+            self._compact()
+            listeners = list(self.listeners) if earliest else []
+        # Call the listeners without the mutex, they may well want to
+        # look at the schedule.
+        for listener in listeners:
+            listener()
+        return due
+
+    def poll(self, upgrade_id, key, policy, now, state=None):
+        """Schedule the next poll of the session identified by 'upgrade_id'
+        (in session state 'state') using the PollPolicy 'policy'.  The
+        interval grows with each consecutive call for the same 'key'
+        (e.g. the stage being waited on) until reset() is called or
+        the key changes.  Returns the resulting due time for the
+        session.
+
+        """
+        with self.mutex:
+            last_key, attempt = self.backoff.get(upgrade_id, (None, 0))
+            attempt = attempt if last_key == key else 0
+            self.backoff[upgrade_id] = (key, attempt + 1)
+        return self.schedule(upgrade_id, now + policy.interval(attempt), state)
+
+    def reset(self, upgrade_id):
+        """Forget the backoff for the session identified by 'upgrade_id'
+        because it has made progress.
+
+        """
+        with self.mutex:
+            self.backoff.pop(upgrade_id, None)
+
+    def cancel(self, upgrade_id):
+        """Remove the session identified by 'upgrade_id' from the schedule
+        if it is there.
+
+        """
+        with self.mutex:
+            self.due_by_id.pop(upgrade_id, None)
+            self.state_by_id.pop(upgrade_id, None)
+
+    def next_due(self):
+        """Return the due time of the earliest pending session or None if
+        nothing is pending.
+
+        """
+        with self.mutex:
+            self._discard_stale()
+            return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        """Remove and return (in due time order) the Upgrade IDs of all
+        sessions whose due time is at or before 'now'.
+
+        """
+        ret = []
+        with self.mutex:
+            while True:
+                self._discard_stale()
+                if not self.heap or self.heap[0][0] > now:
+                    return ret
+                _, _, upgrade_id = heapq.heappop(self.heap)
+                del self.due_by_id[upgrade_id]
+                self.state_by_id.pop(upgrade_id, None)
+                ret.append(upgrade_id)
+
+    def _is_stale(self, entry):
+        """Check whether a heap entry has been superseded or cancelled.
+
+        """
+        due, _, upgrade_id = entry
+        return self.due_by_id.get(upgrade_id, None) != due
+
+    def _discard_stale(self):
+        """Drop superseded or cancelled entries from the top of the heap.
+
+        """
+        while self.heap and self._is_stale(self.heap[0]):
+            heapq.heappop(self.heap)
+
+    def _compact(self):
+        """Rebuild the heap without stale entries once they make up more
+        than half of it, so repeated rescheduling can't grow the heap
+        without bound.
+
+        """
+        if len(self.heap) <= 2 * len(self.due_by_id) + 16:
+            return
+        self.heap = [entry for entry in self.heap
+                     if not self._is_stale(entry)]
+        heapq.heapify(self.heap)
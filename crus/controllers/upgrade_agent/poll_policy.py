@@ -0,0 +1,77 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Polling policies for upgrade session stages that wait on something
+outside of CRUS (a WLM drain, a boot session, nodes returning to the
+WLM).
+
+"""
+import random
+from ...app import APP
+
+# The name of the policy used when a stage handler fails
+ERROR_POLICY = "ERROR"
+
+
+class PollPolicy:
+    """A polling interval that starts at 'initial' seconds and grows by a
+    factor of 'backoff' with each consecutive poll that shows no
+    progress, up to 'maximum' seconds.  Each interval is spread by a
+    random fraction (up to 'jitter') in either direction so that many
+    sessions waiting together don't poll in lock step.
+
+    """
+    def __init__(self, initial, maximum, backoff=2.0, jitter=0.0):
+        """Constructor
+
+        """
+        self.initial = initial
+        self.maximum = max(maximum, initial)
+        self.backoff = backoff
+        self.jitter = jitter
+
+    def interval(self, attempt, rand=random.random):
+        """Compute the interval to wait before poll number 'attempt'
+        (counting from 0) of a session that has made no progress.
+
+        """
+        # Cap the exponent so that a session that waits a very long
+        # time doesn't overflow the computation.
+        base = min(self.initial * self.backoff ** min(attempt, 64), self.maximum)
+        return base * (1.0 + self.jitter * (2.0 * rand() - 1.0))
+
+
+def get_poll_policy(stage):
+    """Get the polling policy for the stage named 'stage' (or
+    ERROR_POLICY) from the POLL_<stage> configuration setting, falling
+    back on the error policy for stages that have no policy of their
+    own.
+
+    """
+    initial, maximum = APP.config.get("POLL_%s" % stage, APP.config['POLL_ERROR'])
+    return PollPolicy(
+        initial,
+        maximum,
+        APP.config['POLL_BACKOFF'],
+        APP.config['POLL_JITTER']
+    )
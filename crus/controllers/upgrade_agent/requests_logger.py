@@ -50,5 +50,8 @@ def do_request(request_function, url, **kwargs):
         LOGGER.exception(message)
         raise ComputeUpgradeError(message) from request_exception
     LOGGER.debug("%s request to %s got response with status code %d", request_function.__name__, url, resp.status_code)
-    LOGGER.debug("response body: %s", resp.text)
+    if not kwargs.get("stream"):
+        # Reading the text of a streamed response would read the
+        # whole body into memory, leave that to the caller.
+        LOGGER.debug("response body: %s", resp.text)
     return resp
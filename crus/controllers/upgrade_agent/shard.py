@@ -0,0 +1,197 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Sharing out upgrade sessions among multiple Compute Rolling Upgrade
+Agent replicas.
+
+Each replica registers itself in ETCD under a lease and keeps the
+lease alive from a heartbeat thread.  Upgrade IDs are mapped to the
+live replicas by consistent hashing, so each replica handles only its
+own share of the sessions and, when a replica comes or goes, only the
+sessions that hash to it change hands.  A replica that stops renewing
+its lease has its registration removed by ETCD when the lease time to
+live runs out, and its sessions are taken over by the others.
+
+"""
+import bisect
+import hashlib
+import logging
+import math
+import os
+import threading
+import uuid
+from ...app import APP, ETCD
+
+LOGGER = logging.getLogger(__name__)
+
+# The ETCD key prefix under which agent replicas register.
+REGISTRATION_PREFIX = "%s/%s/" % (APP.config['ETCD_PREFIX'], "agent_registration")
+
+
+def _hash(key):
+    """Utility - map a string to a position on the hash ring.
+
+    """
+    return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """A consistent hash ring of agent IDs, each placed on the ring at
+    'points' positions to even out the share each agent gets.
+
+    """
+    def __init__(self, members, points=64):
+        """Constructor
+
+        """
+        self.members = frozenset(members)
+        ring = sorted(
+            (_hash("%s-%d" % (member, point)), member)
+            for member in self.members
+            for point in range(points)
+        )
+        self.positions = [position for position, _ in ring]
+        self.owners = [member for _, member in ring]
+
+    def owner(self, key):
+        """Return the member that owns 'key' or None if the ring is empty.
+
+        """
+        if not self.owners:
+            return None
+        index = bisect.bisect(self.positions, _hash(key)) % len(self.positions)
+        return self.owners[index]
+
+
+class ShardMembership:
+    """This agent's membership in the set of live agent replicas.  The
+    membership is refreshed by heartbeat(), which start() calls
+    every AGENT_HEARTBEAT_INTERVAL seconds on its own thread, so that
+    a busy agent loop can't let the lease lapse.
+
+    """
+    def __init__(self, agent_id=None, ttl=None, interval=None, etcd=None):
+        """Constructor - 'agent_id' defaults to the host name (the pod name
+        under Kubernetes), 'ttl' and 'interval' default to the
+        AGENT_LEASE_TTL and AGENT_HEARTBEAT_INTERVAL settings and
+        'etcd' to the application's ETCD client.
+
+        """
+        self.agent_id = (
+            agent_id if agent_id is not None
+            else os.environ.get("HOSTNAME", str(uuid.uuid4()))
+        )
+        self.ttl = ttl if ttl is not None else APP.config['AGENT_LEASE_TTL']
+        self.interval = (
+            interval if interval is not None
+            else APP.config['AGENT_HEARTBEAT_INTERVAL']
+        )
+        self.etcd = etcd if etcd is not None else ETCD
+        self.key = REGISTRATION_PREFIX + self.agent_id
+        self.lease = None
+        self.ring = HashRing([])
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def _register(self):
+        """Take out a new lease and register this agent under it.
+
+        """
+        # ETCD lease times to live are whole seconds
+        self.lease = self.etcd.lease(max(int(math.ceil(self.ttl)), 1))
+        self.etcd.put(self.key, self.agent_id, lease=self.lease)
+
+    def heartbeat(self):
+        """Renew this agent's lease (registering again if the lease has
+        already expired) and update the hash ring from the agents that
+        are registered.  Returns True if the set of live agents changed
+        (so sessions may have changed hands), False otherwise.
+
+        """
+        if self.lease is None:
+            self._register()
+        else:
+            responses = self.lease.refresh()
+            if not responses or responses[0].TTL <= 0:
+                LOGGER.warning("ShardMembership: agent %s lease expired, registering again",
+                               self.agent_id)
+                self._register()
+        live = [value.decode() for value, _ in self.etcd.get_prefix(REGISTRATION_PREFIX)]
+        if frozenset(live) == self.ring.members:
+            return False
+        LOGGER.info("ShardMembership: agent %s sees live agents %s",
+                    self.agent_id, sorted(live))
+        self.ring = HashRing(live)
+        return True
+
+    def start(self, on_change=None):
+        """Start the heartbeat thread.  'on_change' is called with no
+        arguments (on the heartbeat thread) whenever the set of live
+        agents changes.
+
+        """
+        self.thread = threading.Thread(target=self._beat, args=(on_change,),
+                                       name="shard-heartbeat", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the heartbeat thread, if it is running, and wait for it.
+
+        """
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _beat(self, on_change):
+        """Call heartbeat() every 'interval' seconds until stopped, telling
+        'on_change' about changes in membership.
+
+        """
+        while not self.stopping.wait(self.interval):
+            try:
+                if self.heartbeat() and on_change is not None:
+                    on_change()
+            # pylint: disable=broad-except
+            except Exception:  # pragma no unit test (ETCD does not fail in mock)
+                # Keep beating, the lease may survive a missed renewal
+                LOGGER.exception("ShardMembership: agent %s heartbeat failed", self.agent_id)
+
+    def owns(self, upgrade_id):
+        """Check whether the session identified by 'upgrade_id' belongs to
+        this agent.  Before the first heartbeat, everything does.
+
+        """
+        owner = self.ring.owner(upgrade_id)
+        return owner is None or owner == self.agent_id
+
+    def resign(self):
+        """Stop the heartbeat and revoke this agent's lease so that the
+        other agents take over its sessions without waiting for the lease
+        to expire.
+
+        """
+        self.stop()
+        if self.lease is not None:
+            self.lease.revoke()
+            self.lease = None
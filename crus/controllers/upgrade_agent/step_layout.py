@@ -0,0 +1,111 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Composition of the steps of an upgrade from its ordered list of nodes,
+optionally spreading each step across cabinets, chassis and slots and
+limiting the number of nodes from any one cabinet in a step, so that
+the boot load of a step does not fall on one chassis controller or
+power domain.
+
+"""
+from collections import Counter
+import heapq
+from .node_table import NodeTable
+
+
+def _interleave(sequences):
+    """Merge the lists in 'sequences' so that the items of each list are
+    spread evenly through the result, keeping their order within each
+    list.  Item 'i' of a list of 'n' items is placed as if at (i + 0.5)
+    / n of the way through the result.
+
+    """
+    placed = [
+        ((index + 0.5) / len(sequence), number, item)
+        for number, sequence in enumerate(sequences)
+        for index, item in enumerate(sequence)
+    ]
+    placed.sort(key=lambda entry: entry[:2])
+    return [item for _, _, item in placed]
+
+
+def spread_by_topology(xnames):
+    """Reorder the nodes in 'xnames' so that consecutive nodes are spread
+    across cabinets, then across the chassis of each cabinet, then
+    across the slots of each chassis.  Nodes in the same slot keep
+    their order from 'xnames'.  Nodes whose XNAMEs are not node XNAMEs
+    are spread as if they were in a cabinet of their own.
+
+    """
+    tree = {}
+    for key, members in NodeTable.group_by(xnames, "slot").items():
+        cabinet, chassis, slot = key if key is not None else (None, None, None)
+        tree.setdefault(cabinet, {}).setdefault(chassis, {})[slot] = members
+    return _interleave([
+        _interleave([_interleave(list(slots.values())) for slots in chassis.values()])
+        for chassis in tree.values()
+    ])
+
+
+def compose_steps(xnames, step_size, max_per_cabinet=None):
+    """Divide the ordered nodes in 'xnames' into steps of up to
+    'step_size' nodes.  If 'max_per_cabinet' is set, no step holds more
+    than that many nodes from one cabinet: a node that would exceed it
+    moves to a later step and the step is filled with the next nodes
+    from other cabinets.  Returns the list of nodes in step order and
+    the index in that list of the first node of each step.
+
+    """
+    if not max_per_cabinet:
+        return list(xnames), list(range(0, len(xnames), step_size))
+    positions = {xname: position for position, xname in enumerate(xnames)}
+    cabinets = {
+        key: [(positions[xname], xname) for xname in members]
+        for key, members in NodeTable.group_by(xnames, "cabinet").items()
+    }
+    # A heap of the first waiting node of each cabinet, by position in
+    # 'xnames', so that each step takes the earliest nodes it can.
+    heads = [(queue[0][0], key) for key, queue in cabinets.items()]
+    heapq.heapify(heads)
+    nexts = {key: 0 for key in cabinets}
+    nodes = []
+    boundaries = []
+    while heads:
+        boundaries.append(len(nodes))
+        counts = Counter()
+        full = []
+        while heads and len(nodes) - boundaries[-1] < step_size:
+            _, key = heapq.heappop(heads)
+            queue = cabinets[key]
+            nodes.append(queue[nexts[key]][1])
+            nexts[key] += 1
+            counts[key] += 1
+            if nexts[key] == len(queue):
+                continue
+            if key is not None and counts[key] >= max_per_cabinet:
+                full.append(key)
+            else:
+                heapq.heappush(heads, (queue[nexts[key]][0], key))
+        for key in full:
+            heapq.heappush(heads, (cabinets[key][nexts[key]][0], key))
+    return nodes, boundaries
@@ -33,17 +33,29 @@ The definition of the Rolling Compute Upgrade Agent
 # stored in ETCD.  This allows multiple upgrades to be processed in
 # parallel, and, since the code itself is stateless (relying on state
 # stored in ETCD) allows multiple instances of the controller to
-# handle compute upgrades in parallel for scaling.
+# handle compute upgrades in parallel for scaling.  With sharding
+# enabled (CRUS_AGENT_SHARDING), each instance handles only the
+# sessions that map to it (see shard.py) instead of all instances
+# racing for every session.
+from collections import OrderedDict
 import logging
+import threading
 import time
 from queue import Empty
 from etcd3_model import UPDATING, DELETING
 
 from ...app import APP
 from .errors import ComputeUpgradeError
+from .pending import PendingScheduler
+from .coalesce import CoalescingQueue
+from .shard import ShardMembership
+from .poll_policy import get_poll_policy, ERROR_POLICY
+from .worker_pool import SessionWorkerPool
 from .boot_service import BootSession
 from .node_group import NodeGroup
 from .wlm import get_wlm_handler
+from .job_order import order_by_job_end
+from .step_layout import spread_by_topology, compose_steps
 from ...models.upgrade_session import (
     UpgradeSession,
     ComputeUpgradeProgress,
@@ -53,17 +65,29 @@ from ...models.upgrade_session import (
     BOOTING,
     BOOTED,
     WLM_WAITING,
-    CLEANUP
+    CLEANUP,
+    STREAMING,
+    PIPELINED,
+    STREAMED,
+    SLIDING,
+    JOB_END_ORDER,
+    SPREAD_STEPS,
+    NODE_DRAINING,
+    NODE_DRAINED,
+    NODE_BOOTING,
+    NODE_WAITING,
+    NODE_DONE,
+    NODE_FAILED
 )
+from ...models.upgrade_plan import UpgradePlan
 
 LOGGER = logging.getLogger(__name__)
 
-# A pause time to avoid swamping the system with monitoring of nodes.
+# The longest time to wait for a watch event when nothing is pending.
 # If we are running the unit tests, this is 0.01 seconds.  If we are
-# running production it is 10 seconds.  If the upgrade is waiting
-# for something, This will be returned from advance functions to tell
-# the caller to postpone the next action on this upgrade for that many
-# seconds.  Otherwise None is returned.
+# running production it is 10 seconds.  Sessions that are waiting for
+# something are re-examined according to the polling policy for their
+# stage (see poll_policy.py and the POLL_* configuration settings).
 PAUSE_TIME = 10 if not APP.config['TESTING'] else 0.01
 
 # A timeout value for waiting for WLM nodes to return to service in
@@ -81,47 +105,60 @@ WATCHER = None
 def start_watching():
     """ Set up to watch for upgrade session changes...
 
-    returns a queue and a pending event list.
+    returns a (coalescing) event queue and a pending event scheduler.
     """
     global WATCHER  # pylint: disable=global-statement
     if WATCHER:
         return WATCHER
 
-    pending = []
-    queue = UpgradeSession.watch()
+    pending = PendingScheduler()
+    membership = None
+    if APP.config['AGENT_SHARDING']:  # pragma no unit test
+        # Register with the other agent replicas before learning so
+        # that we start out with our share of the sessions.
+        membership = ShardMembership()
+        membership.heartbeat()
+        # Re-flow all sessions whenever the set of live agents changes
+        # so that orphaned sessions are picked up.
+        membership.start(UpgradeSession.learn)
+        LOGGER.info("start_watching: sharing sessions as agent %s", membership.agent_id)
+    queue = CoalescingQueue(UpgradeSession.watch(), pending, membership)
+    # Forward watch events on their own thread so that scheduling an
+    # earlier poll can wake up a dispatcher waiting for events.
+    queue.start()
     WATCHER = (queue, pending)
     UpgradeSession.learn()  # Flow existing upgrade sessions to watchers
     return WATCHER
 
 
-def watch_sessions():  # pragma no unit test (needs concurrency)
-    """Drive the upgrade processing in a forever loop
+def watch_sessions(workers=None):  # pragma no unit test (needs concurrency)
+    """Drive the upgrade processing in a forever loop.  If 'workers' (or,
+    if 'workers' is not specified, the AGENT_WORKERS configuration
+    setting) is greater than 1, upgrade sessions are processed
+    concurrently by a pool of that many workers.  Otherwise they are
+    processed one at a time on the calling thread.
 
     """
+    workers = workers if workers is not None else APP.config['AGENT_WORKERS']
     queue, pending = start_watching()
+    if workers <= 1:
+        while True:
+            process_upgrade(queue, pending)
+    LOGGER.info("watch_sessions: processing sessions with %d workers", workers)
+    pool = SessionWorkerPool(
+        lambda upgrade_session: handle_session(upgrade_session, pending),
+        workers
+    )
     while True:
-        process_upgrade(queue, pending)
+        dispatch_upgrade(queue, pending, pool)
 
 
-def process_upgrade(queue, pending):
-    """Watch for upgrade_session changes coming from ETCD and drive those
-    events into the state machine.  This also handles scheduling of
-    pauses when a session is in a state that may need more time to
-    complete.  The 'queue' and 'pending' parameters are taken from a
-    return from start_watching() and provide the event queue and the
-    scheduled pending updates queue respectively.
+def _trigger_pending(pending):
+    """Process the pending scheduler.  If an upgrade session has reached
+    its scheduled time, remove it from the scheduler and trigger it.
 
     """
-    # Set a flag to indicate that a given message is an error and
-    # should cause the upgrade_session to pause so we don't beat
-    # up the system while the problem is being resolved.
-    error_message = False
-
-    # Process the pending queue.  If an upgrade session has
-    # reached its scheduled time, remove it from the queue and
-    # trigger it.
-    while pending and time.time() > pending[0][0]:
-        upgrade_id = pending.pop(0)[1]
+    for upgrade_id in pending.pop_due(time.time()):
         upgrade_session = UpgradeSession.get(upgrade_id)
         if not upgrade_session:  # pragma no unit test
             # The session has somehow vanished since I last saw
@@ -130,111 +167,323 @@ def process_upgrade(queue, pending):
         # Trigger a watch event on this upgrade session
         upgrade_session.put()
 
-    # Compute a timeout for waiting for more work based on the
-    # next pending action.  If there is nothing pending, take a
-    # long timeout.
-    timeout = pending[0][0] - time.time() if pending else PAUSE_TIME
-    # The weird coditional below takes into account that None is
-    # not comparable to a number.  It will preserve the None if
-    # that is what timeout is, otherwise it makes sure that the
-    # timeout is positive or 0.
-    timeout = 0 if timeout and timeout < 0 else timeout
+
+def _next_timeout(pending):
+    """Compute a timeout for waiting for more work based on the next
+    pending action.  If there is nothing pending, take a long timeout.
+    Make sure the timeout is positive or 0.
+
+    """
+    next_due = pending.next_due()
+    timeout = next_due - time.time() if next_due is not None else PAUSE_TIME
+    return max(timeout, 0)
+
+
+def process_upgrade(queue, pending):
+    """Watch for upgrade_session changes coming from ETCD and drive those
+    events into the state machine.  This also handles scheduling of
+    pauses when a session is in a state that may need more time to
+    complete.  The 'queue' and 'pending' parameters are taken from a
+    return from start_watching() and provide the event queue and the
+    scheduled pending updates queue respectively.
+
+    """
+    _trigger_pending(pending)
     try:
         # Look for an UpgradeSession to do something with
-        upgrade_session = queue.get(timeout=timeout)
+        upgrade_session = queue.get(timeout=_next_timeout(pending))
     except Empty:
         # Timed out looking for something to do, go back and
         # process pending and then try again.
         return
+    handle_session(upgrade_session, pending)
+
+
+def dispatch_upgrade(queue, pending, pool):
+    """Same as process_upgrade() except that the upgrade session event is
+    handed to a worker in 'pool' (a SessionWorkerPool) instead of being
+    handled on the calling thread.
+
+    """
+    _trigger_pending(pending)
+    try:
+        upgrade_session = queue.get(timeout=_next_timeout(pending))
+    except Empty:
+        return
+    pool.submit(upgrade_session)
+
+
+def handle_session(upgrade_session, pending):
+    """Drive a single upgrade session event into the state machine under
+    the session's lock, post any resulting message and schedule a
+    pause in 'pending' if the session needs one.  While the session
+    keeps moving to a new stage, the next stage is run right away
+    (up to AGENT_DIRECT_DISPATCH times) instead of waiting for the
+    watch event caused by the message.
+
+    """
     with upgrade_session.lock(timeout=0) as lock:
         if not lock.is_acquired():  # pragma no unit test
             # We didn't get the lock, so someone else has this one...
-            return
+            return None
+        loaded = load_session(upgrade_session, pending)
+        if loaded is None:
+            return None
+        upgrade_session, upgrade_progress = loaded
+        message, error_message, position = run_stage(upgrade_session, upgrade_progress)
+        for _ in range(APP.config['AGENT_DIRECT_DISPATCH']):
+            if not advanced(upgrade_session, upgrade_progress, message, error_message, position):
+                break
+            # We still hold the lock, so the watch event from this
+            # message will find the lock held and be dropped, which
+            # is fine because we go on to the next stage here.
+            LOGGER.info("handle_session: id=%s: %s", upgrade_session.upgrade_id, message)
+            upgrade_session.post_message_once(message)
+            pending.reset(upgrade_session.upgrade_id)
+            message, error_message, position = run_stage(upgrade_session, upgrade_progress)
+    finish_session(upgrade_session, pending, message, error_message, position)
+
+    return message
+
+
+def run_stage(upgrade_session, upgrade_progress):
+    """Run the handler for the current stage of 'upgrade_session' once.
+    Returns a tuple of the message from the handler (or the error
+    message if it failed), whether the message reports an error and
+    the (stage, step) the session was in before the handler ran.
 
-        # Looks like we have a live one, start processing it.
-        # First, get the actual state under the lock, since
-        # something could have changed while it was queued.
-        upgrade_id = upgrade_session.upgrade_id
-        if [event[1] for event in pending if event[1] == upgrade_id]:
-            LOGGER.debug("process_upgrade: Skipping id %s because it is pending", upgrade_id)
-            # This one is currently pending.  Probably a case of
-            # an update due to an error or something and we don't
-            # want to handle it yet.  Skip it.
-            return
-        upgrade_session = UpgradeSession.get(upgrade_id)
-        if not upgrade_session:  # pragma no unit test
-            # Seems to be gone, skip it...
-            LOGGER.debug("process_upgrade: No upgrade session found with id %s", upgrade_id)
-            return
+    """
+    # Set a flag to indicate that a given message is an error and
+    # should cause the upgrade_session to pause so we don't beat
+    # up the system while the problem is being resolved.
+    error_message = False
+    position = (upgrade_progress.stage, upgrade_progress.step)
+    try:
+        step_nodes = get_step_nodes(upgrade_session, upgrade_progress)
+        stage_handler = get_stage_handler(upgrade_session, upgrade_progress,
+                                          UPDATE_MAP, DELETE_MAP)
+        message = stage_handler(
+            upgrade_session,
+            upgrade_progress,
+            step_nodes
+        )
+    except ComputeUpgradeError as err:  # pragma no unit test
+        error_message = True  # schedule this after reporting error
+        message = stage_error_message(upgrade_session, upgrade_progress, err)
+    return message, error_message, position
 
-        if upgrade_session.completed and upgrade_session.state != DELETING:
-            # Just mark this session ready and be done, there is
-            # nothing else to do for update (we want to remove it if
-            # it is deleting).  This will happen while we are learning
-            # after startup.
-            LOGGER.debug("process_upgrade: Setting id %s session to ready", upgrade_id)
-            upgrade_session.set_ready()
-            LOGGER.debug("process_upgrade: id %s session set to ready", upgrade_id)
-            return
 
-        # Get the progress state for this upgrade session
-        upgrade_progress = ComputeUpgradeProgress.get(upgrade_id)
-        if upgrade_progress is None:
-            upgrade_progress = ComputeUpgradeProgress(upgrade_id=upgrade_id)
-            LOGGER.debug(
-                "process_upgrade: upgrade_progress: id=%s step=%s stage=%s boot_complete_time=%s completed_nodes=%s",
-                upgrade_id,
-                upgrade_progress.step,
-                upgrade_progress.stage,
-                upgrade_progress.boot_complete_time,
-                upgrade_progress.completed_nodes)
-            upgrade_progress.put()
-
-        step_number = upgrade_progress.step
-        stage = upgrade_progress.stage
-        try:
-            # Figure out what nodes (if any) we are working with for
-            # this pass.  If we have exhausted the nodes to be
-            # upgraded (i.e. completed the last step), this will be an
-            # empty list.
-            starting_node_group = NodeGroup(upgrade_session.starting_label)
-            upgrade_nodes = starting_node_group.get_members()
-            LOGGER.debug("process_upgrade: id=%s upgrade_nodes=%s", upgrade_id, upgrade_nodes)
-            first = step_number * upgrade_session.upgrade_step_size
-            last = (step_number + 1) * upgrade_session.upgrade_step_size
-            # Unlike regular list references, slices don't have a
-            # problem with indices out of range, they just return
-            # [] in that case.  So, we are done when we get an
-            # empty list.
-            step_nodes = upgrade_nodes[first:last]
-            LOGGER.debug("process_upgrade: id=%s step_nodes=%s", upgrade_id, step_nodes)
-
-            # Call the handler function for the current stage
-            state = upgrade_session.state
-            assert state in [UPDATING, DELETING]
-            stage_handler = (
-                UPDATE_MAP[stage] if state == UPDATING else DELETE_MAP[stage]
-            )
-            message = stage_handler(
-                upgrade_session,
-                upgrade_progress,
-                step_nodes
-            )
-        except ComputeUpgradeError as err:  # pragma no unit test
-            error_message = True  # schedule this after reporting error
-            # Lint complains because it does not understand what stage
-            # is.  Silence it.
-            #
-            # pylint: disable=bad-string-format-type
-            message = "Processing step %d in stage %s failed - %s" % (
-                step_number,
-                stage,
-                str(err)
-            )
-            LOGGER.exception("process_upgrade: id=%s: %s", upgrade_session.upgrade_id, message)
-    # Outside the lock, handle any messages and queuing of pending
-    # activities.
+def advanced(upgrade_session, upgrade_progress, message, error_message, position):
+    """Check whether the last stage handler moved 'upgrade_session' on to
+    a new stage or step that can be run right away, as opposed to
+    asking to wait, reporting an error or finishing the session.
+
+    """
+    return (
+        message is not None and
+        not error_message and
+        not upgrade_session.completed and
+        (upgrade_progress.stage, upgrade_progress.step) != position
+    )
+
+
+def load_session(upgrade_session, pending):
+    """Called with the lock on 'upgrade_session' held, get the current
+    state of the upgrade session and its progress.  Returns a tuple of
+    the current upgrade session and progress objects or None if there
+    is nothing for the state machine to do with the session right now.
+
+    """
+    # Looks like we have a live one, start processing it.
+    # First, get the actual state under the lock, since
+    # something could have changed while it was queued.
+    upgrade_id = upgrade_session.upgrade_id
+    if pending.holds(upgrade_id, upgrade_session.state):
+        LOGGER.debug("load_session: Skipping id %s because it is pending", upgrade_id)
+        # This one is currently pending.  Probably a case of
+        # an update due to an error or something and we don't
+        # want to handle it yet.  Skip it.  If the session has
+        # changed state since it was scheduled (e.g. it is being
+        # deleted), the poll has been cancelled and we go on.
+        return None
+    upgrade_session = UpgradeSession.get(upgrade_id)
+    if not upgrade_session:  # pragma no unit test
+        # Seems to be gone, skip it...
+        LOGGER.debug("load_session: No upgrade session found with id %s", upgrade_id)
+        return None
+
+    if upgrade_session.completed and upgrade_session.state != DELETING:
+        # Just mark this session ready and be done, there is
+        # nothing else to do for update (we want to remove it if
+        # it is deleting).  This will happen while we are learning
+        # after startup.
+        LOGGER.debug("load_session: Setting id %s session to ready", upgrade_id)
+        upgrade_session.set_ready()
+        LOGGER.debug("load_session: id %s session set to ready", upgrade_id)
+        return None
+
+    # Get the progress state for this upgrade session
+    upgrade_progress = ComputeUpgradeProgress.get(upgrade_id)
+    if upgrade_progress is None:
+        upgrade_progress = ComputeUpgradeProgress(upgrade_id=upgrade_id)
+        LOGGER.debug(
+            "load_session: upgrade_progress: id=%s step=%s stage=%s boot_complete_time=%s completed_nodes=%s",
+            upgrade_id,
+            upgrade_progress.step,
+            upgrade_progress.stage,
+            upgrade_progress.boot_complete_time,
+            upgrade_progress.completed_nodes)
+        upgrade_progress.put()
+    return upgrade_session, upgrade_progress
+
+
+def get_step_nodes(upgrade_session, upgrade_progress):
+    """Figure out what nodes (if any) we are working with for the current
+    step of 'upgrade_session'.  If we have exhausted the nodes to be
+    upgraded (i.e. completed the last step), this will be an empty
+    list.
+
+    """
+    return _nodes_for_step(upgrade_session, upgrade_progress.step)
+
+
+# Upgrade plans by Upgrade ID, least recently used first.  Plans never
+# change once they are made, so they can be kept here instead of being
+# read from ETCD on every event.  Only the MAX_CACHED_PLANS most
+# recently used plans are kept, so that plans of sessions that were
+# finished by another agent, or that moved to another agent, don't
+# pile up here.
+MAX_CACHED_PLANS = 256
+_PLANS = OrderedDict()
+_PLANS_LOCK = threading.Lock()
+
+
+def _cached_plan(upgrade_id):
+    """Utility - get the cached upgrade plan for 'upgrade_id' or None if
+    it is not cached.
+
+    """
+    with _PLANS_LOCK:
+        plan = _PLANS.get(upgrade_id)
+        if plan is not None:
+            _PLANS.move_to_end(upgrade_id)
+        return plan
+
+
+def _cache_plan(upgrade_id, plan):
+    """Utility - cache the upgrade plan 'plan' for 'upgrade_id', evicting
+    the least recently used plans beyond MAX_CACHED_PLANS.
+
+    """
+    with _PLANS_LOCK:
+        _PLANS[upgrade_id] = plan
+        _PLANS.move_to_end(upgrade_id)
+        while len(_PLANS) > MAX_CACHED_PLANS:
+            _PLANS.popitem(last=False)
+
+
+def get_plan(upgrade_session):
+    """Get the frozen upgrade plan of 'upgrade_session', making it from
+    the members of the starting node group and storing it in ETCD the
+    first time it is needed.  After that, the steps of the session
+    are taken from the plan and the starting node group is not read
+    again.  In 'job_end' node order, the nodes are ordered by when the
+    jobs running on them are expected to end as the plan is made.  In
+    'spread' step composition the nodes are then spread across the
+    cabinets, chassis and slots that hold them, and steps are kept to
+    'max_per_cabinet' nodes from any one cabinet.
+
+    """
+    upgrade_id = upgrade_session.upgrade_id
+    plan = _cached_plan(upgrade_id)
+    if plan is not None:
+        return plan
+    plan = UpgradePlan.get(upgrade_id)
+    if plan is None:
+        upgrade_nodes = NodeGroup(upgrade_session.starting_label).get_members()
+        if upgrade_session.node_order == JOB_END_ORDER:
+            wlm = get_wlm_handler(upgrade_session.workload_manager_type)
+            job_ends = wlm.job_ends(upgrade_nodes)
+            upgrade_nodes = order_by_job_end(upgrade_nodes, job_ends)
+            LOGGER.debug("get_plan: id=%s job_ends=%s", upgrade_id, job_ends)
+        if upgrade_session.step_composition == SPREAD_STEPS:
+            upgrade_nodes = spread_by_topology(upgrade_nodes)
+        upgrade_nodes, boundaries = compose_steps(
+            upgrade_nodes,
+            upgrade_session.upgrade_step_size,
+            upgrade_session.max_per_cabinet
+        )
+        plan = UpgradePlan(upgrade_id=upgrade_id, boundaries=boundaries)
+        plan.set_nodes(upgrade_nodes)
+        plan.put()
+        LOGGER.debug("get_plan: id=%s nodes=%s boundaries=%s",
+                     upgrade_id, upgrade_nodes, plan.boundaries)
+    _cache_plan(upgrade_id, plan)
+    return plan
+
+
+def _remove_plan(upgrade_session):
+    """Utility - discard the upgrade plan of 'upgrade_session' once the
+    session is finished with.
+
+    """
+    with _PLANS_LOCK:
+        _PLANS.pop(upgrade_session.upgrade_id, None)
+    plan = UpgradePlan.get(upgrade_session.upgrade_id)
+    if plan is not None:
+        plan.remove()
+
+
+def _nodes_for_step(upgrade_session, step_number):
+    """Utility - get the nodes in step number 'step_number' of
+    'upgrade_session' (an empty list if there is no such step).
+
+    """
+    step_nodes = get_plan(upgrade_session).step_nodes(step_number)
+    LOGGER.debug("_nodes_for_step: id=%s step=%d step_nodes=%s",
+                 upgrade_session.upgrade_id, step_number, step_nodes)
+    return step_nodes
+
+
+def get_stage_handler(upgrade_session, upgrade_progress, update_map, delete_map):
+    """Look up the handler function for the current stage of
+    'upgrade_session' in 'update_map' or 'delete_map' depending on
+    the state of the upgrade session.
+
+    """
+    state = upgrade_session.state
+    assert state in [UPDATING, DELETING]
+    stage = upgrade_progress.stage
+    return update_map[stage] if state == UPDATING else delete_map[stage]
+
+
+def stage_error_message(upgrade_session, upgrade_progress, err):  # pragma no unit test
+    """Compose and log the message reporting that the current stage of
+    'upgrade_session' failed with the ComputeUpgradeError 'err'.
+
+    """
+    # Lint complains because it does not understand what stage
+    # is.  Silence it.
     #
+    # pylint: disable=bad-string-format-type
+    message = "Processing step %d in stage %s failed - %s" % (
+        upgrade_progress.step,
+        upgrade_progress.stage,
+        str(err)
+    )
+    LOGGER.exception("handle_session: id=%s: %s", upgrade_session.upgrade_id, message)
+    return message
+
+
+def finish_session(upgrade_session, pending, message, error_message, position):
+    """Outside the lock on 'upgrade_session', post 'message' (if any) and
+    schedule a poll in 'pending' if there was no message or
+    'error_message' indicates that the message reports an error.  The
+    'position' is the (stage, step) the session was in when it was
+    handled and selects the polling policy.
+
+    """
+    upgrade_id = upgrade_session.upgrade_id
     # First, check whether we are posting a message (this needs to
     # be done outside the lock to avoid dropping watch events on
     # the floor in a super-rare case).  The race is, I get the
@@ -250,22 +499,30 @@ def process_upgrade(queue, pending):
     # there is nothing to post to.  Protect that case here.
     if message is not None and not (upgrade_session.state == DELETING and
                                     upgrade_session.completed):
-        LOGGER.info("process_upgrade: id=%s: %s", upgrade_session.upgrade_id, message)
+        LOGGER.info("finish_session: id=%s: %s", upgrade_id, message)
         upgrade_session.post_message_once(message)
         if not error_message:
-            # Nothing to schedule, go back for more
+            # The session made progress, so the next wait (if any)
+            # starts over at the initial polling interval.  Nothing
+            # to schedule, go back for more.
+            pending.reset(upgrade_id)
             return
+    elif message is not None:
+        # The session has been removed, forget about it.
+        pending.reset(upgrade_id)
+        return
 
     # There was either no message or an error message, so we are going
-    # to schedule a wait event.  Add the upgrade session to the list
-    # of pending sessions which this agent will trigger with a put()
-    # after the requested pause.
-    schedule = time.time() + PAUSE_TIME
-    pending.append((schedule, upgrade_id))
-    # Make sure the queue is in ascending time order (there should
-    # not be very many items in the queue, so there is no need for
-    # fancy sorted lists or anything here)
-    pending.sort()
+    # to schedule a poll.  Add the upgrade session to the pending
+    # scheduler which this agent will trigger with a put() after an
+    # interval chosen by the polling policy for the stage.  If the
+    # session is already pending, the scheduler keeps the earliest
+    # deadline.
+    stage, _ = position
+    policy = get_poll_policy(stage if not error_message else ERROR_POLICY)
+    key = position if not error_message else ERROR_POLICY
+    due = pending.poll(upgrade_id, key, policy, time.time(), upgrade_session.state)
+    LOGGER.debug("finish_session: id=%s next poll in %.3f seconds", upgrade_id, due - time.time())
 
 
 def _fail_nodes(upgrade_session, upgrade_progress, xnames, reason):
@@ -280,8 +537,8 @@ def _fail_nodes(upgrade_session, upgrade_progress, xnames, reason):
     xnames = [xname for xname in xnames
               if xname not in upgrade_progress.completed_nodes]
     LOGGER.debug("_fail_nodes: id=%s updated xnames=%s", upgrade_session.upgrade_id, xnames)
+    wlm.fail_many(xnames, reason)
     for xname in xnames:
-        wlm.fail(xname, reason)
         failed_node_group.add_member(xname)
 
 
@@ -331,10 +588,24 @@ def _update_starting(upgrade_session, upgrade_progress, step_nodes):
         # cause a new watch event and drop to cleanup handling.
         return "No nodes in step %d: moving to CLEANUP" % step
 
+    if upgrade_session.upgrade_mode == STREAMED:
+        return _start_streaming(upgrade_session, upgrade_progress, step_nodes)
+    if upgrade_session.upgrade_mode == SLIDING:
+        return _start_streaming(upgrade_session, upgrade_progress, [])
+
+    if upgrade_progress.lookahead_step == step:
+        # Pipelined mode already asked these nodes to quiesce while
+        # the previous step was booting, go straight to waiting for
+        # them.
+        upgrade_progress.lookahead_step = None
+        LOGGER.info("_update_starting: id=%s Change stage to QUIESCING", upgrade_session.upgrade_id)
+        upgrade_progress.stage = QUIESCING
+        upgrade_progress.put()
+        return "Quiesce already requested for step %d: moving to QUIESCING" % step
+
     # Have some nodes, start quiescing them...
     wlm = get_wlm_handler(upgrade_session.workload_manager_type)
-    for xname in step_nodes:
-        wlm.quiesce(xname)
+    wlm.quiesce_many(step_nodes)
     LOGGER.info("_update_starting: id=%s Change stage to QUIESCING", upgrade_session.upgrade_id)
     upgrade_progress.stage = QUIESCING
     upgrade_progress.put()
@@ -356,11 +627,10 @@ def _update_quiescing(upgrade_session, upgrade_progress, step_nodes):
     # simple for now.
     step = upgrade_progress.step
     wlm = get_wlm_handler(upgrade_session.workload_manager_type)
-    for xname in step_nodes:
-        if not wlm.is_quiet(xname):
-            # At least one node is not quiet yet, return None to
-            # request a pause and retry.
-            return None
+    if not all(wlm.are_quiet(step_nodes).values()):
+        # At least one node is not quiet yet, return None to request a
+        # pause and retry.
+        return None
     # We got through them all, so they are all quiesced.  Move to
     # QUIESCED.
     LOGGER.info("_update_quiescing: id=%s Change stage to QUIESCED", upgrade_session.upgrade_id)
@@ -377,29 +647,61 @@ def _update_quiesced(upgrade_session, upgrade_progress, step_nodes):
     """
     LOGGER.debug("_update_quiesced: id=%s step=%d step_nodes=%s",
                  upgrade_session.upgrade_id, upgrade_progress.step, step_nodes)
-    # Now install the nodes in the upgrading node group...
     step = upgrade_progress.step
+    _boot_nodes(upgrade_session, step_nodes)
+    lookahead = ""
+    if upgrade_session.upgrade_mode == PIPELINED:
+        lookahead = _start_lookahead(upgrade_session, upgrade_progress)
+    LOGGER.info("_update_quiesced: id=%s Change stage to BOOTING", upgrade_session.upgrade_id)
+    upgrade_progress.stage = BOOTING
+    upgrade_progress.put()
+    # Return a message to post with the upgrade session which will
+    # cause an immediate watch event and drop to the booting stage.
+    return "Began the boot session for step %d%s: moving to BOOTING" % (step, lookahead)
+
+
+def _boot_nodes(upgrade_session, xnames):
+    """Utility - install the nodes in 'xnames' as the members of the
+    upgrading node group and start a boot session to boot them into
+    the upgrade.
+
+    """
     upgrading_node_group = NodeGroup(upgrade_session.upgrading_label)
 
     # First, clear out whatever might have been there before...
     members = upgrading_node_group.get_members()
-    LOGGER.debug("_update_quiesced: id=%s members=%s", upgrade_session.upgrade_id, members)
+    LOGGER.debug("_boot_nodes: id=%s members=%s", upgrade_session.upgrade_id, members)
 
     for xname in members:
         upgrading_node_group.remove_member(xname)
     # Now add the ones we want.
-    for xname in step_nodes:
+    for xname in xnames:
         upgrading_node_group.add_member(xname)
 
     # And initiate a boot session to boot into the upgrade.
     boot_session = BootSession(upgrade_session.upgrade_id)
     boot_session.boot(upgrade_session.upgrade_template_id, upgrade_session.upgrading_label)
-    LOGGER.info("_update_quiesced: id=%s Change stage to BOOTING", upgrade_session.upgrade_id)
-    upgrade_progress.stage = BOOTING
-    upgrade_progress.put()
-    # Return a message to post with the upgrade session which will
-    # cause an immediate watch event and drop to the booting stage.
-    return "Began the boot session for step %d: moving to BOOTING" % step
+
+
+def _start_lookahead(upgrade_session, upgrade_progress):
+    """Utility - in pipelined mode, ask the nodes of the step after the
+    current one to start quiescing so that they drain while the
+    current step boots.  Only one step is ever quiesced ahead, which
+    bounds the number of nodes out of service to two steps' worth.
+    Records the look-ahead step in 'upgrade_progress' (the caller
+    stores it) and returns a phrase for the progress message.
+
+    """
+    next_step = upgrade_progress.step + 1
+    next_nodes = _nodes_for_step(upgrade_session, next_step)
+    if not next_nodes:
+        # This is the last step, nothing to look ahead to.
+        return ""
+    wlm = get_wlm_handler(upgrade_session.workload_manager_type)
+    wlm.quiesce_many(next_nodes)
+    upgrade_progress.lookahead_step = next_step
+    LOGGER.info("_start_lookahead: id=%s quiesce requested for step %d", upgrade_session.upgrade_id, next_step)
+    return " and requested quiesce for step %d" % next_step
 
 
 # pylint: disable=unused-argument
@@ -501,20 +803,23 @@ def _update_wlm_waiting(upgrade_session, upgrade_progress, step_nodes):
                    if xname not in upgrade_progress.completed_nodes]
     LOGGER.debug("_update_wlm_waiting: id=%s check_nodes=%s", upgrade_session.upgrade_id, check_nodes)
     if check_nodes:
-        for xname in check_nodes:
-            if wlm.is_ready(xname):
-                # This one is ready, resume it and remove it.
-                #
-                # NOTE: want to do some more sanity checking here
-                # to ensure that we don't get false positives for
-                # nodes that never reboot.  The best way to do
-                # that would be to check that the WLM start time
-                # for the node is newer than it was when we
-                # started with it.
-                wlm.resume(xname)
-                upgrade_progress.completed_nodes.append(xname)
+        ready = wlm.are_ready(check_nodes)
+        # The ready nodes can be resumed and removed.
+        #
+        # NOTE: want to do some more sanity checking here to ensure
+        # that we don't get false positives for nodes that never
+        # reboot.  The best way to do that would be to check that
+        # the WLM start time for the node is newer than it was when
+        # we started with it.
+        ready_nodes = [xname for xname in check_nodes if ready[xname]]
+        wlm.resume_many(ready_nodes)
+        if not ready_nodes:
+            # Nothing came back this time, return None to request a
+            # pause (with backoff) and retry.
+            return None
+        upgrade_progress.completed_nodes.extend(ready_nodes)
         upgrade_progress.put()
-        return "Examined nodes %s for WLM completion" % str(check_nodes)
+        return "Nodes %s returned to the WLM" % str(ready_nodes)
 
     # We are out of nodes to wait for.  So, we are done and it all seems
     # to have worked.  Move to the next step.
@@ -530,6 +835,223 @@ def _update_wlm_waiting(upgrade_session, upgrade_progress, step_nodes):
         "step %d and moving to STARTING" % (step, step + 1)
 
 
+def _nodes_in(node_states, code):
+    """Utility - list the nodes in 'node_states' whose state is 'code',
+    oldest first.
+
+    """
+    nodes = [(state[1], xname) for xname, state in node_states.items() if state[0] == code]
+    return [xname for _, xname in sorted(nodes)]
+
+
+def _start_streaming(upgrade_session, upgrade_progress, step_nodes):
+    """Start a step in streaming mode: ask all of the nodes in the step to
+    quiesce and start tracking each node separately.  In sliding mode
+    this is called once with no nodes to start the session, and nodes
+    are taken into the window as the session runs.
+
+    """
+    step = upgrade_progress.step
+    now = time.time()
+    wlm = get_wlm_handler(upgrade_session.workload_manager_type)
+    wlm.quiesce_many(step_nodes)
+    upgrade_progress.node_states = {xname: [NODE_DRAINING, now] for xname in step_nodes}
+    LOGGER.info("_start_streaming: id=%s Change stage to STREAMING", upgrade_session.upgrade_id)
+    upgrade_progress.stage = STREAMING
+    upgrade_progress.put()
+    if upgrade_session.upgrade_mode == SLIDING:
+        return "Starting the sliding window: moving to STREAMING"
+    return "Quiesce requested in step %d: moving to STREAMING" % step
+
+
+def _admit_nodes(upgrade_session, upgrade_progress, now):
+    """Utility - in sliding mode, take the next nodes from the starting
+    node group into the window, asking them to quiesce, until the
+    window holds 'max_in_flight' nodes (or the starting node group is
+    exhausted).  Returns the list of newly admitted nodes and whether
+    any nodes remain to be admitted afterwards.
+
+    """
+    window = upgrade_session.max_in_flight or upgrade_session.upgrade_step_size
+    node_states = upgrade_progress.node_states
+    in_flight = [
+        xname for xname, state in node_states.items()
+        if state[0] not in (NODE_DONE, NODE_FAILED)
+    ]
+    upgrade_nodes = get_plan(upgrade_session).get_nodes()
+    first = upgrade_progress.admitted
+    last = first + max(window - len(in_flight), 0)
+    admitted = upgrade_nodes[first:last]
+    wlm = get_wlm_handler(upgrade_session.workload_manager_type)
+    wlm.quiesce_many(admitted)
+    for xname in admitted:
+        node_states[xname] = [NODE_DRAINING, now]
+    upgrade_progress.admitted = first + len(admitted)
+    return admitted, upgrade_progress.admitted < len(upgrade_nodes)
+
+
+def _streaming_boot_batch(node_states, now):
+    """Utility - choose the drained nodes to boot next in streaming mode.
+    A batch is booted once STREAM_BOOT_BATCH_SIZE nodes have drained,
+    once the oldest drained node has waited STREAM_BOOT_BATCH_WINDOW
+    seconds, or once no more nodes are draining.  Returns an empty
+    list if it is not yet time to boot.
+
+    """
+    drained = _nodes_in(node_states, NODE_DRAINED)
+    if not drained:
+        return []
+    batch_size = APP.config['STREAM_BOOT_BATCH_SIZE']
+    oldest = node_states[drained[0]][1]
+    if (len(drained) >= batch_size or
+            now - oldest >= APP.config['STREAM_BOOT_BATCH_WINDOW'] or
+            not _nodes_in(node_states, NODE_DRAINING)):
+        return drained[:batch_size]
+    return []
+
+
+def _update_streaming(upgrade_session, upgrade_progress, step_nodes):
+    """Advance each node of a step in streaming mode on its own: nodes
+    that have quiesced are booted in batches, nodes whose boot
+    succeeded are returned to service as they become ready in the WLM.
+    The step is finished when every node is either done or failed.  In
+    sliding mode there is a single window instead of steps, and new
+    nodes are admitted to it as others finish.
+
+    """
+    LOGGER.debug("_update_streaming: id=%s step=%d node_states=%s",
+                 upgrade_session.upgrade_id, upgrade_progress.step, upgrade_progress.node_states)
+    step = upgrade_progress.step
+    now = time.time()
+    wlm = get_wlm_handler(upgrade_session.workload_manager_type)
+    node_states = upgrade_progress.node_states
+    changes = []
+
+    # Pick up nodes that have finished quiescing.
+    quiet = wlm.are_quiet(_nodes_in(node_states, NODE_DRAINING))
+    drained = [xname for xname in _nodes_in(node_states, NODE_DRAINING) if quiet[xname]]
+    for xname in drained:
+        node_states[xname] = [NODE_DRAINED, now]
+    if drained:
+        changes.append("quiesced %s" % str(drained))
+
+    # Check on the boot batch in flight, if there is one.
+    booting = _nodes_in(node_states, NODE_BOOTING)
+    if booting:
+        boot_session = BootSession(upgrade_session.upgrade_id)
+        if not boot_session.booting():
+            if boot_session.success():
+                for xname in booting:
+                    node_states[xname] = [NODE_WAITING, now]
+                changes.append("booted %s" % str(booting))
+            else:
+                _fail_nodes(upgrade_session, upgrade_progress, booting, "upgrading-boot-session-failed")
+                for xname in booting:
+                    node_states[xname] = [NODE_FAILED, now]
+                changes.append("boot failed for %s" % str(booting))
+            booting = []
+
+    # Return booted nodes to service as they become ready.
+    waiting = _nodes_in(node_states, NODE_WAITING)
+    ready = wlm.are_ready(waiting)
+    wlm.resume_many([xname for xname in waiting if ready[xname]])
+    for xname in waiting:
+        if ready[xname]:
+            node_states[xname] = [NODE_DONE, now]
+            upgrade_progress.completed_nodes.append(xname)
+            changes.append("%s returned to the WLM" % xname)
+        elif now - node_states[xname][1] > WLM_WAIT_TIMEOUT:
+            _fail_nodes(upgrade_session, upgrade_progress, [xname], "upgrading-time-out-wlm-waiting")
+            node_states[xname] = [NODE_FAILED, now]
+            changes.append("timed out waiting for %s" % xname)
+
+    remaining = False
+    if upgrade_session.upgrade_mode == SLIDING:
+        # Finished nodes leave the window, which keeps the progress
+        # record small on large systems, and new nodes take their
+        # place.  Failed nodes are already in the failed node group
+        # and 'admitted' records how far along the starting node
+        # group the window has moved.
+        for xname in [xname for xname, state in node_states.items()
+                      if state[0] in (NODE_DONE, NODE_FAILED)]:
+            del node_states[xname]
+        upgrade_progress.completed_nodes = []
+        admitted, remaining = _admit_nodes(upgrade_session, upgrade_progress, now)
+        if admitted:
+            changes.append("requested quiesce of %s" % str(admitted))
+
+    # Start the next boot batch if nothing is booting.
+    if not booting:
+        batch = _streaming_boot_batch(node_states, now)
+        if batch:
+            _boot_nodes(upgrade_session, batch)
+            for xname in batch:
+                node_states[xname] = [NODE_BOOTING, now]
+            changes.append("began booting %s" % str(batch))
+
+    finished = all(state[0] in (NODE_DONE, NODE_FAILED) for state in node_states.values())
+    if finished and upgrade_session.upgrade_mode == SLIDING and not remaining:
+        # Every node has been through the window, we are done.
+        upgrade_progress.node_states = {}
+        LOGGER.info("_update_streaming: id=%s Change stage to CLEANUP", upgrade_session.upgrade_id)
+        upgrade_progress.stage = CLEANUP
+        upgrade_progress.put()
+        return "All nodes finished in the sliding window: moving to CLEANUP"
+    if finished and upgrade_session.upgrade_mode != SLIDING:
+        # Every node in the step is finished, move on to the next step.
+        upgrade_progress.node_states = {}
+        upgrade_progress.completed_nodes = []
+        upgrade_progress.step += 1
+        LOGGER.info("_update_streaming: id=%s Change stage to STARTING", upgrade_session.upgrade_id)
+        upgrade_progress.stage = STARTING
+        upgrade_progress.put()
+        return "All nodes finished in step %d: advancing to step %d " \
+            "and moving to STARTING" % (step, step + 1)
+
+    if not changes:
+        # Nothing moved, return None to request a pause and retry.
+        return None
+    upgrade_progress.put()
+    if upgrade_session.upgrade_mode == SLIDING:
+        return "Sliding window: %s" % "; ".join(changes)
+    return "Step %d: %s" % (step, "; ".join(changes))
+
+
+def _delete_streaming(upgrade_session, upgrade_progress, step_nodes):
+    """Handle deleting a session in the middle of a streaming step.  Nodes
+    that have finished, one way or the other, are left alone, all
+    others are failed.
+
+    """
+    LOGGER.debug("_delete_streaming: id=%s state=%s step=%d step_nodes=%s",
+                 upgrade_session.upgrade_id, upgrade_session.state, upgrade_progress.step, step_nodes)
+    if upgrade_session.upgrade_mode == SLIDING:
+        # Fail the nodes in the window that have not finished and the
+        # nodes that were never admitted.
+        upgrade_nodes = get_plan(upgrade_session).get_nodes()
+        unfinished = [
+            xname for xname, state in upgrade_progress.node_states.items()
+            if state[0] not in (NODE_DONE, NODE_FAILED)
+        ]
+        _fail_nodes(upgrade_session, upgrade_progress,
+                    unfinished + upgrade_nodes[upgrade_progress.admitted:],
+                    "upgrade-session-deleted-before-completion")
+        upgrade_progress.node_states = {}
+        upgrade_progress.completed_nodes = []
+        LOGGER.info("_delete_streaming: id=%s Change stage to CLEANUP", upgrade_session.upgrade_id)
+        upgrade_progress.stage = CLEANUP
+        upgrade_progress.put()
+        return "Upgrade session deleted before completion: moving to cleanup"
+    # Failed nodes are already in the failed node group, so treat them
+    # like completed nodes to avoid failing them twice.
+    upgrade_progress.completed_nodes = [
+        xname for xname, state in upgrade_progress.node_states.items()
+        if state[0] in (NODE_DONE, NODE_FAILED)
+    ]
+    upgrade_progress.node_states = {}
+    return _delete_before_finished(upgrade_session, upgrade_progress)
+
+
 # pylint: disable=unused-argument
 def _cleanup(upgrade_session, upgrade_progress, step_nodes):
     """Clean up after a completed upgrade session (either deleting or
@@ -552,6 +1074,7 @@ def _cleanup(upgrade_session, upgrade_progress, step_nodes):
     elif upgrade_session.state == DELETING:
         upgrade_session.remove()
     upgrade_progress.remove()
+    _remove_plan(upgrade_session)
     # Return a message to avoid scheduling an update, no further watch
     # events will actually come of this because we have set READY and
     # also set completed on the upgrade_session.
@@ -565,17 +1088,8 @@ def _delete_before_finished(upgrade_session, upgrade_progress):
     """
     LOGGER.debug("_delete_before_finished: id=%s state=%s step=%d",
                  upgrade_session.upgrade_id, upgrade_session.state, upgrade_progress.step)
-    step = upgrade_progress.step
-    starting_node_group = NodeGroup(upgrade_session.starting_label)
-    upgrade_nodes = starting_node_group.get_members()
-    LOGGER.debug("_delete_before_finished: id=%s upgrade_nodes=%s", upgrade_session.upgrade_id, upgrade_nodes)
-    first = step * upgrade_session.upgrade_step_size
-    last = len(upgrade_nodes)
-    nodes = upgrade_nodes[first:last]
-    LOGGER.debug("_delete_before_finished: id=%s step_size=%d first=%d last=%d nodes=%s",
-                 upgrade_session.upgrade_id,
-                 upgrade_session.upgrade_step_size,
-                 first, last, nodes)
+    nodes = get_plan(upgrade_session).nodes_from(upgrade_progress.step)
+    LOGGER.debug("_delete_before_finished: id=%s nodes=%s", upgrade_session.upgrade_id, nodes)
     # Move all nodes that haven't already finished upgrading to Failed
     # with a reason indicating that the session was deleted before it
     # completed.
@@ -607,8 +1121,7 @@ def _delete_before_booting(upgrade_session, upgrade_progress, step_nodes):
     if step == 0:
         # This is a session that never really got started, just resume
         # any quiescing nodes and move them to cleanup for removal.
-        for xname in step_nodes:
-            wlm.resume(xname)
+        wlm.resume_many(step_nodes)
         LOGGER.info("_delete_before_booting: id=%s Change stage to CLEANUP", upgrade_session.upgrade_id)
         upgrade_progress.stage = CLEANUP
         upgrade_progress.put()
@@ -643,6 +1156,7 @@ UPDATE_MAP = {
     BOOTING: _update_booting,
     BOOTED: _update_booted,
     WLM_WAITING: _update_wlm_waiting,
+    STREAMING: _update_streaming,
     CLEANUP: _cleanup,
 }
 
@@ -653,5 +1167,6 @@ DELETE_MAP = {
     BOOTING: _delete_after_booting,
     BOOTED: _delete_after_booting,
     WLM_WAITING: _delete_after_booting,
+    STREAMING: _delete_streaming,
     CLEANUP: _cleanup,
 }
@@ -28,3 +28,4 @@ Initialization for the Compute Node Upgrade WLM sub-Module
 from .wlm import get_wlm_handler
 from .wrap_shell import shell
 from .slurm import SlurmHandler  # just so we register Slurm
+from .slurm_rest import SlurmRestHandler  # just so we register Slurm REST
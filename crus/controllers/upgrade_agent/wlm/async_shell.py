@@ -0,0 +1,56 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Coroutine counterpart of the 'shell' library's shell() function for
+use by the asyncio engine.  Commands are run as asyncio subprocesses so
+that many of them can be in flight at once on a single thread.
+
+"""
+import asyncio
+import logging
+from .command_executor import CommandResult, decode_lines
+
+LOGGER = logging.getLogger(__name__)
+
+
+async def async_shell(argv, timeout=None):  # pragma no unit test
+    """Run the command described by the list 'argv' as an asyncio
+    subprocess and return a CommandResult once it completes.  If
+    'timeout' is given, the command is killed if it runs for more
+    than 'timeout' seconds.
+
+    """
+    assert isinstance(argv, list)
+    proc = await asyncio.create_subprocess_exec(
+        *argv,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        LOGGER.warning("async_shell: killing %s after %s seconds", argv, timeout)
+        proc.kill()
+        out, err = await proc.communicate()
+        return CommandResult(argv, None, decode_lines(out), decode_lines(err), timeout)
+    return CommandResult(argv, proc.returncode, decode_lines(out), decode_lines(err))
@@ -0,0 +1,187 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Run WLM commands on a bounded pool of worker threads with a timeout
+on each command.  A command that runs past its timeout is killed, so a
+hung WLM command (e.g. 'scontrol' during a slurmctld failover) can
+never hold up the agent for longer than the timeout.
+
+"""
+import logging
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ....app import APP
+
+LOGGER = logging.getLogger(__name__)
+
+
+class CommandResult:
+    """The result of a command run by a CommandExecutor (or by
+    async_shell()), providing the same output() and errors()
+    generators as a 'shell' library Shell object.  A command that
+    exits with a non-zero status or is killed for running too long
+    reports that among its errors, even if it wrote nothing on
+    stderr.
+
+    """
+    def __init__(self, argv, returncode, out, err, timeout=None):
+        """Constructor - 'returncode' is None if the command never
+        finished, in which case 'timeout' is the timeout it ran into.
+
+        """
+        self.argv = argv
+        self.returncode = returncode
+        self.out = out
+        self.err = err
+        self.timeout = timeout
+
+    @property
+    def timed_out(self):
+        """True if the command was killed, or never started, because it
+        ran out of time.
+
+        """
+        return self.returncode is None
+
+    def output(self):
+        """Report the output produced by the command.
+
+        """
+        for out in self.out:
+            yield out
+
+    def errors(self):
+        """Report the errors produced by the command, followed by its exit
+        status if it failed.
+
+        """
+        for err in self.err:
+            yield err
+        if self.timed_out:
+            yield "%s: timed out after %.1f seconds" % (self.argv[0], self.timeout)
+        elif self.returncode != 0:
+            yield "%s: exited with status %d" % (self.argv[0], self.returncode)
+
+
+def decode_lines(data):
+    """Decode the bytes 'data' captured from a command into a list of
+    lines.
+
+    """
+    return data.decode(errors="replace").splitlines()
+
+
+def run_command(argv, timeout):
+    """Run the command described by the list 'argv' in the calling thread,
+    killing it if it runs for more than 'timeout' seconds, and return a
+    CommandResult.
+
+    """
+    assert isinstance(argv, list)
+    try:
+        proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as exc:
+        return CommandResult(argv, 127, [], [str(exc)])
+    try:
+        out, err = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        LOGGER.warning("run_command: killing %s after %s seconds", argv, timeout)
+        proc.kill()
+        out, err = proc.communicate()
+        return CommandResult(argv, None, decode_lines(out), decode_lines(err), timeout)
+    return CommandResult(argv, proc.returncode, decode_lines(out), decode_lines(err))
+
+
+class CommandExecutor:
+    """Runs WLM commands with a timeout on each.  Independent commands
+    can be run in parallel on a pool of at most 'workers' threads, all
+    of them sharing one deadline.  'workers' and 'timeout' default to
+    the WLM_COMMAND_WORKERS and WLM_COMMAND_TIMEOUT settings, read
+    each time they are used.
+
+    """
+    def __init__(self, workers=None, timeout=None):
+        """Constructor
+
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.pool = None
+        self.mutex = threading.Lock()
+
+    def _timeout(self, timeout):
+        """Utility - use 'timeout' if it was given, otherwise the
+        executor's timeout or the WLM_COMMAND_TIMEOUT setting.
+
+        """
+        if timeout is not None:
+            return timeout
+        return self.timeout if self.timeout is not None else APP.config['WLM_COMMAND_TIMEOUT']
+
+    def _pool(self):
+        """Utility - get the pool of worker threads, creating it on first
+        use.
+
+        """
+        with self.mutex:
+            if self.pool is None:
+                workers = self.workers
+                if workers is None:
+                    workers = APP.config['WLM_COMMAND_WORKERS']
+                self.pool = ThreadPoolExecutor(max_workers=workers)
+            return self.pool
+
+    def run(self, argv, timeout=None):
+        """Run the command described by the list 'argv' in the calling
+        thread and return a CommandResult.
+
+        """
+        return run_command(argv, self._timeout(timeout))
+
+    def run_many(self, argvs, timeout=None):
+        """Run the independent commands described by the lists in 'argvs'
+        on the worker pool and return a list of their CommandResults in
+        the same order.  All of the commands must finish within
+        'timeout' seconds of the call, including any time spent waiting
+        for a worker, so this never waits much longer than that.
+
+        """
+        timeout = self._timeout(timeout)
+        deadline = time.monotonic() + timeout
+        if len(argvs) == 1:
+            return [self.run(argvs[0], timeout)]
+
+        def run_by_deadline(argv):
+            """Run 'argv' with whatever time remains before the deadline,
+            or give up on it if there is none left.
+
+            """
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return CommandResult(argv, None, [], [], timeout)
+            return self.run(argv, remaining)
+
+        futures = [self._pool().submit(run_by_deadline, argv) for argv in argvs]
+        return [future.result() for future in futures]
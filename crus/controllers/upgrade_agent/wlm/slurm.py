@@ -25,15 +25,29 @@
 
 """
 
+import asyncio
 import logging
+from ....app import APP
 from ..node_table import NodeTable
 from ..errors import ComputeUpgradeError
-from .wrap_shell import shell
+from .wrap_shell import async_shell, CommandExecutor
 from .wlm import WLMHandler, wlm_handler
-from .slurm_support import parse_show_node
+from ..node_set import NodeSet
+from .slurm_support import (
+    is_quiet_state,
+    is_ready_state,
+    iter_show_nodes,
+    parse_squeue_job_ends,
+    SQUEUE_JOB_ENDS
+)
+from .state_poller import NodeStatePoller
 
 LOGGER = logging.getLogger(__name__)
 
+# Runs the 'scontrol' commands, killing any that take longer than
+# WLM_COMMAND_TIMEOUT seconds.
+EXECUTOR = CommandExecutor()
+
 
 class SlurmHandler(WLMHandler):
     """Static class that implements a WLM API on the Slurm WLM.
@@ -46,25 +60,7 @@ class SlurmHandler(WLMHandler):
         done by 'draining' the node.
 
         """
-        nidname = NodeTable.get_nidname(xname)
-        command = ["scontrol", "update", "NodeName=%s" % nidname,
-                   "State=DRAIN", "Reason=rolling-upgrade"]
-        LOGGER.debug("SlurmHandler.quiesce(%s): nidname=%s, command=%s", xname, nidname, command)
-        drain = shell.shell(command)
-        # Comprehension used here to avoid passing the list
-        # reference
-        #
-        # pylint: disable=unnecessary-comprehension
-        errors = [error for error in drain.errors()]
-        if errors != []:  # pragma should never happen
-            # Since we are in an error path, we log more than normal at the info log level
-            LOGGER.info("SlurmHandler.quiesce(%s): nidname=%s, lines=\n%s", xname, nidname,
-                        '\n'.join([line for line in drain.output()]))
-            message = "failed to quiesce slurm node '%s' - %s" % (nidname, str(errors))
-            LOGGER.error("SlurmHandler.quiesce(%s): %s", xname, message)
-            raise ComputeUpgradeError(message)
-        LOGGER.debug("SlurmHandler.quiesce(%s): nidname=%s, lines=\n%s", xname, nidname,
-                     '\n'.join([line for line in drain.output()]))
+        SlurmHandler.quiesce_many([xname])
 
     @staticmethod
     def is_ready(xname):
@@ -73,38 +69,7 @@ class SlurmHandler(WLMHandler):
         capable of being put into service or is in service).
 
         """
-        nidname = NodeTable.get_nidname(xname)
-        command = ["scontrol", "show", "node", nidname]
-        LOGGER.debug("SlurmHandler.is_ready(%s): nidname=%s, command=%s", xname, nidname, command)
-        show = shell.shell(command)
-        # Comprehension used here to avoid passing the list
-        # references
-        #
-        # pylint: disable=unnecessary-comprehension
-        lines = [line for line in show.output()]
-        # pylint: disable=unnecessary-comprehension
-        errors = [error for error in show.errors()]
-        if errors != []:  # pragma should never happen
-            # Since we are in an error path, we log more than normal at the info log level
-            LOGGER.info("SlurmHandler.is_ready(%s): nidname=%s, lines=\n%s", xname, nidname, '\n'.join(lines))
-            message = "failed to check slurm node '%s' for idle - %s" % (nidname, str(errors))
-            LOGGER.error("SlurmHandler.is_ready(%s): %s", xname, message)
-            raise ComputeUpgradeError(message)
-        nvps = parse_show_node(lines)
-        if 'State' not in nvps:  # pragma should never happen
-            # Since we are in an error path, we log more than normal at the info log level
-            LOGGER.info("SlurmHandler.is_ready(%s): nidname=%s, lines=\n%s", xname, nidname, '\n'.join(lines))
-            LOGGER.info("SlurmHandler.is_ready(%s): nidname=%s, nvps=%s", xname, nidname, nvps)
-            message = "'State' not found in scontrol output for slurm node '%s' - %s" % nidname
-            LOGGER.error("SlurmHandler.is_ready(%s): %s", xname, message)
-            raise ComputeUpgradeError(message)
-        LOGGER.debug("SlurmHandler.is_ready(%s): nidname=%s, lines=\n%s", xname, nidname, '\n'.join(lines))
-        LOGGER.debug("SlurmHandler.is_ready(%s): nidname=%s, nvps=%s", xname, nidname, nvps)
-        # In slurm, a '*' in the State field indicates that the node
-        # is compromised in some way and not ready to be in service.
-        state = nvps['State']
-        LOGGER.debug("SlurmHandler.is_ready(%s): nidname=%s, state=%s", xname, nidname, state)
-        return "IDLE" in state and '*' not in state
+        return is_ready_state(SlurmHandler.states([xname])[xname])
 
     @staticmethod
     def is_quiet(xname):
@@ -112,63 +77,71 @@ class SlurmHandler(WLMHandler):
         state after having started quiescing.
 
         """
-        nidname = NodeTable.get_nidname(xname)
-        command = ["scontrol", "show", "node", nidname]
-        LOGGER.debug("SlurmHandler.is_quiet(%s): nidname=%s, command=%s", xname, nidname, command)
-        show = shell.shell(command)
-        # Comprehension used here to avoid passing the list
-        # references
-        #
-        # pylint: disable=unnecessary-comprehension
-        lines = [line for line in show.output()]
-        # pylint: disable=unnecessary-comprehension
-        errors = [error for error in show.errors()]
-        if errors != []:  # pragma should never happen
-            # Since we are in an error path, we log more than normal at the info log level
-            LOGGER.info("SlurmHandler.is_quiet(%s): nidname=%s, lines=\n%s", xname, nidname, '\n'.join(lines))
-            message = "failed to check slurm node '%s' for idle - %s" % (nidname, str(errors))
-            LOGGER.error("SlurmHandler.is_quiet(%s): %s", xname, message)
-            raise ComputeUpgradeError(message)
-        nvps = parse_show_node(lines)
-        if 'State' not in nvps:  # pragma should never happen
-            # Since we are in an error path, we log more than normal at the info log level
-            LOGGER.info("SlurmHandler.is_quiet(%s): nidname=%s, lines=\n%s", xname, nidname, '\n'.join(lines))
-            LOGGER.info("SlurmHandler.is_quiet(%s): nidname=%s, nvps=%s", xname, nidname, nvps)
-            message = "'State' not found in scontrol output for slurm node '%s' - %s" % nidname
-            LOGGER.error("SlurmHandler.is_quiet(%s): %s", xname, message)
-            raise ComputeUpgradeError(message)
-        LOGGER.debug("SlurmHandler.is_quiet(%s): nidname=%s, lines=\n%s", xname, nidname, '\n'.join(lines))
-        LOGGER.debug("SlurmHandler.is_quiet(%s): nidname=%s, nvps=%s", xname, nidname, nvps)
-        state = nvps['State']
-        LOGGER.debug("SlurmHandler.is_quiet(%s): nidname=%s, state=%s", xname, nidname, state)
-        return (
-            ("IDLE" in state or "DOWN" in state) and
-            ("DRAIN" in state)
-        )
+        return is_quiet_state(SlurmHandler.states([xname])[xname])
+
+    @staticmethod
+    def states(xnames):
+        """Get the slurm 'State' field of each of the nodes in 'xnames' as
+        a dictionary indexed by xname.  States come from the snapshot
+        shared by all sessions, which is refreshed with a single
+        'scontrol show node' when it is too old.  Raises
+        ComputeUpgradeError if the state of any of the nodes could
+        not be found.
+
+        """
+        return STATE_POLLER.states(xnames)
+
+    @staticmethod
+    def job_ends(xnames):
+        """Get the time at which the last job running on each of the nodes
+        in 'xnames' is expected to end as a dictionary indexed by
+        xname, using 'squeue' to list the jobs on the nodes.  Idle
+        nodes are left out.
+
+        """
+        if not xnames:
+            return {}
+        xnames_by_nid = {NodeTable.get_nidname(xname): xname for xname in xnames}
+        hostlists = [batch.hostlist() for batch in _batches(xnames)]
+        commands = [["squeue"] + SQUEUE_JOB_ENDS + ["-w", hostlist] for hostlist in hostlists]
+        LOGGER.debug("SlurmHandler.job_ends: commands=%s", commands)
+        ends = {}
+        for hostlist, squeue in zip(hostlists, EXECUTOR.run_many(commands)):
+            # Take the output before checking for errors, which logs it.
+            #
+            # pylint: disable=unnecessary-comprehension
+            lines = [line for line in squeue.output()]
+            _check_update("SlurmHandler.job_ends", hostlist, hostlist, squeue, "list jobs on")
+            ends.update(parse_squeue_job_ends(lines))
+        return {
+            xnames_by_nid[nidname]: end for nidname, end in ends.items()
+            if nidname in xnames_by_nid
+        }
+
+    @classmethod
+    def are_ready(cls, xnames):
+        """Check which of the nodes in 'xnames' are 'ready' using a single
+        'scontrol show node'.  Returns a dictionary of booleans
+        indexed by xname.
+
+        """
+        return {xname: is_ready_state(state) for xname, state in cls.states(xnames).items()}
+
+    @classmethod
+    def are_quiet(cls, xnames):
+        """Check which of the nodes in 'xnames' are quiet using a single
+        'scontrol show node'.  Returns a dictionary of booleans
+        indexed by xname.
+
+        """
+        return {xname: is_quiet_state(state) for xname, state in cls.states(xnames).items()}
 
     @staticmethod
     def resume(xname):
         """Put the node indicated by 'xname' back into service.
 
         """
-        nidname = NodeTable.get_nidname(xname)
-        command = ["scontrol", "update", "NodeName=%s" % nidname, "State=RESUME"]
-        LOGGER.debug("SlurmHandler.resume(%s): nidname=%s, command=%s", xname, nidname, command)
-        resume = shell.shell(command)
-        # Comprehension used here to avoid passing the list
-        # reference
-        #
-        # pylint: disable=unnecessary-comprehension
-        errors = [error for error in resume.errors()]
-        if errors != []:  # pragma should never happen
-            # Since we are in an error path, we log more than normal at the info log level
-            LOGGER.info("SlurmHandler.resume(%s): nidname=%s, lines=\n%s", xname, nidname,
-                        '\n'.join([line for line in resume.output()]))
-            message = "failed to resume slurm node '%s' - %s" % (nidname, str(errors))
-            LOGGER.error("SlurmHandler.resume(%s): %s", xname, message)
-            raise ComputeUpgradeError(message)
-        LOGGER.debug("SlurmHandler.resume(%s): nidname=%s, lines=\n%s", xname, nidname,
-                     '\n'.join([line for line in resume.output()]))
+        SlurmHandler.resume_many([xname])
 
     @staticmethod
     def fail(xname, reason):
@@ -176,24 +149,193 @@ class SlurmHandler(WLMHandler):
         specifying a reason.
 
         """
-        nidname = NodeTable.get_nidname(xname)
-        command = ["scontrol", "update", "NodeName=%s" % nidname, "State=FAIL", "Reason=%s" % reason]
-        LOGGER.debug("SlurmHandler.fail(%s): nidname=%s, command=%s", xname, nidname, command)
-        fail = shell.shell(command)
-        # Comprehension used here to avoid passing the list
-        # reference
-        #
-        # pylint: disable=unnecessary-comprehension
-        errors = [error for error in fail.errors()]
-        if errors != []:  # pragma should never happen
+        SlurmHandler.fail_many([xname], reason)
+
+    @staticmethod
+    def quiesce_many(xnames):
+        """Initiate quiescing all of the nodes in 'xnames' with an 'scontrol
+        update' naming them as a hostlist (see _update_many()).
+
+        """
+        _update_many("SlurmHandler.quiesce_many", xnames,
+                     ["State=DRAIN", "Reason=rolling-upgrade"], "quiesce")
+
+    @staticmethod
+    def resume_many(xnames):
+        """Put all of the nodes in 'xnames' back into service with an
+        'scontrol update' naming them as a hostlist (see
+        _update_many()).
+
+        """
+        _update_many("SlurmHandler.resume_many", xnames, ["State=RESUME"], "resume")
+
+    @staticmethod
+    def fail_many(xnames, reason):
+        """Put all of the nodes in 'xnames' into a failed state, specifying
+        a reason, with an 'scontrol update' naming them as a hostlist
+        (see _update_many()).
+
+        """
+        _update_many("SlurmHandler.fail_many", xnames,
+                     ["State=FAIL", "Reason=%s" % reason], "put in failed state")
+
+    # The asyncio engine versions of the batched node updates run
+    # their 'scontrol update' commands as asyncio subprocesses instead
+    # of on the executor's threads.
+    @staticmethod
+    async def async_quiesce_many(xnames):
+        """Coroutine version of quiesce_many()
+
+        """
+        await _async_update_many("SlurmHandler.async_quiesce_many", xnames,
+                                 ["State=DRAIN", "Reason=rolling-upgrade"], "quiesce")
+
+    @staticmethod
+    async def async_resume_many(xnames):
+        """Coroutine version of resume_many()
+
+        """
+        await _async_update_many("SlurmHandler.async_resume_many", xnames, ["State=RESUME"], "resume")
+
+
+def _fetch_states(xnames):
+    """Utility - get the slurm 'State' field of each of the nodes in
+    'xnames' using one 'scontrol show node' per batch of nodes.
+    Returns a dictionary indexed by xname holding either the state of
+    the node or a ComputeUpgradeError saying why it could not be found.
+
+    """
+    if not xnames:
+        return {}
+    batches = _batches(xnames)
+    commands = [["scontrol", "-o", "show", "node", batch.hostlist()] for batch in batches]
+    LOGGER.debug("_fetch_states: commands=%s", commands)
+    states = {}
+    for batch, show in zip(batches, EXECUTOR.run_many(commands)):
+        xnames_by_nid = {NodeTable.get_nidname(xname): xname for xname in batch.xnames()}
+        states.update(_node_states("_fetch_states", xnames_by_nid, show))
+    return states
+
+
+# The snapshot of slurm node states shared by all sessions in this
+# agent.
+STATE_POLLER = NodeStatePoller(_fetch_states)
+
+
+def _node_states(caller, xnames_by_nid, show):
+    """Utility - given the completed 'scontrol -o show node' command 'show'
+    for the nodes in 'xnames_by_nid' (a dictionary of xnames indexed
+    by slurm node name), return the slurm 'State' field of each node
+    in a dictionary indexed by xname.  A node whose state could not be
+    found (because the command failed or did not report the node) gets
+    a ComputeUpgradeError instead, so that only the sessions asking
+    about that node see the failure.  The 'caller' string is used as
+    the log prefix.
+
+    """
+    # pylint: disable=unnecessary-comprehension
+    lines = [line for line in show.output()]
+    # pylint: disable=unnecessary-comprehension
+    errors = [error for error in show.errors()]
+    nidnames = list(xnames_by_nid)
+    if errors != []:  # pragma should never happen
+        # Since we are in an error path, we log more than normal at the info log level
+        LOGGER.info("%s(%s): lines=\n%s", caller, nidnames, '\n'.join(lines))
+        message = "failed to check slurm nodes %s - %s" % (nidnames, str(errors))
+        LOGGER.error("%s(%s): %s", caller, nidnames, message)
+        error = ComputeUpgradeError(message)
+        return {xname: error for xname in xnames_by_nid.values()}
+    nodes = {record['NodeName']: record for record in iter_show_nodes(lines)}
+    states = {}
+    for nidname, xname in xnames_by_nid.items():
+        nvps = nodes.get(nidname, {})
+        if 'State' not in nvps:  # pragma should never happen
             # Since we are in an error path, we log more than normal at the info log level
-            LOGGER.info("SlurmHandler.fail(%s): nidname=%s, lines=\n%s", xname, nidname,
-                        '\n'.join([line for line in fail.output()]))
-            message = "failed to put slurm node '%s' in failed state - %s" % (nidname, str(errors))
-            LOGGER.error("SlurmHandler.fail(%s): %s", xname, message)
-            raise ComputeUpgradeError(message)
-        LOGGER.debug("SlurmHandler.fail(%s): nidname=%s, lines=\n%s", xname, nidname,
-                     '\n'.join([line for line in fail.output()]))
+            LOGGER.info("%s(%s): lines=\n%s", caller, nidnames, '\n'.join(lines))
+            message = "'State' not found in scontrol output for slurm node '%s'" % nidname
+            LOGGER.error("%s(%s): %s", caller, nidnames, message)
+            states[xname] = ComputeUpgradeError(message)
+            continue
+        states[xname] = nvps['State']
+    LOGGER.debug("%s(%s): states=%s", caller, nidnames, states)
+    return states
+
+
+def _update_many(caller, xnames, settings, action):
+    """Utility - run 'scontrol update' applying 'settings' (a list of
+    'Name=value' strings) to all of the nodes in 'xnames', one command
+    per batch of nodes, raising an error if any of them fails.  The
+    'action' string describes the update for the error message and
+    the 'caller' string is used as the log prefix.
+
+    """
+    if not xnames:
+        return
+    hostlists, commands = _update_commands(caller, xnames, settings)
+    for hostlist, update in zip(hostlists, EXECUTOR.run_many(commands)):
+        _check_update(caller, hostlist, hostlist, update, action)
+
+
+async def _async_update_many(caller, xnames, settings, action):
+    """Utility - coroutine version of _update_many() that runs the
+    commands concurrently as asyncio subprocesses.
+
+    """
+    if not xnames:
+        return
+    hostlists, commands = _update_commands(caller, xnames, settings)
+    timeout = APP.config['WLM_COMMAND_TIMEOUT']
+    updates = await asyncio.gather(*[async_shell(command, timeout) for command in commands])
+    for hostlist, update in zip(hostlists, updates):
+        _check_update(caller, hostlist, hostlist, update, action)
+
+
+def _update_commands(caller, xnames, settings):
+    """Utility - compose the 'scontrol update' commands applying
+    'settings' to the nodes in 'xnames', one per batch of nodes, and
+    drop the nodes from the state snapshot since their states are
+    about to change.  Returns the hostlists of the batches and the
+    commands.
+
+    """
+    hostlists = [batch.hostlist() for batch in _batches(xnames)]
+    commands = [["scontrol", "update", "NodeName=%s" % hostlist] + settings
+                for hostlist in hostlists]
+    # Log the nodes as hostlists, which stay short for large batches.
+    LOGGER.debug("%s(%s): commands=%s", caller, hostlists, commands)
+    STATE_POLLER.invalidate(xnames)
+    return hostlists, commands
+
+
+def _batches(xnames):
+    """Utility - split the nodes in 'xnames' into NodeSets of at most
+    WLM_COMMAND_MAX_NODES nodes each, one for each 'scontrol' command.
+    The commands for the batches are independent of each other, so
+    they are run in parallel.
+
+    """
+    nids = list(NodeSet.from_xnames(xnames).nids())
+    size = APP.config['WLM_COMMAND_MAX_NODES']
+    return [NodeSet.from_nids(nids[start:start + size]) for start in range(0, len(nids), size)]
+
+
+def _check_update(caller, xname, nidname, update, action):
+    """Utility - given the completed slurm command 'update' (usually an
+    'scontrol update') for the node 'xname' (slurm name 'nidname'),
+    raise an error if the command reported any errors.  The 'action'
+    string describes the command for the error message.
+
+    """
+    # pylint: disable=unnecessary-comprehension
+    errors = [error for error in update.errors()]
+    if errors != []:  # pragma should never happen
+        LOGGER.info("%s(%s): nidname=%s, lines=\n%s", caller, xname, nidname,
+                    '\n'.join([line for line in update.output()]))
+        message = "failed to %s slurm node '%s' - %s" % (action, nidname, str(errors))
+        LOGGER.error("%s(%s): %s", caller, xname, message)
+        raise ComputeUpgradeError(message)
+    LOGGER.debug("%s(%s): nidname=%s, lines=\n%s", caller, xname, nidname,
+                 '\n'.join([line for line in update.output()]))
 
 
 # Register the Slurm handler with WLM
@@ -0,0 +1,321 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""WLMHandler sub-class to implement the Slurm WLM using the Slurm REST
+API (slurmrestd) instead of the 'scontrol' command
+
+"""
+import logging
+import threading
+from ....app import APP, HEADERS
+from ..node_table import NodeTable
+from ..errors import ComputeUpgradeError
+from ..requests_logger import do_request
+from ..node_set import NodeSet
+from .wrap_requests import requests, HTTPAdapter
+from .wlm import WLMHandler, wlm_handler
+from .slurm_support import (
+    expand_hostlist,
+    is_quiet_state,
+    is_ready_state,
+    UNKNOWN_JOB_END
+)
+from .state_poller import NodeStatePoller
+
+LOGGER = logging.getLogger(__name__)
+
+# slurmrestd reports a node that is not responding with this state
+# flag where 'scontrol' shows a '*' after the state.
+NOT_RESPONDING = "NOT_RESPONDING"
+
+# The job states of jobs that hold nodes.
+HOLDING_JOB_STATES = ["RUNNING", "COMPLETING"]
+
+
+class SlurmRestHandler(WLMHandler):
+    """Static class that implements a WLM API on the Slurm WLM by talking
+    to slurmrestd.  All requests share one HTTP session, so they reuse
+    pooled connections instead of each running a command.  Node
+    states are read for all nodes in one request and node updates are
+    made for a whole batch of nodes in one request.
+
+    """
+    _session = None
+    _session_lock = threading.Lock()
+
+    @classmethod
+    def session(cls):
+        """Get the HTTP session shared by all slurmrestd requests, creating
+        it on first use.  The session keeps a pool of up to
+        SLURM_REST_POOL_SIZE connections to slurmrestd.
+
+        """
+        with cls._session_lock:
+            if cls._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=APP.config['SLURM_REST_POOL_SIZE'])
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update(HEADERS)
+                session.headers['X-SLURM-USER-NAME'] = APP.config['SLURM_REST_USER']
+                if APP.config['SLURM_REST_TOKEN']:  # pragma no unit test
+                    session.headers['X-SLURM-USER-TOKEN'] = APP.config['SLURM_REST_TOKEN']
+                session.verify = APP.config['HTTPS_VERIFY']
+                cls._session = session
+            return cls._session
+
+    @staticmethod
+    def quiesce(xname):
+        """Initiate quiescing the node indicated by 'xname'; for slurm this is
+        done by 'draining' the node.
+
+        """
+        SlurmRestHandler.quiesce_many([xname])
+
+    @staticmethod
+    def is_ready(xname):
+        """Check whether the node indicated by 'xname' has reached (or is in)
+        a 'ready' state as defined by the WLM (i.e. appears to be
+        capable of being put into service or is in service).
+
+        """
+        return is_ready_state(SlurmRestHandler.states([xname])[xname])
+
+    @staticmethod
+    def is_quiet(xname):
+        """Check whether the node indicated by 'xname' has reached a quiet
+        state after having started quiescing.
+
+        """
+        return is_quiet_state(SlurmRestHandler.states([xname])[xname])
+
+    @staticmethod
+    def resume(xname):
+        """Put the node indicated by 'xname' back into service.
+
+        """
+        SlurmRestHandler.resume_many([xname])
+
+    @staticmethod
+    def fail(xname, reason):
+        """Put the node indicated by 'xname' back into a failed state,
+        specifying a reason.
+
+        """
+        SlurmRestHandler.fail_many([xname], reason)
+
+    @staticmethod
+    def states(xnames):
+        """Get the slurm state of each of the nodes in 'xnames' as a
+        dictionary indexed by xname.  The states are written the way
+        'scontrol' shows them (e.g. 'IDLE+DRAIN').  States come from a
+        snapshot shared by all sessions, which is refreshed with a
+        single request when it is too old.
+
+        """
+        return STATE_POLLER.states(xnames)
+
+    @staticmethod
+    def job_ends(xnames):
+        """Get the time at which the last job running on each of the nodes
+        in 'xnames' is expected to end as a dictionary indexed by
+        xname, using a single request to list the jobs.  Idle nodes are
+        left out.
+
+        """
+        if not xnames:
+            return {}
+        caller = "SlurmRestHandler.job_ends"
+        xnames_by_nid = {NodeTable.get_nidname(xname): xname for xname in xnames}
+        response = do_request(SlurmRestHandler.session().get, _rest_uri("jobs"),
+                              timeout=APP.config['SLURM_REST_TIMEOUT'])
+        result_data = _check_response(caller, response, "failed to list slurm jobs")
+        ends = {}
+        for job in result_data.get('jobs', []):
+            job_state = job.get('job_state')
+            job_states = job_state if isinstance(job_state, list) else [job_state]
+            if not set(job_states) & set(HOLDING_JOB_STATES):
+                continue
+            end = _job_end(job)
+            for nidname in expand_hostlist(job.get('nodes') or ""):
+                xname = xnames_by_nid.get(nidname)
+                if xname is not None:
+                    ends[xname] = max(end, ends.get(xname, end))
+        LOGGER.debug("%s: ends=%s", caller, ends)
+        return ends
+
+    @classmethod
+    def are_ready(cls, xnames):
+        """Check which of the nodes in 'xnames' are 'ready' using a single
+        request.  Returns a dictionary of booleans indexed by xname.
+
+        """
+        return {xname: is_ready_state(state) for xname, state in cls.states(xnames).items()}
+
+    @classmethod
+    def are_quiet(cls, xnames):
+        """Check which of the nodes in 'xnames' are quiet using a single
+        request.  Returns a dictionary of booleans indexed by xname.
+
+        """
+        return {xname: is_quiet_state(state) for xname, state in cls.states(xnames).items()}
+
+    @staticmethod
+    def quiesce_many(xnames):
+        """Initiate quiescing all of the nodes in 'xnames' with a single
+        update request naming them as a hostlist.
+
+        """
+        _update_nodes("SlurmRestHandler.quiesce_many", xnames,
+                      {'state': ["DRAIN"], 'reason': "rolling-upgrade"}, "quiesce")
+
+    @staticmethod
+    def resume_many(xnames):
+        """Put all of the nodes in 'xnames' back into service with a single
+        update request naming them as a hostlist.
+
+        """
+        _update_nodes("SlurmRestHandler.resume_many", xnames, {'state': ["RESUME"]}, "resume")
+
+    @staticmethod
+    def fail_many(xnames, reason):
+        """Put all of the nodes in 'xnames' into a failed state, specifying
+        a reason, with a single update request naming them as a
+        hostlist.
+
+        """
+        _update_nodes("SlurmRestHandler.fail_many", xnames,
+                      {'state': ["FAIL"], 'reason': reason}, "put in failed state")
+
+
+def _rest_uri(path):
+    """Utility - compose the slurmrestd URI for 'path' using the
+    configured API version.
+
+    """
+    return "%s/slurm/%s/%s" % (APP.config['SLURM_REST_URI'],
+                               APP.config['SLURM_REST_API_VERSION'],
+                               path)
+
+
+def _check_response(caller, response, message):
+    """Utility - decode the JSON in the slurmrestd 'response', raising an
+    error starting with 'message' if the request failed or slurmrestd
+    reported errors.  The 'caller' string is used as the log prefix.
+
+    """
+    try:
+        result_data = response.json()
+    except ValueError:  # pragma should never happen
+        # Not JSON (JSON decoding errors are ValueErrors)
+        result_data = {}
+    errors = result_data.get('errors') or []
+    if response.status_code != requests.codes['ok'] or errors:
+        message = "%s - %s[%d]" % (message, response.text, response.status_code)
+        LOGGER.error("%s: %s", caller, message)
+        raise ComputeUpgradeError(message)
+    return result_data
+
+
+def _state_string(flags):
+    """Utility - write the list of slurmrestd node state 'flags' as a
+    state the way 'scontrol' shows it (e.g. ['IDLE', 'DRAIN'] becomes
+    'IDLE+DRAIN'), so the same checks work for both handlers.
+
+    """
+    parts = [flag for flag in flags if flag != NOT_RESPONDING]
+    state = "+".join(parts)
+    if NOT_RESPONDING in flags:
+        state += "*"
+    return state
+
+
+def _job_end(job):
+    """Utility - get the expected end time of the slurmrestd description
+    of a 'job'.  Depending on the API version the end time is either a
+    number or a dictionary holding the number, which may be unset or
+    infinite (UNKNOWN_JOB_END).
+
+    """
+    end_time = job.get('end_time')
+    if isinstance(end_time, dict):
+        if not end_time.get('set', True) or end_time.get('infinite', False):
+            return UNKNOWN_JOB_END
+        end_time = end_time.get('number')
+    return float(end_time) if end_time else UNKNOWN_JOB_END
+
+
+def _fetch_states(xnames):
+    """Utility - get the slurm state of each of the nodes in 'xnames'
+    using a single request for all nodes.  Returns a dictionary
+    indexed by xname holding either the state of the node or a
+    ComputeUpgradeError if slurmrestd did not report the node.
+
+    """
+    if not xnames:
+        return {}
+    caller = "SlurmRestHandler._fetch_states"
+    xnames_by_nid = {NodeTable.get_nidname(xname): xname for xname in xnames}
+    response = do_request(SlurmRestHandler.session().get, _rest_uri("nodes"),
+                          timeout=APP.config['SLURM_REST_TIMEOUT'])
+    result_data = _check_response(caller, response, "failed to get slurm node states")
+    states = {}
+    for node in result_data.get('nodes', []):
+        xname = xnames_by_nid.get(node.get('name'))
+        if xname is not None:
+            states[xname] = _state_string(node.get('state', []))
+    for nidname, xname in xnames_by_nid.items():
+        if xname not in states:  # pragma should never happen
+            message = "slurm node '%s' not found in slurmrestd node list" % nidname
+            LOGGER.error("%s: %s", caller, message)
+            states[xname] = ComputeUpgradeError(message)
+    LOGGER.debug("%s: states=%s", caller, states)
+    return states
+
+
+# The snapshot of slurmrestd node states shared by all sessions in
+# this agent.
+STATE_POLLER = NodeStatePoller(_fetch_states)
+
+
+def _update_nodes(caller, xnames, settings, action):
+    """Utility - make one slurmrestd update request applying 'settings'
+    (a dictionary of node update fields) to all of the nodes in
+    'xnames', raising an error if it fails.  The 'action' string
+    describes the update for the error message and the 'caller' string
+    is used as the log prefix.
+
+    """
+    if not xnames:
+        return
+    hostlist = NodeSet.from_xnames(xnames).hostlist()
+    LOGGER.debug("%s(%s): settings=%s", caller, hostlist, settings)
+    STATE_POLLER.invalidate(xnames)
+    response = do_request(SlurmRestHandler.session().post, _rest_uri("node/%s" % hostlist),
+                          json=settings, timeout=APP.config['SLURM_REST_TIMEOUT'])
+    _check_response(caller, response, "failed to %s slurm nodes '%s'" % (action, hostlist))
+
+
+# Register the Slurm REST handler with WLM
+wlm_handler("slurm-rest", SlurmRestHandler)
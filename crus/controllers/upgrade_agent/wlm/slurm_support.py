@@ -25,6 +25,20 @@
 
 """
 import re
+import time
+from itertools import chain
+from ..node_set import parse_hostlist
+
+# The fields of a node that the upgrade agent uses.
+SHOW_NODE_FIELDS = ("NodeName", "State", "Reason", "BootTime", "SlurmdStartTime")
+
+# Fields whose values may contain spaces.
+_SPACED_FIELDS = frozenset(["Reason", "OS", "Comment"])
+
+# The compiled patterns that find the value of each field on a one
+# line 'scontrol -o show node' record, indexed by field name (see
+# _field_pattern()).
+_FIELD_PATTERNS = {}
 
 
 def parse_show_node(lines):
@@ -63,8 +77,8 @@ def parse_show_all_nodes(lines):
     """
     nodes = {}
     parse_lines = []
-    lines.append(None)  # put in a marker for the end...
-    for line in lines:
+    # Put a marker on the end without changing the caller's list...
+    for line in chain(lines, [None]):
         if line is None or line[0:8] == "NodeName":
             if parse_lines:
                 nvps = parse_show_node(parse_lines)
@@ -74,3 +88,111 @@ def parse_show_all_nodes(lines):
             continue
         parse_lines.append(line)
     return nodes
+
+
+def iter_show_nodes(lines, fields=SHOW_NODE_FIELDS):
+    """Parse the output of 'scontrol -o show node', which has one line per
+    node, generating a dictionary of the requested 'fields' (those
+    that are present) for each node in turn.  Only the requested
+    fields are extracted, so large outputs can be parsed without
+    building a dictionary of every field of every node.
+
+    """
+    patterns = [(name, _field_pattern(name)) for name in fields]
+    for line in lines:
+        if not line.startswith("NodeName="):
+            # Skip blank lines and anything else that is not a node
+            # record.
+            continue
+        line = line.rstrip()
+        record = {}
+        for name, pattern in patterns:
+            match = pattern.search(line)
+            if match is not None:
+                record[name] = match.group(1)
+        yield record
+
+
+def _field_pattern(name):
+    """Utility - get the compiled pattern that finds the value of the
+    field 'name' on a one line 'scontrol -o show node' record,
+    compiling it the first time the field is asked for.  The value
+    runs to the next space or, for values that may contain spaces,
+    to the next ' Name=' item.
+
+    """
+    pattern = _FIELD_PATTERNS.get(name)
+    if pattern is None:
+        value = r"(.*?)(?= [A-Za-z_]+=|$)" if name in _SPACED_FIELDS else r"(\S*)"
+        pattern = re.compile(r"(?:^| )%s=%s" % (re.escape(name), value))
+        _FIELD_PATTERNS[name] = pattern
+    return pattern
+
+
+def expand_hostlist(expr):
+    """Expand a slurm hostlist expression (e.g. 'nid[000001-000003,000007]'
+    or a comma separated list of names and expressions) into the list
+    of node names it describes.
+
+    """
+    names = []
+    for prefix, first, last in parse_hostlist(expr):
+        if not first:
+            names.append(prefix)
+            continue
+        width = len(first)
+        names.extend("%s%0*d" % (prefix, width, number)
+                     for number in range(int(first), int(last) + 1))
+    return names
+
+
+def is_ready_state(state):
+    """Decide whether the slurm node state 'state' (as shown in the
+    'State' field of 'scontrol show node') is 'ready'.  In slurm, a
+    '*' in the State field indicates that the node is compromised in
+    some way and not ready to be in service.
+
+    """
+    return "IDLE" in state and '*' not in state
+
+
+def is_quiet_state(state):
+    """Decide whether the slurm node state 'state' is quiet (drained).
+
+    """
+    return ("IDLE" in state or "DOWN" in state) and "DRAIN" in state
+
+
+# The 'squeue' options that list the expected end time and node list
+# of each job holding nodes, one job per line.
+SQUEUE_JOB_ENDS = ["-h", "-t", "RUNNING,COMPLETING", "-o", "%e %N"]
+
+# The expected end time given to a job that has none (e.g. one with no
+# time limit), which orders it after every job that has one.
+UNKNOWN_JOB_END = float('inf')
+
+# The format of times shown by slurm commands.
+SLURM_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def parse_squeue_job_ends(lines):
+    """Parse the output of 'squeue' run with SQUEUE_JOB_ENDS into a
+    dictionary of the time (seconds since the epoch) at which the last
+    job on each node is expected to end, indexed by node name.  Nodes
+    with no jobs do not appear.  An end time that squeue cannot give
+    (e.g. 'Unknown' or 'NONE') counts as UNKNOWN_JOB_END.
+
+    """
+    ends = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) != 2:
+            continue
+        end_time, nodes = fields
+        try:
+            end = time.mktime(time.strptime(end_time, SLURM_TIME_FORMAT))
+        except ValueError:
+            end = UNKNOWN_JOB_END
+        for name in expand_hostlist(nodes):
+            ends[name] = max(end, ends.get(name, end))
+    return ends
@@ -0,0 +1,164 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""A snapshot of WLM node states shared by all of the upgrade sessions
+in an agent
+
+"""
+import logging
+import threading
+import time
+from ....app import APP
+from ..errors import ComputeUpgradeError
+
+LOGGER = logging.getLogger(__name__)
+
+
+class NodeStatePoller:
+    """Keeps an in-memory snapshot of the WLM state of the nodes that
+    upgrade sessions are interested in.  A request for node states is
+    answered from the snapshot if it holds all of the nodes and is no
+    older than 'max_age' seconds.  Otherwise, the snapshot is refreshed
+    with a single bulk query covering the requested nodes and every
+    node asked about in the last 'interest' seconds, so sessions
+    polling at the same time share one query instead of each making
+    their own.
+
+    The query runs without the mutex held, so requests that the
+    snapshot can answer are not held up by it.  Requests that need a
+    refresh while a query is in flight wait for that query and use
+    its result if it covers their nodes.  A node the WLM could not
+    report on is held in the snapshot as the ComputeUpgradeError
+    describing why, which is raised only to requests for that node.
+
+    """
+    def __init__(self, fetch, max_age=None, interest=None):
+        """Constructor - 'fetch' is a function taking a list of xnames and
+        returning a dictionary indexed by xname of their states, or of
+        a ComputeUpgradeError for each node whose state could not be
+        found.  'max_age' and 'interest' default to the
+        WLM_STATE_MAX_AGE and WLM_STATE_INTEREST settings, read each
+        time they are used.
+
+        """
+        self.fetch = fetch
+        self.max_age = max_age
+        self.interest = interest
+        self.snapshot = {}
+        self.taken = None
+        self.asked = {}  # xname -> time last asked about
+        self.mutex = threading.Condition()
+        self.refreshing = False
+        self.changed = set()  # xnames invalidated during a refresh
+        self.queries = 0
+
+    def _setting(self, value, name):
+        """Utility - use 'value' if it was given, otherwise the setting
+        'name'.
+
+        """
+        return value if value is not None else APP.config[name]
+
+    def _covers(self, xnames, now):
+        """Utility - called with the mutex held, check whether the snapshot
+        is fresh and holds all of the nodes in 'xnames'.
+
+        """
+        max_age = self._setting(self.max_age, 'WLM_STATE_MAX_AGE')
+        fresh = self.taken is not None and now - self.taken < max_age
+        return fresh and all(xname in self.snapshot for xname in xnames)
+
+    def states(self, xnames, now=None):
+        """Get the states of the nodes in 'xnames' as a dictionary indexed
+        by xname, refreshing the snapshot if it is too old or missing
+        any of them.  Raises ComputeUpgradeError if the state of any of
+        the nodes could not be found.
+
+        """
+        if not xnames:
+            return {}
+        with self.mutex:
+            now = now if now is not None else time.time()
+            for xname in xnames:
+                self.asked[xname] = now
+            while self.refreshing and not self._covers(xnames, now):
+                self.mutex.wait()
+            if self._covers(xnames, now):
+                return _checked({xname: self.snapshot[xname] for xname in xnames})
+            wanted = self._interesting(now)
+            self.refreshing = True
+            self.changed = set()
+        fetched = None
+        try:
+            LOGGER.debug("NodeStatePoller.states: refreshing %d nodes", len(wanted))
+            fetched = self.fetch(wanted)
+        finally:
+            with self.mutex:
+                self.refreshing = False
+                if fetched is not None:
+                    # Nodes changed while the query was in flight may
+                    # have been reported as they were before the
+                    # change, leave them out of the snapshot.
+                    self.snapshot = {
+                        xname: state for xname, state in fetched.items()
+                        if xname not in self.changed
+                    }
+                    self.taken = now
+                    self.queries += 1
+                self.mutex.notify_all()
+        return _checked({xname: fetched[xname] for xname in xnames})
+
+    def invalidate(self, xnames):
+        """Forget the states of the nodes in 'xnames' because they were
+        just changed, so the next request for them queries the WLM.
+
+        """
+        with self.mutex:
+            for xname in xnames:
+                self.snapshot.pop(xname, None)
+            if self.refreshing:
+                self.changed.update(xnames)
+
+    def _interesting(self, now):
+        """Utility - called with the mutex held, drop the nodes that have
+        not been asked about recently and return the rest, sorted.
+
+        """
+        interest = self._setting(self.interest, 'WLM_STATE_INTEREST')
+        self.asked = {
+            xname: asked for xname, asked in self.asked.items()
+            if now - asked <= interest
+        }
+        return sorted(self.asked)
+
+
+def _checked(states):
+    """Utility - return 'states', a dictionary of node states indexed by
+    xname, unless it holds errors for any of the nodes, in which case
+    raise a ComputeUpgradeError describing them.
+
+    """
+    errors = sorted({str(state) for state in states.values() if isinstance(state, ComputeUpgradeError)})
+    if errors:
+        raise ComputeUpgradeError("; ".join(errors))
+    return states
@@ -24,6 +24,7 @@
 """Base Class for managing WLMs
 
 """
+import asyncio
 import logging
 from ..errors import ComputeUpgradeError
 WLM_HANDLERS = {}
@@ -75,6 +76,96 @@ class WLMHandler:
         """
         raise NotImplementedError
 
+    @staticmethod
+    def states(xnames):  # pragma abstract method
+        """Get the WLM specific state of each of the nodes in 'xnames' as a
+        dictionary indexed by xname.
+
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def job_ends(xnames):  # pylint: disable=unused-argument
+        """Get the time (seconds since the epoch) at which the last job
+        running on each of the nodes in 'xnames' is expected to end as
+        a dictionary indexed by xname.  Idle nodes are left out.  By
+        default no jobs are known about, so every node looks idle.
+        WLMs that can tell override this.
+
+        """
+        return {}
+
+    # Batched versions of the node checks.  By default these check the
+    # nodes one at a time.  WLMs that can check many nodes in one
+    # request override them.
+    @classmethod
+    def are_ready(cls, xnames):
+        """Check which of the nodes in 'xnames' are 'ready' (see
+        is_ready()).  Returns a dictionary of booleans indexed by
+        xname.
+
+        """
+        return {xname: cls.is_ready(xname) for xname in xnames}
+
+    @classmethod
+    def are_quiet(cls, xnames):
+        """Check which of the nodes in 'xnames' are quiet (see
+        is_quiet()).  Returns a dictionary of booleans indexed by
+        xname.
+
+        """
+        return {xname: cls.is_quiet(xname) for xname in xnames}
+
+    # Batched versions of the node updates.  By default these update
+    # the nodes one at a time.  WLMs that can update many nodes in one
+    # request override them.
+    @classmethod
+    def quiesce_many(cls, xnames):
+        """Initiate quiescing all of the nodes in 'xnames' (see
+        quiesce()).
+
+        """
+        for xname in xnames:
+            cls.quiesce(xname)
+
+    @classmethod
+    def resume_many(cls, xnames):
+        """Put all of the nodes in 'xnames' back into service (see
+        resume()).
+
+        """
+        for xname in xnames:
+            cls.resume(xname)
+
+    @classmethod
+    def fail_many(cls, xnames, reason):
+        """Put all of the nodes in 'xnames' into a failed state with the
+        same reason (see fail()).
+
+        """
+        for xname in xnames:
+            cls.fail(xname, reason)
+
+    # Coroutine versions of the batched node updates used by the
+    # asyncio engine.  By default these run the blocking versions in
+    # the event loop's executor.  WLMs that can do better (e.g. by
+    # running their commands as asyncio subprocesses) override them.
+    @classmethod
+    async def async_quiesce_many(cls, xnames):
+        """Coroutine version of quiesce_many()
+
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, cls.quiesce_many, xnames)
+
+    @classmethod
+    async def async_resume_many(cls, xnames):
+        """Coroutine version of resume_many()
+
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, cls.resume_many, xnames)
+
 
 def wlm_handler(wlm_type, handler_class):
     """ Register a WLM Handler...
@@ -21,11 +21,16 @@
 # ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 #
-"""Control import of 'shell' based on config (mock or real)
+"""Control import of 'shell', 'async_shell' and 'CommandExecutor' based
+on config (mock or real)
 
 """
 from ....app import APP
 if APP.config['MOCK_WLM']:
     from ...mocking.shared import shell  # pylint: disable=unused-import
+    from ...mocking.shared.shell import async_shell  # pylint: disable=unused-import
+    from ...mocking.shared.shell import CommandExecutor  # pylint: disable=unused-import
 else:  # pragma no unit test
     import shell  # pylint: disable=unused-import
+    from .async_shell import async_shell  # pylint: disable=unused-import
+    from .command_executor import CommandExecutor  # pylint: disable=unused-import
@@ -0,0 +1,122 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""A bounded pool of workers for processing upgrade session events
+concurrently within one upgrade agent.
+
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SessionWorkerPool:
+    """Dispatch upgrade session events to a bounded pool of worker
+    threads.  Events are keyed on Upgrade ID so that at most one worker
+    is processing a given session at any time.  An event that arrives
+    for a session that is already being processed is held and handed
+    to the same worker when it finishes (only the most recent such
+    event is kept, since the handler re-reads the session from ETCD
+    anyway).
+
+    The 'handler' is called with the upgrade session from the event.
+    Submitting blocks once all workers are busy, which keeps the
+    dispatcher from reading further ahead in the watch queue than the
+    pool can absorb.
+
+    """
+    def __init__(self, handler, workers):
+        """Constructor
+
+        """
+        assert workers >= 1
+        self.handler = handler
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers)
+        self.cond = threading.Condition()
+        self.active = set()
+        self.deferred = {}
+
+    def submit(self, upgrade_session):
+        """Hand the event for 'upgrade_session' to a worker.  Returns True if
+        a worker was started for the event or False if it was deferred
+        because that session is already being processed.
+
+        """
+        upgrade_id = upgrade_session.upgrade_id
+        with self.cond:
+            if upgrade_id in self.active:
+                LOGGER.debug("SessionWorkerPool.submit: deferring id %s, already in progress", upgrade_id)
+                self.deferred[upgrade_id] = upgrade_session
+                return False
+            self.active.add(upgrade_id)
+        self.slots.acquire()
+        self.executor.submit(self._run, upgrade_session)
+        return True
+
+    def busy(self):
+        """Check whether any session is currently being processed.
+
+        """
+        with self.cond:
+            return bool(self.active)
+
+    def wait_idle(self, timeout=None):
+        """Wait until no session is being processed (or until 'timeout'
+        seconds have passed).  Returns True if the pool is idle.
+
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.active, timeout)
+
+    def shutdown(self, wait=True):
+        """Stop accepting work and (optionally) wait for the workers to
+        finish what they are doing.
+
+        """
+        self.executor.shutdown(wait=wait)
+
+    def _run(self, upgrade_session):
+        """Worker body: process the supplied event and then any events that
+        were deferred for the same session while it was processing.
+
+        """
+        upgrade_id = upgrade_session.upgrade_id
+        try:
+            while upgrade_session is not None:
+                try:
+                    self.handler(upgrade_session)
+                except Exception:  # pylint: disable=broad-except
+                    # Keep the worker alive, the session will be picked
+                    # up again on its next watch event.
+                    LOGGER.exception("SessionWorkerPool: processing id %s failed", upgrade_id)
+                with self.cond:
+                    upgrade_session = self.deferred.pop(upgrade_id, None)
+                    if upgrade_session is None:
+                        self.active.discard(upgrade_id)
+                        self.cond.notify_all()
+        finally:
+            self.slots.release()
@@ -0,0 +1,122 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Data Model for the persisted snapshot of the Compute Rolling Upgrade
+Agent's node table, used to start the agent without waiting for BSS.
+
+"""
+import base64
+import zlib
+from etcd3_model import Etcd3Model, Etcd3Attr
+from ..app import APP, ETCD
+
+# The version of the snapshot encoding.  Snapshots with any other
+# version are ignored.
+SNAPSHOT_VERSION = 1
+
+
+def _no_snapshot_id():  # pragma should never happen
+    """Default for snapshot_id, raises an exception because instantiating
+    a NodeTableSnapshot without a Snapshot ID is not permitted.
+
+    """
+    reason = "'snapshot_id' must be specified in constructor of "\
+        "NodeTableSnapshot objects"
+    raise AttributeError(reason)
+
+
+class NodeTableSnapshot(Etcd3Model):
+    """An ETCD persisted object holding the XNAME / NID pairs of the
+    node table, compactly encoded.
+
+    Fields:
+
+    snapshot_id
+
+        The name of the snapshot (the role of the nodes in it).  This
+        is the Object ID.
+
+    version
+
+        The version of the encoding of 'nids' and 'xnames'
+        (SNAPSHOT_VERSION when written).
+
+    saved
+
+        The numeric time at which the snapshot was saved.
+
+    nids
+
+        The NIDs of the nodes in ascending order, as a list of
+        inclusive [first, last] ranges of consecutive NIDs.
+
+    xnames
+
+        The XNAMEs of the nodes in the same order as 'nids', comma
+        separated, zlib compressed and base64 encoded.
+
+    """
+    etcd_instance = ETCD
+    model_prefix = "%s/%s" % (APP.config['ETCD_PREFIX'], "node_table_snapshot")
+
+    snapshot_id = Etcd3Attr(is_object_id=True, default=_no_snapshot_id)
+    version = Etcd3Attr(default=0)
+    saved = Etcd3Attr(default=0.0)
+    nids = Etcd3Attr(default=[])
+    xnames = Etcd3Attr(default="")
+
+    def set_nodes(self, nodes):
+        """Encode 'nodes', a dictionary of NIDs indexed by XNAME, into the
+        snapshot.
+
+        """
+        pairs = sorted(nodes.items(), key=lambda pair: pair[1])
+        ranges = []
+        for _, nid in pairs:
+            if ranges and nid == ranges[-1][1] + 1:
+                ranges[-1][1] = nid
+            else:
+                ranges.append([nid, nid])
+        text = ",".join(xname for xname, _ in pairs)
+        self.version = SNAPSHOT_VERSION
+        self.nids = ranges
+        self.xnames = base64.b64encode(zlib.compress(text.encode())).decode()
+
+    def get_nodes(self):
+        """Decode the snapshot into a dictionary of NIDs indexed by XNAME.
+        Raises ValueError if the snapshot is not in a usable form.
+
+        """
+        if self.version != SNAPSHOT_VERSION:
+            raise ValueError("node table snapshot version %s is not %d" %
+                             (self.version, SNAPSHOT_VERSION))
+        try:
+            text = zlib.decompress(base64.b64decode(self.xnames)).decode()
+        except zlib.error as err:
+            raise ValueError("node table snapshot XNAMEs are corrupt: %s" % err)
+        xnames = text.split(",") if text else []
+        nids = [nid for first, last in self.nids for nid in range(first, last + 1)]
+        if len(xnames) != len(nids):
+            raise ValueError("node table snapshot has %d XNAMEs and %d NIDs" %
+                             (len(xnames), len(nids)))
+        return dict(zip(xnames, nids))
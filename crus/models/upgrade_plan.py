@@ -0,0 +1,117 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Data Model for the frozen plan of a Compute Rolling Upgrade Session:
+the ordered list of nodes to be upgraded and where each step starts in
+that list.
+
+"""
+import base64
+import zlib
+from etcd3_model import Etcd3Model, Etcd3Attr
+from ..app import APP, ETCD
+
+
+def _no_upgrade_id():  # pragma should never happen
+    """Default for upgrade_id, raises an exception because instantiating
+    an UpgradePlan without an Upgrade ID is not permitted.
+
+    """
+    reason = "'upgrade_id' must be specified in constructor of "\
+        "UpgradePlan objects"
+    raise AttributeError(reason)
+
+
+class UpgradePlan(Etcd3Model):
+    """An ETCD persisted object holding the plan of an upgrade session,
+    computed from the starting node group once when the session starts
+    and never changed afterwards, so that the steps of the session
+    stay the same even if the starting node group changes.
+
+    Fields:
+
+    upgrade_id
+
+        The Upgrade ID of the associated Upgrade Session.  This is the
+        Object ID.
+
+    nodes
+
+        The ordered list of xnames of the nodes to be upgraded, comma
+        separated, zlib compressed and base64 encoded, since a plan
+        can hold every compute node in the system.  Use set_nodes()
+        and get_nodes() to store and retrieve the list.
+
+    boundaries
+
+        The index in the node list of the first node of each step, in
+        step order.  Step N is made up of the nodes from boundaries[N]
+        up to (but not including) boundaries[N+1], or up to the end of
+        the node list for the last step.
+
+    """
+    etcd_instance = ETCD
+    model_prefix = "%s/%s" % (APP.config['ETCD_PREFIX'], "upgrade_plan")
+
+    upgrade_id = Etcd3Attr(is_object_id=True, default=_no_upgrade_id)
+    nodes = Etcd3Attr(default="")
+    boundaries = Etcd3Attr(default=[])
+
+    def set_nodes(self, nodes):
+        """Encode 'nodes', the ordered list of xnames to be upgraded, into
+        the plan.
+
+        """
+        text = ",".join(nodes)
+        self.nodes = base64.b64encode(zlib.compress(text.encode())).decode()
+
+    def get_nodes(self):
+        """Decode the ordered list of xnames to be upgraded from the plan.
+
+        """
+        if not self.nodes:
+            return []
+        text = zlib.decompress(base64.b64decode(self.nodes)).decode()
+        return text.split(",") if text else []
+
+    def step_nodes(self, step):
+        """Get the list of nodes in step number 'step' of the plan (an
+        empty list if there is no such step).
+
+        """
+        if step >= len(self.boundaries):
+            return []
+        nodes = self.get_nodes()
+        first = self.boundaries[step]
+        if step + 1 < len(self.boundaries):
+            return nodes[first:self.boundaries[step + 1]]
+        return nodes[first:]
+
+    def nodes_from(self, step):
+        """Get the list of nodes in step number 'step' and all later steps
+        of the plan.
+
+        """
+        if step >= len(self.boundaries):
+            return []
+        return self.get_nodes()[self.boundaries[step]:]
@@ -43,6 +43,33 @@ BOOTING = "BOOTING"
 BOOTED = "BOOTED"
 WLM_WAITING = "WLM_WAITING"
 CLEANUP = "CLEANUP"
+STREAMING = "STREAMING"
+
+# Upgrade mode constants for UpgradeSession
+SERIAL = "serial"
+PIPELINED = "pipelined"
+STREAMED = "streaming"
+SLIDING = "sliding"
+UPGRADE_MODES = [SERIAL, PIPELINED, STREAMED, SLIDING]
+
+# Node order constants for UpgradeSession
+LISTED_ORDER = "listed"
+JOB_END_ORDER = "job_end"
+NODE_ORDERS = [LISTED_ORDER, JOB_END_ORDER]
+
+# Step composition constants for UpgradeSession
+SEQUENTIAL_STEPS = "sequential"
+SPREAD_STEPS = "spread"
+STEP_COMPOSITIONS = [SEQUENTIAL_STEPS, SPREAD_STEPS]
+
+# Per-node state codes for ComputeUpgradeProgress.node_states, kept
+# to a single character to keep the progress record small.
+NODE_DRAINING = "Q"
+NODE_DRAINED = "D"
+NODE_BOOTING = "B"
+NODE_WAITING = "W"
+NODE_DONE = "R"
+NODE_FAILED = "F"
 
 
 def _no_upgrade_id():  # pragma should never happen
@@ -90,6 +117,26 @@ class ComputeUpgradeProgress(Etcd3Model):
         The list of nodes in a step that have come back into service
         in the WLM.
 
+    lookahead_step
+
+        In pipelined mode, the number of the step whose nodes were
+        asked to quiesce ahead of time while the current step was
+        booting, or None if no step is quiescing ahead of time.
+
+    node_states
+
+        In streaming mode, a map from the xname of each node in the
+        current step to a two element list: the node's state code
+        (NODE_DRAINING, NODE_DRAINED, NODE_BOOTING, NODE_WAITING,
+        NODE_DONE or NODE_FAILED) and the numeric time at which the
+        node entered that state.  In sliding mode this holds only the
+        nodes that are in flight.
+
+    admitted
+
+        In sliding mode, the number of nodes (in upgrade plan order)
+        that have been taken into the sliding window so far.
+
     """
     etcd_instance = ETCD
     model_prefix = "%s/%s" % (APP.config['ETCD_PREFIX'], "upgrade_progress")
@@ -99,6 +146,9 @@ class ComputeUpgradeProgress(Etcd3Model):
     stage = Etcd3Attr(default=STARTING)
     boot_complete_time = Etcd3Attr(default=None)
     completed_nodes = Etcd3Attr(default=[])
+    lookahead_step = Etcd3Attr(default=None)
+    node_states = Etcd3Attr(default={})
+    admitted = Etcd3Attr(default=0)
 
 
 class UpgradeSession(Etcd3Model):
@@ -122,6 +172,28 @@ class UpgradeSession(Etcd3Model):
                                  this upgrade.  The Node Groups label in
                                  this template must exactly match the
                                  value of 'upgrading_label' above.
+            upgrade_mode: how steps are sequenced, either 'serial' (each
+                          step runs start to finish before the next
+                          begins), 'pipelined' (the nodes of the next
+                          step quiesce while the current step boots),
+                          'streaming' (each node in a step moves on
+                          as soon as it is ready to) or 'sliding' (a
+                          window of nodes moves through the upgrade
+                          with a new node entering as each one
+                          leaves).
+            max_in_flight: in 'sliding' mode, the number of nodes in the
+                           window (defaults to upgrade_step_size).
+            node_order: the order in which the nodes are upgraded,
+                        either 'listed' (the order of the starting
+                        node group) or 'job_end' (idle nodes first,
+                        then by when their running jobs are
+                        expected to end).
+            step_composition: how the ordered nodes are made into
+                              steps, either 'sequential' (consecutive
+                              nodes) or 'spread' (nodes spread across
+                              cabinets, chassis and slots).
+            max_per_cabinet: the most nodes from any one cabinet in a
+                             step (no limit if not set).
             completed: A boolean indicating whether processing on this
                        Upgrade Session has completed or not.  Internally
                        set but externally visible for convenience.
@@ -167,6 +239,23 @@ class UpgradeSession(Etcd3Model):
     # 'upgrading_label'.
     upgrade_template_id = Etcd3Attr(default=None)
 
+    # How the steps of the upgrade are sequenced: 'serial',
+    # 'pipelined', 'streaming' or 'sliding'.
+    upgrade_mode = Etcd3Attr(default=SERIAL)
+
+    # In 'sliding' mode, the number of nodes out of service at once.
+    # None means use 'upgrade_step_size'.
+    max_in_flight = Etcd3Attr(default=None)
+
+    # The order in which the nodes are upgraded: 'listed' or 'job_end'.
+    node_order = Etcd3Attr(default=LISTED_ORDER)
+
+    # How the nodes are made into steps: 'sequential' or 'spread'.
+    step_composition = Etcd3Attr(default=SEQUENTIAL_STEPS)
+
+    # The most nodes from one cabinet in a step.  None means no limit.
+    max_per_cabinet = Etcd3Attr(default=None)
+
     # A boolean indicating whether processing on this Upgrade Session
     # has completed or not.  Internally set but externally visible for
     # convenience.
@@ -215,7 +304,9 @@ FAILED_LABEL_DESCRIPTION = clean_desc(
 WORKLOAD_MGR_TYPE_DESC = clean_desc(
     """
     The name of the workload manager controlling the nodes with the
-    starting label.  Currently supported value: 'slurm'.
+    starting label.  Currently supported values: 'slurm', which manages
+    the nodes using the 'scontrol' command, and 'slurm-rest', which
+    manages them through the Slurm REST API (slurmrestd).
     """
 )
 
@@ -237,6 +328,63 @@ UPGRADE_TEMPLATE_ID_DESC = clean_desc(
 )
 SAMPLE_UPGRADE_TEMPLATE_ID = "a4cfe939-6057-4137-94b6-3de46157cb53"
 
+UPGRADE_MODE_DESC = clean_desc(
+    """
+    How the steps of the rolling upgrade are sequenced.  In 'serial'
+    mode (the default) each step is quiesced, booted and returned to
+    service before the next step begins.  In 'pipelined' mode the
+    nodes of the next step begin quiescing while the current step is
+    booting, so that at most two steps' worth of nodes are out of
+    service at once.  In 'streaming' mode each node in a step moves on
+    independently: nodes are booted in batches as they finish
+    quiescing, so a node that is slow to quiesce does not hold up the
+    rest of its step.  In 'sliding' mode there are no steps, instead
+    up to 'max_in_flight' nodes are upgraded at a time and as each
+    node returns to service the next node begins quiescing.
+    """
+)
+
+MAX_IN_FLIGHT_DESC = clean_desc(
+    """
+    In 'sliding' mode, the number of nodes being upgraded (out of
+    service) at any time.  Defaults to 'upgrade_step_size'.
+    """
+)
+
+NODE_ORDER_DESC = clean_desc(
+    """
+    The order in which the nodes are upgraded.  In 'listed' order (the
+    default) nodes are upgraded in the order of the starting node
+    group.  In 'job_end' order the workload manager is asked which
+    jobs are running on the nodes when the upgrade starts.  Idle nodes
+    are upgraded first, followed by the busy nodes in the order their
+    jobs are expected to end, so that each step is made of nodes that
+    finish quiescing at about the same time.
+    """
+)
+
+STEP_COMPOSITION_DESC = clean_desc(
+    """
+    How the ordered nodes are made into steps.  In 'sequential'
+    composition (the default) each step is the next
+    'upgrade_step_size' nodes.  In 'spread' composition the nodes are
+    first spread across cabinets, then across the chassis of each
+    cabinet and the slots of each chassis, so that a step does not
+    reboot a whole blade or chassis at once.  Nodes in the same slot
+    keep the order given by 'node_order'.
+    """
+)
+
+MAX_PER_CABINET_DESC = clean_desc(
+    """
+    The most nodes from any one cabinet in a step.  A node that would
+    exceed it moves to a later step and its place is taken by the next
+    node from another cabinet.  Not set (the default) means no limit.
+    In 'sliding' mode the limit applies to the planned steps but not
+    to the window.
+    """
+)
+
 COMPLETED_DESC = clean_desc(
     """
     A boolean indicating whether processing on this Upgrade Session
@@ -279,7 +427,7 @@ class UpgradeSessionSchema(MA.Schema):
 
     workload_manager_type = fields.Str(description=WORKLOAD_MGR_TYPE_DESC,
                                        example="slurm",
-                                       validate=validate.OneOf(["slurm"]),
+                                       validate=validate.OneOf(["slurm", "slurm-rest"]),
                                        required=True)
 
     upgrade_step_size = fields.Int(description=UPGRADE_STEP_SIZE_DESC,
@@ -292,6 +440,31 @@ class UpgradeSessionSchema(MA.Schema):
                                      validate=validate.Length(min=1),
                                      required=True)
 
+    upgrade_mode = fields.Str(description=UPGRADE_MODE_DESC,
+                              example=SERIAL,
+                              validate=validate.OneOf(UPGRADE_MODES),
+                              required=False)
+
+    max_in_flight = fields.Int(description=MAX_IN_FLIGHT_DESC,
+                               example=50,
+                               validate=validate.Range(min=1),
+                               required=False)
+
+    node_order = fields.Str(description=NODE_ORDER_DESC,
+                            example=LISTED_ORDER,
+                            validate=validate.OneOf(NODE_ORDERS),
+                            required=False)
+
+    step_composition = fields.Str(description=STEP_COMPOSITION_DESC,
+                                  example=SEQUENTIAL_STEPS,
+                                  validate=validate.OneOf(STEP_COMPOSITIONS),
+                                  required=False)
+
+    max_per_cabinet = fields.Int(description=MAX_PER_CABINET_DESC,
+                                 example=8,
+                                 validate=validate.Range(min=1),
+                                 required=False)
+
     completed = fields.Bool(description=COMPLETED_DESC,
                             example=False,
                             required=False)
@@ -323,6 +496,11 @@ class UpgradeSessionSchema(MA.Schema):
             'workload_manager_type',
             'upgrade_step_size',
             'upgrade_template_id',
+            'upgrade_mode',
+            'max_in_flight',
+            'node_order',
+            'step_composition',
+            'max_per_cabinet',
             'completed',
             'state',
             'messages',
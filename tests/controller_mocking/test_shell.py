@@ -25,6 +25,7 @@
 testing of the Compute Rolling Upgrade Agent.
 
 """
+import asyncio
 import sys
 from crus.controllers.mocking.shared import shell
 
@@ -43,12 +44,26 @@ class MyTestCommand(shell.Command):
         return 0
 
 
+class MyFailingCommand(shell.Command):
+    """ Test command handler that fails or hangs as its argument says
+    """
+    def run(self, argv):
+        """ Run method, hangs if asked to, otherwise exits with the
+        status given in argv[1].
+        """
+        if argv[1] == "hang":
+            raise shell.CommandTimeout
+        print("failing", file=sys.stderr)
+        return int(argv[1])
+
+
 def test_register_command():
     """Test registering a command.  This also sets up the later tests to
     use that command.
 
     """
     assert MyTestCommand("test_command")
+    assert MyFailingCommand("failing_command")
 
 
 def run_test_case(argv):
@@ -91,3 +106,36 @@ def test_unregistered_command():
     assert out == []
     assert errs != []
     assert errs[0] == "%s: command not found" % argv[0]
+
+
+def test_exit_status():
+    """Test that a non-zero exit status is reported among the errors.
+
+    """
+    executor = shell.CommandExecutor(timeout=10.0)
+    cmd = executor.run(["failing_command", "3"])
+    assert cmd.returncode == 3
+    assert not cmd.timed_out
+    assert list(cmd.errors()) == ["failing", "failing_command: exited with status 3"]
+    cmd = executor.run(["test_command"])
+    assert cmd.returncode == 0
+    assert list(cmd.errors()) == []
+
+
+def test_timeout():
+    """Test that a hung command is reported as timed out, with the
+    timeout it ran into.
+
+    """
+    executor = shell.CommandExecutor(timeout=10.0)
+    cmds = executor.run_many([["failing_command", "hang"], ["failing_command", "0"]], 0.5)
+    assert cmds[0].timed_out
+    assert cmds[0].returncode is None
+    assert list(cmds[0].errors()) == ["failing_command: timed out after 0.5 seconds"]
+    assert list(cmds[1].errors()) == ["failing"]
+    loop = asyncio.new_event_loop()
+    try:
+        cmd = loop.run_until_complete(shell.async_shell(["failing_command", "hang"], 2.0))
+    finally:
+        loop.close()
+    assert list(cmd.errors()) == ["failing_command: timed out after 2.0 seconds"]
@@ -0,0 +1,205 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the asyncio engine for the Compute Rolling Upgrade Agent,
+running the compute upgrade scenarios against the asyncio engine.
+
+"""
+import asyncio
+from queue import Queue
+import threading
+import time
+import pytest
+from crus.app import APP
+from crus.models.upgrade_session import ComputeUpgradeProgress, STARTING, QUIESCED
+from crus.controllers.upgrade_agent import async_engine as engine_module
+from crus.controllers.upgrade_agent.async_engine import AsyncEngine
+from crus.controllers.upgrade_agent.upgrade_agent import start_watching
+from crus.controllers.upgrade_agent.coalesce import CoalescingQueue
+from crus.controllers.upgrade_agent.pending import PendingScheduler
+from crus.controllers.upgrade_agent.wlm.wlm import WLMHandler
+from tests.controllers import test_compute_upgrade as scenarios
+
+# The compute upgrade scenarios from test_compute_upgrade.py
+SCENARIOS = [
+    "test_simple_upgrade",
+    "test_simple_upgrade_with_learn",
+    "test_upgrade_half_fail",
+    "test_upgrade_half_fail_some_busy",
+    "test_upgrade_all_boot_sessions_fail",
+    "test_delete_before_booting",
+    "test_delete_before_booting_second_step",
+    "test_delete_after_second_step",
+    "test_delete_after_booting",
+    "test_upgrade_non_empty_failed_group",
+    "test_upgrade_non_empty_upgrading_group",
+]
+
+
+@pytest.fixture
+def async_engine(monkeypatch):
+    """Replace process_upgrade() in the compute upgrade scenarios with a
+    version that runs each event through the asyncio engine.
+
+    """
+    loop = asyncio.new_event_loop()
+
+    def async_process_upgrade(queue, pending):
+        """Drop in for process_upgrade() that uses the asyncio engine.
+
+        """
+        engine = AsyncEngine(pending, loop)
+        loop.run_until_complete(engine.dispatch(queue))
+        loop.run_until_complete(engine.wait_idle())
+
+    monkeypatch.setattr(scenarios, "process_upgrade", async_process_upgrade)
+    yield loop
+    loop.close()
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_scenario(async_engine, scenario):  # pylint: disable=unused-argument,redefined-outer-name
+    """Run each of the compute upgrade scenarios, unchanged, on the
+    asyncio engine.
+
+    """
+    getattr(scenarios, scenario)()
+
+
+def test_delete_while_pending(async_engine, monkeypatch):  # pylint: disable=unused-argument,redefined-outer-name
+    """Run the delete while pending scenario on the asyncio engine.
+
+    """
+    scenarios.test_delete_while_pending(monkeypatch)
+
+
+def test_stages_chain(async_engine, monkeypatch):  # pylint: disable=unused-argument,redefined-outer-name
+    """Test that, with direct dispatch, the pass that starts a session on
+    the asyncio engine runs the following stages in the same pass, as
+    the blocking engine does.
+
+    """
+    monkeypatch.setitem(APP.config, 'AGENT_DIRECT_DISPATCH', 8)
+    stages = []
+    run_stage_async = engine_module.run_stage_async
+
+    async def recording_run_stage(upgrade_session, upgrade_progress):
+        stages.append(upgrade_progress.stage)
+        return await run_stage_async(upgrade_session, upgrade_progress)
+
+    monkeypatch.setattr(engine_module, "run_stage_async", recording_run_stage)
+    queue, pending = start_watching()
+    xnames, _ = scenarios.setup_nodes([nid + 1 for nid in range(0, 6)], [])
+    upgrade_id = scenarios.initiate_upgrade(xnames)
+    timeout = time.time() + 60
+    while True:
+        progress = ComputeUpgradeProgress.get(upgrade_id)
+        if progress is not None and progress.stage != STARTING:
+            break
+        assert time.time() < timeout
+        del stages[:]
+        scenarios.process_upgrade(queue, pending)
+    # The pass that left STARTING went on to run (at least) QUIESCING
+    assert stages[0] == STARTING
+    assert len(stages) > 1
+    assert progress.stage != QUIESCED
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending)
+    scenarios.verify_failed_nodes(upgrade_id, [])
+    scenarios.delete_upgrade(upgrade_id, queue, pending)
+
+
+def test_dispatch_wakes():
+    """Test that scheduling a poll ahead of the dispatcher's timeout ends
+    its wait for events.
+
+    """
+    pending = PendingScheduler()
+    pending.schedule("a", time.time() + 100.0)
+    queue = CoalescingQueue(Queue(), pending)
+    queue.start()
+    loop = asyncio.new_event_loop()
+    timer = threading.Timer(0.05, pending.schedule, args=("b", time.time() + 50.0))
+    try:
+        engine = AsyncEngine(pending, loop)
+        started = time.time()
+        timer.start()
+        loop.run_until_complete(engine.dispatch(queue))
+        assert time.time() - started < 10.0
+        assert not engine.tasks
+    finally:
+        timer.join()
+        loop.close()
+
+
+class FakeHandler(WLMHandler):
+    """A WLM handler that only provides the blocking operations, to
+    exercise the default coroutine versions.
+
+    """
+    calls = []
+
+    @staticmethod
+    def quiesce(xname):
+        FakeHandler.calls.append(("quiesce", xname))
+
+    @staticmethod
+    def is_ready(xname):
+        FakeHandler.calls.append(("is_ready", xname))
+        return True
+
+    @staticmethod
+    def is_quiet(xname):
+        FakeHandler.calls.append(("is_quiet", xname))
+        return False
+
+    @staticmethod
+    def resume(xname):
+        FakeHandler.calls.append(("resume", xname))
+
+    @staticmethod
+    def fail(xname, reason):
+        FakeHandler.calls.append(("fail", xname))
+
+    @staticmethod
+    def states(xnames):
+        FakeHandler.calls.append(("states", list(xnames)))
+        return {xname: "IDLE" for xname in xnames}
+
+
+def test_default_async_operations():
+    """Test that the default coroutine versions of the batched WLM
+    updates run the blocking versions.
+
+    """
+    async def run_all():
+        await FakeHandler.async_quiesce_many(["x1", "x2"])
+        await FakeHandler.async_resume_many(["x1"])
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run_all())
+    finally:
+        loop.close()
+    assert FakeHandler.calls == [
+        ("quiesce", "x1"), ("quiesce", "x2"), ("resume", "x1")
+    ]
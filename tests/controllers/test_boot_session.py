@@ -73,6 +73,35 @@ def test_successful_boot_session():
     assert boot_session.success() is True
 
 
+def test_running_check_not_written(monkeypatch):
+    """Tests that checking a boot session whose job is still running does
+    not rewrite its progress in ETCD, and that the check that finds the
+    job finished does.
+
+    """
+    upgrade_id = str(uuid.uuid4())
+    boot_session = BootSession(upgrade_id)
+    boot_session.boot(str(uuid.uuid4()), random_label())  # initiate boot
+
+    writes = []
+    real_put = BootSessionProgress.put
+
+    def counting_put(progress):
+        """Record the booting flag of each write and make it.
+
+        """
+        writes.append(progress.booting)
+        return real_put(progress)
+
+    monkeypatch.setattr(BootSessionProgress, "put", counting_put)
+    assert boot_session.booting() is True
+    assert boot_session.booting() is True
+    assert writes == []
+    assert boot_session.booting() is False
+    assert writes == [False]
+    assert BootSessionProgress.get(upgrade_id).success is True
+
+
 def test_failed_boot_session():
     """Tests a successful boot session
 
@@ -25,8 +25,12 @@
 testing of the Compute Rolling Upgrade Agent.
 
 """
+import json
 import re
+import pytest
 from crus.controllers.upgrade_agent.bss_hosts import BSSHostTable
+from crus.controllers.upgrade_agent.bss_hosts.bss_hosts import BSSHost
+from crus.controllers.upgrade_agent.bss_hosts.json_stream import iter_json_array
 from crus.controllers.mocking.bss import BSSNodeTable
 
 # some useful regular expressions...
@@ -49,3 +53,52 @@ def test_bss_hosts():
         assert isinstance(host_table.get_state(xname), str)
         assert isinstance(host_table.get_flag(xname), str)
         assert isinstance(host_table.get_enabled(xname), bool)
+
+
+def test_bss_hosts_role():
+    """Test that a host table for a given role only holds hosts with
+    that role.
+
+    """
+    host_table = BSSHostTable(role="Compute")
+    xnames = host_table.get_all_xnames()
+    assert len(xnames) == BSSNodeTable.node_count()
+    for xname in xnames:
+        assert host_table.get_role(xname) == "Compute"
+    assert BSSHostTable(role="Application").get_all_xnames() == []
+
+
+def test_bss_host_defaults():
+    """Test that a host missing its optional fields gets defaults for
+    them.
+
+    """
+    host = BSSHost({"ID": "x0c0s0b0n0", "NID": 1, "Role": "Compute"})
+    assert host.nid == 1
+    assert host.role == "Compute"
+    assert host.state == "Unknown"
+    assert host.flag == "OK"
+    assert host.enabled
+
+
+def test_iter_json_array():
+    """Test incremental parsing of a JSON array split into chunks of
+    every size.
+
+    """
+    items = [{"ID": "x0c0s0b0n0", "NID": 1, "MAC": ["a4:bf", "01:2c"]},
+             12345, "a string, with ]", [], None, -1.5e3, {}]
+    text = " %s\n" % json.dumps(items)
+    for size in range(1, len(text) + 1):
+        chunks = [text[start:start + size] for start in range(0, len(text), size)]
+        assert list(iter_json_array(chunks)) == items
+    assert list(iter_json_array(["[", " ]"])) == []
+
+
+def test_iter_json_array_bad():
+    """Test that malformed JSON arrays are reported.
+
+    """
+    for text in ["", "{}", "[1, 2", "[1 2]", "[1,]", "[1] 2", "[{]"]:
+        with pytest.raises(ValueError):
+            list(iter_json_array([text]))
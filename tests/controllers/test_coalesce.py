@@ -0,0 +1,121 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of watch event coalescing for the Compute Rolling Upgrade
+Agent.
+
+"""
+from queue import Queue, Empty
+import threading
+import time
+import pytest
+from crus.controllers.upgrade_agent.coalesce import CoalescingQueue
+from crus.controllers.upgrade_agent.pending import PendingScheduler
+
+
+class FakeSession:  # pylint: disable=too-few-public-methods
+    """Stand-in for an upgrade session watch event.
+
+    """
+    def __init__(self, upgrade_id, serial, state="UPDATING"):
+        self.upgrade_id = upgrade_id
+        self.serial = serial
+        self.state = state
+
+
+def test_burst_collapses():
+    """Test that a burst of events for a session yields only the latest
+    one and that sessions come out in order of their first event.
+
+    """
+    source = Queue()
+    queue = CoalescingQueue(source, PendingScheduler())
+    for serial, upgrade_id in enumerate(["a", "b", "a", "a", "c", "b"]):
+        source.put(FakeSession(upgrade_id, serial))
+    events = [queue.get(timeout=0) for _ in range(3)]
+    assert [(event.upgrade_id, event.serial) for event in events] == [
+        ("a", 3), ("b", 5), ("c", 4)
+    ]
+    assert queue.received == 6
+    assert queue.coalesced == 3
+    with pytest.raises(Empty):
+        queue.get(timeout=0.01)
+
+
+def test_pending_dropped():
+    """Test that events for pending sessions are dropped.
+
+    """
+    source = Queue()
+    pending = PendingScheduler()
+    pending.schedule("a", 1000.0)
+    queue = CoalescingQueue(source, pending)
+    source.put(FakeSession("a", 0))
+    with pytest.raises(Empty):
+        queue.get(timeout=0.01)
+    source.put(FakeSession("a", 1))
+    source.put(FakeSession("b", 2))
+    assert queue.get(timeout=0).upgrade_id == "b"
+    assert queue.dropped == 2
+    assert len(queue) == 0  # pylint: disable=len-as-condition
+
+
+def test_new_state_passes():
+    """Test that an event showing a pending session in a new state (a
+    delete) is handed out and cancels the session's poll.
+
+    """
+    source = Queue()
+    pending = PendingScheduler()
+    pending.schedule("a", time.time() + 1000.0, "UPDATING")
+    queue = CoalescingQueue(source, pending)
+    source.put(FakeSession("a", 0))
+    with pytest.raises(Empty):
+        queue.get(timeout=0.01)
+    source.put(FakeSession("a", 1, "DELETING"))
+    event = queue.get(timeout=0)
+    assert (event.upgrade_id, event.state) == ("a", "DELETING")
+    assert not pending.is_pending("a")
+
+
+def test_wake():
+    """Test that scheduling an earlier poll wakes up a waiting get() and
+    that forwarded events still come out.
+
+    """
+    source = Queue()
+    pending = PendingScheduler()
+    queue = CoalescingQueue(source, pending)
+    queue.start()
+    queue.start()
+    timer = threading.Timer(0.05, pending.schedule, args=("a", time.time()))
+    timer.start()
+    started = time.time()
+    with pytest.raises(Empty):
+        queue.get(timeout=10.0)
+    assert time.time() - started < 5.0
+    timer.join()
+    source.put(FakeSession("b", 0))
+    assert queue.get(timeout=10.0).upgrade_id == "b"
+    with pytest.raises(Empty):
+        queue.get(timeout=0.01)
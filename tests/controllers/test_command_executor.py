@@ -0,0 +1,83 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the bounded WLM command executor
+
+"""
+import time
+from crus.controllers.upgrade_agent.wlm.command_executor import CommandExecutor
+
+
+def test_run_output_and_status():
+    """Test that a command's output is reported and that a non-zero exit
+    status is reported as an error.
+
+    """
+    executor = CommandExecutor(workers=2, timeout=10.0)
+    result = executor.run(["sh", "-c", "echo hello"])
+    assert list(result.output()) == ["hello"]
+    assert list(result.errors()) == []
+    result = executor.run(["sh", "-c", "exit 3"])
+    assert result.returncode == 3
+    assert list(result.errors()) == ["sh: exited with status 3"]
+    result = executor.run(["no-such-command-for-crus"])
+    assert result.returncode == 127
+    assert list(result.errors()) != []
+
+
+def test_run_timeout():
+    """Test that a command running past its timeout is killed and reported
+    as an error.
+
+    """
+    executor = CommandExecutor(workers=2, timeout=10.0)
+    start = time.monotonic()
+    result = executor.run(["sleep", "10"], timeout=0.2)
+    assert time.monotonic() - start < 5.0
+    assert result.timed_out
+    assert list(result.errors()) == ["sleep: timed out after 0.2 seconds"]
+
+
+def test_run_many_parallel():
+    """Test that independent commands run in parallel and that their
+    results come back in order.
+
+    """
+    executor = CommandExecutor(workers=4, timeout=10.0)
+    start = time.monotonic()
+    results = executor.run_many([["sh", "-c", "sleep 0.5; echo %d" % count] for count in range(4)])
+    assert time.monotonic() - start < 1.5
+    assert [list(result.output()) for result in results] == [["0"], ["1"], ["2"], ["3"]]
+    assert executor.run_many([]) == []
+
+
+def test_run_many_deadline():
+    """Test that commands share one deadline, including commands that
+    are still waiting for a worker when it passes.
+
+    """
+    executor = CommandExecutor(workers=1, timeout=10.0)
+    start = time.monotonic()
+    results = executor.run_many([["sleep", "10"]] * 3, timeout=0.5)
+    assert time.monotonic() - start < 5.0
+    assert all(result.timed_out for result in results)
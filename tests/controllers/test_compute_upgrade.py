@@ -28,6 +28,7 @@ Tests for the Compute Upgrade Agent
 import time
 import uuid
 from etcd3_model import READY
+from crus.app import APP
 from crus.controllers.upgrade_agent.upgrade_agent import (
     start_watching,
     process_upgrade
@@ -43,6 +44,7 @@ from crus.controllers.upgrade_agent.node_table import NodeTable
 from crus.models.upgrade_session import (
     UpgradeSession,
     ComputeUpgradeProgress,
+    QUIESCING,
     QUIESCED,
     BOOTING,
 )
@@ -59,6 +61,11 @@ def test_import():
     help(BSSNodeTable)
 
 
+# Extra upgrade session parameters applied by initiate_upgrade(), so
+# that the scenarios here can be re-run in other upgrade modes.
+SESSION_OPTIONS = {}
+
+
 def setup_nodes(success_nids, fail_nids):
     """ Get the xnames to be upgraded and set the ones that should fail to
     simulate failure.
@@ -96,6 +103,7 @@ def initiate_upgrade(xnames):
         'upgrade_step_size': 3,
         'upgrade_template_id': None,
     }
+    params.update(SESSION_OPTIONS)
     # Create the starting node group with all of the nodes to be upgraded
     ng_data = {
         'label': params['starting_label'],
@@ -504,6 +512,33 @@ def test_delete_after_booting():  # pylint: disable=invalid-name
     delete_upgrade(upgrade_id, queue, pending)
 
 
+def test_delete_while_pending(monkeypatch):
+    """Test that deleting a session that is waiting on a long poll in
+    QUIESCING is handled right away instead of at the next poll.
+
+    """
+    monkeypatch.setitem(APP.config, 'POLL_QUIESCING', (30.0, 30.0))
+    # Start the watcher if it is not already started...
+    queue, pending = start_watching()
+
+    success_nids = [nid + 1 for nid in range(0, 6)]
+    success_xnames, _ = setup_nodes(success_nids, [])
+    # Keep the nodes busy so the session waits in QUIESCING
+    SlurmNodeTable.add_job([NodeTable.get_nidname(xname) for xname in success_xnames], None)
+    try:
+        upgrade_id = initiate_upgrade(success_xnames)
+        wait_for_upgrade(upgrade_id, queue, pending, stage=QUIESCING)
+        timeout = time.time() + 10
+        while upgrade_id not in pending:
+            assert time.time() < timeout
+            process_upgrade(queue, pending)
+        started = time.time()
+        delete_upgrade(upgrade_id, queue, pending)
+        assert time.time() - started < 10
+    finally:
+        SlurmNodeTable.clear_jobs()
+
+
 def test_upgrade_non_empty_failed_group():  # pylint: disable=invalid-name
     """Test that an upgrade that starts with a non-empty 'failed' node
     group runs correctly to completion.
@@ -66,3 +66,32 @@ def test_unknown_option():
     assert retval != 0
     retval = driver(["-z"])
     assert retval != 0
+
+
+def test_bad_workers_option():
+    """Test that a non-numeric or non-positive '--workers' value fails and
+    returns an unsuccessful result code (!= 0).
+
+    """
+    retval = driver(["--workers=wobble"])
+    assert retval != 0
+    retval = driver(["--workers=0"])
+    assert retval != 0
+
+
+def test_bad_engine_option():
+    """Test that an unknown '--engine' value fails and returns an
+    unsuccessful result code (!= 0).
+
+    """
+    retval = driver(["--engine=wobble"])
+    assert retval != 0
+
+
+def test_workers_with_async():
+    """Test that '--workers' with the 'async' engine fails and returns an
+    unsuccessful result code (!= 0).
+
+    """
+    retval = driver(["--engine=async", "--workers=4"])
+    assert retval != 0
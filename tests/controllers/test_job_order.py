@@ -0,0 +1,119 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of ordering the nodes of an upgrade by when their jobs are
+expected to end.
+
+"""
+import time
+from crus.models.upgrade_plan import UpgradePlan
+from crus.models.upgrade_session import QUIESCING
+from crus.controllers.upgrade_agent.upgrade_agent import start_watching
+from crus.controllers.upgrade_agent.job_order import order_by_job_end
+from crus.controllers.upgrade_agent.node_table import NodeTable
+from crus.controllers.upgrade_agent.wlm import get_wlm_handler
+from crus.controllers.upgrade_agent.wlm.slurm_support import (
+    parse_squeue_job_ends,
+    UNKNOWN_JOB_END
+)
+from crus.controllers.mocking.slurm.slurm_state import SlurmNodeTable
+from tests.controllers import test_compute_upgrade as scenarios
+
+
+def test_order_by_job_end():
+    """Test that idle nodes come first in their listed order, followed by
+    busy nodes in job end order.
+
+    """
+    xnames = ["x%d" % i for i in range(0, 6)]
+    job_ends = {"x0": 300.0, "x2": 100.0, "x3": UNKNOWN_JOB_END, "x5": 100.0}
+    assert order_by_job_end(xnames, job_ends) == ["x1", "x4", "x2", "x5", "x0", "x3"]
+    assert order_by_job_end(xnames, {}) == xnames
+
+
+def test_parse_squeue_job_ends():
+    """Test that the latest job end on each node is found in squeue
+    output.
+
+    """
+    lines = [
+        "2022-01-10T04:00:00 nid[000001-000002]",
+        "2022-01-10T05:00:00 nid000002",
+        "Unknown nid000003",
+        "",
+    ]
+    ends = parse_squeue_job_ends(lines)
+    assert sorted(ends) == ["nid000001", "nid000002", "nid000003"]
+    assert ends["nid000002"] - ends["nid000001"] == 3600
+    assert ends["nid000003"] == UNKNOWN_JOB_END
+
+
+def test_wlm_job_ends():
+    """Test that both Slurm handlers report the jobs running on the mock
+    Slurm nodes and that a node does not finish quiescing until its
+    job ends.
+
+    """
+    xnames = [NodeTable.get_xname(nid) for nid in range(30, 34)]
+    nidnames = [NodeTable.get_nidname(xname) for xname in xnames]
+    now = time.time()
+    SlurmNodeTable.add_job(nidnames[0:2], now + 3600)
+    SlurmNodeTable.add_job(nidnames[1:2], now + 7200)
+    SlurmNodeTable.add_job(nidnames[2:3], None)
+    try:
+        for wlm_type in ["slurm", "slurm-rest"]:
+            job_ends = get_wlm_handler(wlm_type).job_ends(xnames)
+            assert sorted(job_ends) == sorted(xnames[0:3])
+            assert job_ends[xnames[1]] - job_ends[xnames[0]] >= 3599
+            assert job_ends[xnames[2]] == UNKNOWN_JOB_END
+        wlm = get_wlm_handler("slurm")
+        wlm.quiesce_many(xnames)
+        quiet = wlm.are_quiet(xnames)
+        assert quiet == {xname: xname == xnames[3] for xname in xnames}
+    finally:
+        SlurmNodeTable.clear_jobs()
+    assert all(wlm.are_quiet(xnames).values())
+    wlm.resume_many(xnames)
+
+
+def test_job_end_plan(monkeypatch):
+    """Test that an upgrade in 'job_end' node order plans busy nodes last
+    in the order their jobs end and completes once the jobs end.
+
+    """
+    monkeypatch.setitem(scenarios.SESSION_OPTIONS, 'node_order', "job_end")
+    queue, pending = start_watching()
+    xnames, _ = scenarios.setup_nodes([nid + 1 for nid in range(0, 7)], [])
+    now = time.time()
+    SlurmNodeTable.add_job([NodeTable.get_nidname(xnames[0])], now + 2)
+    SlurmNodeTable.add_job([NodeTable.get_nidname(xnames[1])], now + 1)
+    try:
+        upgrade_id = scenarios.initiate_upgrade(xnames)
+        scenarios.wait_for_upgrade(upgrade_id, queue, pending, stage=QUIESCING, step=0)
+        plan = UpgradePlan.get(upgrade_id)
+        assert plan.get_nodes() == xnames[2:] + [xnames[1], xnames[0]]
+        scenarios.wait_for_upgrade(upgrade_id, queue, pending)
+        scenarios.verify_failed_nodes(upgrade_id, [])
+        scenarios.delete_upgrade(upgrade_id, queue, pending)
+    finally:
+        SlurmNodeTable.clear_jobs()
@@ -0,0 +1,101 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the compact NodeSet type
+
+"""
+import pytest
+from crus.controllers.upgrade_agent.node_set import NodeSet, parse_hostlist
+from crus.controllers.upgrade_agent.node_table import NodeTable
+from crus.controllers.upgrade_agent.errors import ComputeUpgradeError
+
+
+def test_ranges_merge():
+    """Test that overlapping and adjacent NIDs collapse into ranges.
+
+    """
+    nodes = NodeSet.from_nids([7, 1, 2, 3, 3, 10, 8])
+    assert nodes.ranges == [(1, 3), (7, 8), (10, 10)]
+    assert len(nodes) == 6
+    assert list(nodes) == [1, 2, 3, 7, 8, 10]
+    assert 2 in nodes and 8 in nodes and 10 in nodes
+    assert 0 not in nodes and 4 not in nodes and 11 not in nodes
+    assert not NodeSet()
+    assert not list(NodeSet())
+
+
+def test_set_operations():
+    """Test union, difference and intersection against python sets.
+
+    """
+    left = {1, 2, 3, 4, 10, 11, 12, 20}
+    right = {3, 4, 5, 11, 30}
+    left_set = NodeSet.from_nids(left)
+    right_set = NodeSet.from_nids(right)
+    assert set(left_set | right_set) == left | right
+    assert set(left_set - right_set) == left - right
+    assert set(right_set - left_set) == right - left
+    assert set(left_set & right_set) == left & right
+    assert left_set - left_set == NodeSet()
+
+
+def test_hostlist_round_trip():
+    """Test formatting and parsing slurm hostlists and the ETCD encoding.
+
+    """
+    nodes = NodeSet.from_nids([1, 2, 3, 7, 10])
+    assert nodes.hostlist() == "nid[000001-000003,000007,000010]"
+    assert str(NodeSet.from_nids([5])) == "nid000005"
+    assert NodeSet().hostlist() == ""
+    assert NodeSet.from_hostlist(nodes.hostlist()) == nodes
+    assert NodeSet.from_hostlist("nid[000001-000002],nid000003") == NodeSet.from_nids([1, 2, 3])
+    assert NodeSet.decode(nodes.encode()) == nodes
+    assert nodes.encode() == [[1, 3], [7, 7], [10, 10]]
+    with pytest.raises(ComputeUpgradeError):
+        NodeSet.from_hostlist("login[01-02]")
+    with pytest.raises(ComputeUpgradeError):
+        NodeSet.from_hostlist("nid000001,login01")
+
+
+def test_parse_hostlist():
+    """Test parsing hostlists with and without ranges into prefixes and
+    digits.
+
+    """
+    assert parse_hostlist("nid[000001-000003,000007],login01,b") == [
+        ("nid", "000001", "000003"),
+        ("nid", "000007", "000007"),
+        ("login", "01", "01"),
+        ("b", "", ""),
+    ]
+    assert parse_hostlist("") == []
+
+
+def test_xnames_round_trip():
+    """Test making a NodeSet from XNAMEs and getting them back.
+
+    """
+    xnames = [NodeTable.get_xname(nid) for nid in [4, 5, 6, 9]]
+    nodes = NodeSet.from_xnames(xnames)
+    assert nodes.ranges == [(4, 6), (9, 9)]
+    assert sorted(nodes.xnames()) == sorted(xnames)
@@ -26,8 +26,14 @@ testing of the Compute Rolling Upgrade Agent.
 
 """
 import re
+import pytest
+from crus.app import APP
+from crus.controllers.upgrade_agent.errors import ComputeUpgradeError
 from crus.controllers.upgrade_agent.node_table import NodeTable
+from crus.controllers.upgrade_agent.node_table.node_table import SNAPSHOT_ID
+from crus.controllers.upgrade_agent.node_table.topology import Topology, parse_xname
 from crus.controllers.mocking.bss import BSSNodeTable
+from crus.models.node_table_snapshot import NodeTableSnapshot
 
 # some useful regular expressions...
 XNAME_PATTERN = r"^x[0-9]+c[0-9]+s[0-9]+b[0-9]+n[0-9]+$"
@@ -57,3 +63,164 @@ def test_get_nid():
         assert NodeTable.get_xname(nid) == xname
         nidname = NodeTable.get_nidname(xname)
         assert NodeTable.nidname_to_nid(nidname) == nid
+
+
+def test_refresh_on_miss(monkeypatch):
+    """Test that looking up a node added to BSS after the NodeTable was
+    loaded reloads the table and finds the node, and that a node that
+    is still missing raises KeyError.
+
+    """
+    monkeypatch.setitem(APP.config, 'NODE_TABLE_MISS_INTERVAL', 0.0)
+    xnames = NodeTable.get_all_xnames()
+    nid = max(NodeTable.get_nid(xname) for xname in xnames) + 1
+    xname = "x9999c0s0b0n0"
+    BSSNodeTable.add_node(xname, nid)
+    try:
+        assert NodeTable.get_nid(xname) == nid
+        assert NodeTable.get_xname(nid) == xname
+        assert NodeTable.get_nidname(xname) == "nid%6.6d" % nid
+        assert len(NodeTable.get_all_xnames()) == len(xnames) + 1
+    finally:
+        BSSNodeTable.remove_node(xname)
+        NodeTable.refresh()
+    with pytest.raises(KeyError):
+        NodeTable.get_nid(xname)
+    with pytest.raises(KeyError):
+        NodeTable.get_xname(nid)
+    assert NodeTable.get_all_xnames() == xnames
+
+
+def test_refresh_shares_names():
+    """Test that a reload of an unchanged node list swaps in a new map
+    that reuses the name strings of the old one.
+
+    """
+    before = NodeTable.get_all_xnames()
+    nidnames = [NodeTable.get_nidname(xname) for xname in before]
+    NodeTable.refresh()
+    after = NodeTable.get_all_xnames()
+    assert after == before
+    for old, new in zip(before, after):
+        assert old is new
+    for old, xname in zip(nidnames, after):
+        assert NodeTable.get_nidname(xname) is old
+
+
+@pytest.fixture
+def node_table_snapshot():
+    """Turn the node table snapshot on for one test, which the unit test
+    configuration leaves off, and remove the saved snapshot after the
+    test so that no other test sees it.  This does not use monkeypatch
+    because the tests call monkeypatch.undo() part way through.
+
+    """
+    enabled = APP.config['NODE_TABLE_SNAPSHOT']
+    APP.config['NODE_TABLE_SNAPSHOT'] = True
+    yield
+    APP.config['NODE_TABLE_SNAPSHOT'] = enabled
+    snapshot = NodeTableSnapshot.get(SNAPSHOT_ID)
+    if snapshot is not None:
+        snapshot.remove()
+
+
+def _bss_down():
+    """Stand in for NodeTable._learn_nodes() when BSS is unavailable.
+
+    """
+    raise ComputeUpgradeError("BSS is unavailable")
+
+
+def test_snapshot_start(monkeypatch, node_table_snapshot):  # pylint: disable=unused-argument,redefined-outer-name
+    """Test that the NodeTable starts from its saved snapshot without
+    BSS and picks up changes from BSS when it reconciles.
+
+    """
+    monkeypatch.setitem(APP.config, 'NODE_TABLE_MISS_INTERVAL', 0.0)
+    xnames = NodeTable.get_all_xnames()
+    NodeTable.save_snapshot()
+    # Start afresh with BSS down and no background reload.
+    monkeypatch.setattr(NodeTable, '_map', None)
+    monkeypatch.setattr(NodeTable, '_refreshing', True)
+    monkeypatch.setattr(NodeTable, '_learn_nodes', staticmethod(_bss_down))
+    assert NodeTable.get_all_xnames() == xnames
+    for xname in xnames:
+        nid = NodeTable.get_nid(xname)
+        assert NodeTable.get_xname(nid) == xname
+        assert NodeTable.nidname_to_nid(NodeTable.get_nidname(xname)) == nid
+    with pytest.raises(KeyError):
+        NodeTable.get_nid("x9999c0s0b0n0")
+    # BSS comes back with a new node.
+    monkeypatch.undo()
+    nid = NodeTable.get_nid(xnames[-1]) + 1
+    BSSNodeTable.add_node("x9999c0s0b0n0", nid)
+    try:
+        NodeTable.refresh()
+        assert NodeTable.get_xname(nid) == "x9999c0s0b0n0"
+        assert NodeTableSnapshot.get(SNAPSHOT_ID).get_nodes()["x9999c0s0b0n0"] == nid
+    finally:
+        BSSNodeTable.remove_node("x9999c0s0b0n0")
+        NodeTable.refresh()
+    assert len(NodeTableSnapshot.get(SNAPSHOT_ID).get_nodes()) == len(xnames)
+
+
+def test_snapshot_bad_version(monkeypatch, node_table_snapshot):  # pylint: disable=unused-argument,redefined-outer-name
+    """Test that a snapshot in an unknown encoding is ignored and the
+    node list is loaded from BSS instead.
+
+    """
+    xnames = NodeTable.get_all_xnames()
+    NodeTable.save_snapshot()
+    snapshot = NodeTableSnapshot.get(SNAPSHOT_ID)
+    snapshot.version = 0
+    snapshot.put()
+    monkeypatch.setattr(NodeTable, '_map', None)
+    assert NodeTable.get_all_xnames() == xnames
+    assert NodeTableSnapshot.get(SNAPSHOT_ID).get_nodes() == {
+        xname: NodeTable.get_nid(xname) for xname in xnames
+    }
+
+
+def test_topology():
+    """Test topology queries on the nodes in the NodeTable (the unit test
+    system has 16 cabinets of 4 chassis of 4 slots of 8 nodes).
+
+    """
+    assert NodeTable.get_topology("x1c2s3b0n4") == (1, 2, 3, 0, 4)
+    cabinets = NodeTable.count_by("cabinet")
+    assert cabinets == {(cabinet,): 128 for cabinet in range(16)}
+    assert len(NodeTable.count_by("chassis")) == 64
+    xnames = NodeTable.get_xnames_in(1, 2)
+    assert len(xnames) == 32
+    assert all(xname.startswith("x1c2s") for xname in xnames)
+    assert NodeTable.get_xnames_in(1, 2, 3, 0, 4) == ["x1c2s3b0n4"]
+    assert NodeTable.get_xnames_in(99) == []
+    groups = NodeTable.group_by(reversed(xnames), "slot")
+    assert sorted(groups) == [(1, 2, slot) for slot in range(4)]
+    for slot, members in groups.items():
+        assert members == ["x1c2s%db0n%d" % (slot[2], node) for node in range(7, -1, -1)]
+    assert NodeTable.count_by("slot", xnames) == {key: 8 for key in groups}
+    with pytest.raises(ValueError):
+        NodeTable.group_by(xnames, "rack")
+    with pytest.raises(ComputeUpgradeError, match="x9999c0s0b0n0"):
+        NodeTable.group_by(xnames + ["x9999c0s0b0n0"], "slot")
+    with pytest.raises(ComputeUpgradeError, match="x9999c0s0b0n0"):
+        NodeTable.count_by("slot", ["x9999c0s0b0n0"])
+    with pytest.raises(KeyError):
+        NodeTable.get_topology("x9999c0s0b0n0")
+
+
+def test_topology_not_nodes():
+    """Test that XNAMEs that are not node XNAMEs have no coordinates and
+    are grouped and counted under None.
+
+    """
+    assert parse_xname("x3000c0r15b0") is None
+    assert parse_xname("x3000c0s7b1n2") == (3000, 0, 7, 1, 2)
+    topology = Topology(["x3000c0s7b1n2", None, "x3000c0r15b0", "x3000c0s7b1n3"])
+    assert topology.coordinates(2) is None
+    assert topology.nids_in(3000, 0, 7) == [0, 3]
+    assert topology.nids_in(3000, 0, 7, 1, 3) == [3]
+    assert topology.nids_in(3000, 0, 6) == []
+    assert topology.group([0, 2, 3], "board") == {(3000, 0, 7, 1): [0, 3], None: [2]}
+    assert topology.count("cabinet") == {(3000,): 2, None: 1}
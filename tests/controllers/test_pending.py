@@ -0,0 +1,139 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the pending session scheduler used by the Compute Rolling
+Upgrade Agent.
+
+"""
+from crus.controllers.upgrade_agent.pending import PendingScheduler
+
+
+def test_empty():
+    """Test that a new scheduler has nothing pending and nothing due.
+
+    """
+    pending = PendingScheduler()
+    assert len(pending) == 0  # pylint: disable=len-as-condition
+    assert pending.next_due() is None
+    assert pending.pop_due(1000.0) == []
+    assert not pending.is_pending("a")
+
+
+def test_order():
+    """Test that sessions come out in due time order and only once they
+    are due.
+
+    """
+    pending = PendingScheduler()
+    pending.schedule("c", 30.0)
+    pending.schedule("a", 10.0)
+    pending.schedule("b", 20.0)
+    assert len(pending) == 3
+    assert "b" in pending
+    assert pending.next_due() == 10.0
+    assert pending.pop_due(5.0) == []
+    assert pending.pop_due(20.0) == ["a", "b"]
+    assert not pending.is_pending("a")
+    assert pending.is_pending("c")
+    assert pending.next_due() == 30.0
+    assert pending.pop_due(100.0) == ["c"]
+    assert pending.next_due() is None
+
+
+def test_duplicates_collapse():
+    """Test that scheduling the same session more than once keeps a single
+    entry with the earliest deadline.
+
+    """
+    pending = PendingScheduler()
+    assert pending.schedule("a", 20.0) == 20.0
+    assert pending.schedule("a", 30.0) == 20.0
+    assert pending.schedule("a", 10.0) == 10.0
+    assert len(pending) == 1
+    assert pending.next_due() == 10.0
+    assert pending.pop_due(100.0) == ["a"]
+    assert pending.pop_due(100.0) == []
+
+
+def test_cancel():
+    """Test that a cancelled session is no longer pending and does not
+    come out of the scheduler.
+
+    """
+    pending = PendingScheduler()
+    pending.schedule("a", 10.0)
+    pending.schedule("b", 20.0)
+    pending.cancel("a")
+    pending.cancel("not-there")
+    assert not pending.is_pending("a")
+    assert pending.next_due() == 20.0
+    pending.schedule("a", 10.0)
+    assert pending.pop_due(100.0) == ["a", "b"]
+
+
+def test_compaction():
+    """Test that repeatedly rescheduling a small number of sessions does
+    not grow the heap without bound.
+
+    """
+    pending = PendingScheduler()
+    for count in range(1000):
+        pending.schedule("a", 1000.0 - count)
+        pending.schedule("b", 2000.0 - count)
+    assert len(pending) == 2
+    assert len(pending.heap) <= 2 * len(pending) + 17
+    assert pending.pop_due(5000.0) == ["a", "b"]
+
+
+def test_listeners():
+    """Test that listeners are called only when the earliest due time
+    moves earlier.
+
+    """
+    pending = PendingScheduler()
+    calls = []
+    pending.add_listener(lambda: calls.append(pending.next_due()))
+    pending.schedule("a", 20.0)
+    pending.schedule("b", 30.0)
+    pending.schedule("a", 25.0)
+    assert calls == [20.0]
+    pending.schedule("b", 10.0)
+    assert calls == [20.0, 10.0]
+
+
+def test_holds():
+    """Test that events in the state a session was scheduled in are held
+    and that an event in a new state cancels the poll and the backoff.
+
+    """
+    pending = PendingScheduler()
+    assert not pending.holds("a", "UPDATING")
+    pending.schedule("a", 10.0)
+    assert pending.holds("a", "DELETING")
+    pending.backoff["b"] = ("QUIESCING", 5)
+    pending.schedule("b", 20.0, "UPDATING")
+    assert pending.holds("b", "UPDATING")
+    assert not pending.holds("b", "DELETING")
+    assert not pending.is_pending("b")
+    assert "b" not in pending.backoff
+    assert pending.pop_due(100.0) == ["a"]
@@ -0,0 +1,94 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the polling policies and the per-session backoff in the
+pending scheduler.
+
+"""
+import pytest
+from crus.app import APP
+from crus.controllers.upgrade_agent.poll_policy import (
+    PollPolicy,
+    get_poll_policy,
+    ERROR_POLICY
+)
+from crus.controllers.upgrade_agent.pending import PendingScheduler
+
+
+def test_backoff_and_cap():
+    """Test that intervals grow by the backoff factor up to the maximum.
+
+    """
+    policy = PollPolicy(1.0, 10.0, backoff=2.0)
+    assert [policy.interval(attempt) for attempt in range(6)] == [
+        1.0, 2.0, 4.0, 8.0, 10.0, 10.0
+    ]
+    # Very long waits don't overflow
+    assert policy.interval(100000) == 10.0
+
+
+def test_jitter():
+    """Test that jitter spreads the interval in both directions by at
+    most the jitter fraction.
+
+    """
+    policy = PollPolicy(10.0, 10.0, jitter=0.1)
+    assert policy.interval(0, rand=lambda: 0.0) == pytest.approx(9.0)
+    assert policy.interval(0, rand=lambda: 0.5) == pytest.approx(10.0)
+    assert policy.interval(0, rand=lambda: 1.0) == pytest.approx(11.0)
+
+
+def test_configured_policies():
+    """Test that stage policies come from the configuration and that
+    stages without a policy use the error policy.
+
+    """
+    initial, maximum = APP.config['POLL_QUIESCING']
+    policy = get_poll_policy("QUIESCING")
+    assert policy.initial == initial
+    assert policy.maximum == maximum
+    initial, maximum = APP.config['POLL_ERROR']
+    for stage in ["STARTING", ERROR_POLICY]:
+        policy = get_poll_policy(stage)
+        assert policy.initial == initial
+        assert policy.maximum == maximum
+
+
+def test_scheduler_backoff():
+    """Test that the scheduler backs off consecutive polls for the same
+    key and starts over on a new key or after a reset.
+
+    """
+    policy = PollPolicy(1.0, 100.0, backoff=2.0)
+    pending = PendingScheduler()
+
+    def poll(key):
+        due = pending.poll("a", key, policy, 0.0)
+        pending.pop_due(due)
+        return due
+
+    assert [poll("QUIESCING") for _ in range(4)] == [1.0, 2.0, 4.0, 8.0]
+    assert poll("BOOTING") == 1.0
+    assert poll("BOOTING") == 2.0
+    pending.reset("a")
+    assert poll("BOOTING") == 1.0
@@ -0,0 +1,218 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of sharing upgrade sessions among Compute Rolling Upgrade
+Agent replicas.
+
+"""
+from queue import Queue, Empty
+from types import SimpleNamespace
+import threading
+import time
+import uuid
+import pytest
+from crus.controllers.upgrade_agent.shard import HashRing, ShardMembership
+from crus.controllers.upgrade_agent.coalesce import CoalescingQueue
+from crus.controllers.upgrade_agent.pending import PendingScheduler
+
+KEYS = [str(uuid.UUID(int=index)) for index in range(1000)]
+
+
+def test_ring_balance_and_movement():
+    """Test that the hash ring shares keys out roughly evenly and that
+    removing a member only moves that member's keys.
+
+    """
+    ring = HashRing(["a", "b", "c", "d"])
+    owners = {key: ring.owner(key) for key in KEYS}
+    for member in ["a", "b", "c", "d"]:
+        share = list(owners.values()).count(member)
+        assert 100 < share < 400
+    smaller = HashRing(["a", "b", "c"])
+    for key, owner in owners.items():
+        if owner != "d":
+            assert smaller.owner(key) == owner
+    assert HashRing([]).owner(KEYS[0]) is None
+
+
+class FakeLease:
+    """Stand-in for an ETCD lease.
+
+    """
+    def __init__(self, etcd, ttl):
+        self.etcd = etcd
+        self.ttl = ttl
+        self.refreshes = 0
+
+    def refresh(self):
+        """Renew the lease, reporting a time to live of 0 once it has
+        expired.
+
+        """
+        self.refreshes += 1
+        ttl = self.ttl if self in self.etcd.leases else 0
+        return [SimpleNamespace(TTL=ttl)]
+
+    def revoke(self):
+        """Revoke the lease, removing its keys.
+
+        """
+        self.etcd.expire(self)
+
+
+class FakeEtcd:
+    """Stand-in for the parts of the ETCD client used for agent
+    registrations.
+
+    """
+    def __init__(self):
+        self.leases = []
+        self.keys = {}
+
+    def lease(self, ttl):
+        """Grant a lease with time to live 'ttl'.
+
+        """
+        lease = FakeLease(self, ttl)
+        self.leases.append(lease)
+        return lease
+
+    def put(self, key, value, lease=None):
+        """Store 'value' under 'key', attached to 'lease'.
+
+        """
+        self.keys[key] = (value.encode(), lease)
+
+    def get_prefix(self, prefix):
+        """Return (value, metadata) for each key starting with 'prefix'.
+
+        """
+        return [
+            (value, SimpleNamespace(key=key.encode()))
+            for key, (value, _) in sorted(self.keys.items())
+            if key.startswith(prefix)
+        ]
+
+    def expire(self, lease):
+        """Expire 'lease' the way ETCD does when its time to live runs
+        out, removing the keys attached to it.
+
+        """
+        self.leases.remove(lease)
+        self.keys = {
+            key: entry for key, entry in self.keys.items() if entry[1] is not lease
+        }
+
+
+def test_membership_and_expiry():
+    """Test that two agents split the sessions between them and that
+    when one agent's lease expires the other takes over.
+
+    """
+    etcd = FakeEtcd()
+    first = ShardMembership("test-agent-1", ttl=0.5, interval=1.0, etcd=etcd)
+    second = ShardMembership("test-agent-2", ttl=0.5, interval=1.0, etcd=etcd)
+    # Everything is owned before the first heartbeat
+    assert all(first.owns(key) for key in KEYS)
+    assert first.heartbeat()
+    assert first.lease.ttl == 1
+    assert second.heartbeat()
+    assert first.heartbeat()
+    assert not first.heartbeat()
+    assert first.lease.refreshes == 2
+    for key in KEYS:
+        assert first.owns(key) != second.owns(key)
+
+    # The second agent's lease runs out, the first agent owns
+    # everything.
+    etcd.expire(second.lease)
+    assert first.heartbeat()
+    assert all(first.owns(key) for key in KEYS)
+    # When the second agent finally renews, it finds its lease gone
+    # and registers again.
+    expired = second.lease
+    assert not second.heartbeat()
+    assert second.lease is not expired
+    assert first.heartbeat()
+    assert not all(first.owns(key) for key in KEYS)
+    second.resign()
+    assert first.heartbeat()
+    assert all(first.owns(key) for key in KEYS)
+
+
+def test_heartbeat_thread():
+    """Test that the heartbeat thread renews the lease and reports
+    membership changes.
+
+    """
+    etcd = FakeEtcd()
+    membership = ShardMembership("test-agent-1", ttl=1.0, interval=0.01, etcd=etcd)
+    changes = threading.Event()
+    membership.start(changes.set)
+    assert changes.wait(5.0)
+    lease = membership.lease
+    deadline = time.time() + 5.0
+    while lease.refreshes == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    membership.resign()
+    assert lease.refreshes > 0
+    assert membership.thread is None
+    assert not etcd.keys
+
+
+class FakeSession:  # pylint: disable=too-few-public-methods
+    """Stand-in for an upgrade session watch event.
+
+    """
+    def __init__(self, upgrade_id):
+        self.upgrade_id = upgrade_id
+
+
+class FakeMembership:  # pylint: disable=too-few-public-methods
+    """Membership that owns only the keys it is given.
+
+    """
+    def __init__(self, owned):
+        self.owned = owned
+
+    def owns(self, upgrade_id):
+        """Check whether 'upgrade_id' is one of the owned keys.
+
+        """
+        return upgrade_id in self.owned
+
+
+def test_foreign_sessions_dropped():
+    """Test that the coalescing queue drops other agents' sessions.
+
+    """
+    source = Queue()
+    queue = CoalescingQueue(source, PendingScheduler(), FakeMembership(["mine"]))
+    source.put(FakeSession("theirs"))
+    source.put(FakeSession("mine"))
+    assert queue.get(timeout=1.0).upgrade_id == "mine"
+    assert queue.foreign == 1
+    source.put(FakeSession("theirs"))
+    with pytest.raises(Empty):
+        queue.get(timeout=1.0)
+    assert queue.foreign == 2
@@ -0,0 +1,184 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the batched node operations of the Slurm WLM handler
+
+"""
+import asyncio
+from crus.app import APP
+from crus.controllers.upgrade_agent.wlm import slurm
+from crus.controllers.upgrade_agent.wlm.slurm_support import expand_hostlist
+from crus.controllers.upgrade_agent.wlm.slurm import SlurmHandler
+from crus.controllers.upgrade_agent.node_table import NodeTable
+
+
+def count_commands(monkeypatch):
+    """Count the shell commands run by the Slurm handler.  Returns a list
+    that collects the commands as they run.
+
+    """
+    commands = []
+    real_run = slurm.EXECUTOR.run
+
+    def counting_run(command, timeout=None):
+        """Record 'command' and run it.
+
+        """
+        commands.append(list(command))
+        return real_run(command, timeout)
+
+    monkeypatch.setattr(slurm.EXECUTOR, "run", counting_run)
+    return commands
+
+
+def test_states_in_one_command(monkeypatch):
+    """Test that checking several nodes runs one 'scontrol show node' and
+    reports the state of each node.
+
+    """
+    xnames = [NodeTable.get_xname(nid) for nid in range(1, 5)]
+    commands = count_commands(monkeypatch)
+    states = SlurmHandler.states(xnames)
+    assert len(commands) == 1
+    assert sorted(states) == sorted(xnames)
+    for state in states.values():
+        assert "IDLE" in state
+    assert SlurmHandler.states([]) == {}
+    assert len(commands) == 1
+
+
+def test_are_quiet_and_ready(monkeypatch):
+    """Test the batched quiet and ready checks against the single node
+    checks.
+
+    """
+    xnames = [NodeTable.get_xname(nid) for nid in range(5, 9)]
+    SlurmHandler.quiesce(xnames[0])
+    commands = count_commands(monkeypatch)
+    quiet = SlurmHandler.are_quiet(xnames)
+    assert quiet == {xname: SlurmHandler.is_quiet(xname) for xname in xnames}
+    assert quiet[xnames[0]]
+    assert not any(quiet[xname] for xname in xnames[1:])
+    SlurmHandler.resume(xnames[0])
+    ready = SlurmHandler.are_ready(xnames)
+    assert all(ready.values())
+    assert len([command for command in commands if "show" in command]) == 2 + len(xnames)
+
+
+def test_expand_hostlist():
+    """Test expanding hostlist expressions into node names.
+
+    """
+    assert expand_hostlist("nid[000001-000003,000007],login01") == [
+        "nid000001", "nid000002", "nid000003", "nid000007", "login01"
+    ]
+    assert expand_hostlist("nid000005") == ["nid000005"]
+    assert expand_hostlist("a[8-10],b") == ["a8", "a9", "a10", "b"]
+
+
+def test_updates_in_one_command(monkeypatch):
+    """Test that quiescing, failing and resuming several nodes runs one
+    'scontrol update' each and reaches every node.
+
+    """
+    xnames = [NodeTable.get_xname(nid) for nid in [9, 10, 11, 13]]
+    commands = count_commands(monkeypatch)
+    SlurmHandler.quiesce_many(xnames)
+    assert len(commands) == 1
+    assert commands[0][2] == "NodeName=nid[000009-000011,000013]"
+    assert all(SlurmHandler.are_quiet(xnames).values())
+    SlurmHandler.fail_many(xnames[:2], "test-failure")
+    SlurmHandler.resume_many(xnames)
+    SlurmHandler.resume_many([])
+    updates = [command for command in commands if "update" in command]
+    assert len(updates) == 3
+    assert all(SlurmHandler.are_ready(xnames).values())
+
+
+def test_single_node_updates(monkeypatch):
+    """Test that quiescing, failing and resuming one node runs the same
+    'scontrol update' as the batched versions, naming just that node.
+
+    """
+    xname = NodeTable.get_xname(14)
+    commands = count_commands(monkeypatch)
+    SlurmHandler.quiesce(xname)
+    assert SlurmHandler.is_quiet(xname)
+    SlurmHandler.fail(xname, "test-failure")
+    SlurmHandler.resume(xname)
+    assert [command for command in commands if "update" in command] == [
+        ["scontrol", "update", "NodeName=nid000014", "State=DRAIN", "Reason=rolling-upgrade"],
+        ["scontrol", "update", "NodeName=nid000014", "State=FAIL", "Reason=test-failure"],
+        ["scontrol", "update", "NodeName=nid000014", "State=RESUME"],
+    ]
+    assert SlurmHandler.is_ready(xname)
+
+
+def test_large_batches_split(monkeypatch):
+    """Test that nodes beyond WLM_COMMAND_MAX_NODES are split into
+    separate commands which together reach every node.
+
+    """
+    monkeypatch.setitem(APP.config, 'WLM_COMMAND_MAX_NODES', 2)
+    xnames = [NodeTable.get_xname(nid) for nid in range(17, 22)]
+    commands = count_commands(monkeypatch)
+    SlurmHandler.quiesce_many(xnames)
+    assert [command[2] for command in commands] == [
+        "NodeName=nid[000017-000018]", "NodeName=nid[000019-000020]", "NodeName=nid000021"
+    ]
+    quiet = SlurmHandler.are_quiet(xnames)
+    assert len(commands) == 6
+    assert sorted(quiet) == sorted(xnames)
+    assert all(quiet.values())
+    SlurmHandler.resume_many(xnames)
+    assert all(SlurmHandler.are_ready(xnames).values())
+
+
+def test_async_updates_batched(monkeypatch):
+    """Test that the coroutine versions of quiescing and resuming several
+    nodes run one 'scontrol update' each as an asyncio subprocess.
+
+    """
+    xnames = [NodeTable.get_xname(nid) for nid in [25, 26, 27, 29]]
+    commands = []
+    real_async_shell = slurm.async_shell
+
+    async def counting_async_shell(command, timeout=None):
+        """Record 'command' and run it.
+
+        """
+        commands.append(list(command))
+        return await real_async_shell(command, timeout)
+
+    monkeypatch.setattr(slurm, "async_shell", counting_async_shell)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(SlurmHandler.async_quiesce_many(xnames))
+        assert [command[2] for command in commands] == ["NodeName=nid[000025-000027,000029]"]
+        assert all(SlurmHandler.are_quiet(xnames).values())
+        loop.run_until_complete(SlurmHandler.async_resume_many(xnames))
+        loop.run_until_complete(SlurmHandler.async_resume_many([]))
+    finally:
+        loop.close()
+    assert len(commands) == 2
+    assert all(SlurmHandler.are_ready(xnames).values())
@@ -0,0 +1,127 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the Slurm REST API (slurmrestd) WLM handler
+
+"""
+import pytest
+from crus.controllers.upgrade_agent.wlm import slurm_rest, get_wlm_handler
+from crus.controllers.upgrade_agent.wlm.slurm_rest import SlurmRestHandler
+from crus.controllers.upgrade_agent.node_table import NodeTable
+from crus.controllers.upgrade_agent.errors import ComputeUpgradeError
+
+
+def count_requests(monkeypatch):
+    """Count the requests made by the Slurm REST handler.  Returns a list
+    that collects the method name and URI of each request as it is
+    made.
+
+    """
+    requests = []
+    real_do_request = slurm_rest.do_request
+
+    def counting_do_request(request_function, url, **kwargs):
+        """Record the request and make it.
+
+        """
+        requests.append((request_function.__name__, url))
+        return real_do_request(request_function, url, **kwargs)
+
+    monkeypatch.setattr(slurm_rest, "do_request", counting_do_request)
+    return requests
+
+
+def test_registered():
+    """Test that the handler is registered as the 'slurm-rest' WLM and
+    that all requests share one pooled session.
+
+    """
+    assert get_wlm_handler("slurm-rest") is SlurmRestHandler
+    session = SlurmRestHandler.session()
+    assert SlurmRestHandler.session() is session
+    assert session.headers['X-SLURM-USER-NAME']
+    for adapter in session.adapters.values():
+        assert adapter.pool_maxsize > 1
+
+
+def test_states_in_one_request(monkeypatch):
+    """Test that checking several nodes makes one request and reports the
+    state of each node.
+
+    """
+    xnames = [NodeTable.get_xname(nid) for nid in range(1, 5)]
+    requests = count_requests(monkeypatch)
+    states = SlurmRestHandler.states(xnames)
+    assert len(requests) == 1
+    assert requests[0][0] == "get"
+    assert sorted(states) == sorted(xnames)
+    for state in states.values():
+        assert "IDLE" in state
+    assert all(SlurmRestHandler.are_ready(xnames).values())
+    assert SlurmRestHandler.states([]) == {}
+
+
+def test_updates_in_one_request(monkeypatch):
+    """Test that quiescing, failing and resuming several nodes makes one
+    request each naming the nodes as a hostlist and reaches every
+    node.
+
+    """
+    xnames = [NodeTable.get_xname(nid) for nid in [9, 10, 11, 13]]
+    requests = count_requests(monkeypatch)
+    SlurmRestHandler.quiesce_many(xnames)
+    assert len(requests) == 1
+    assert requests[0][0] == "post"
+    assert requests[0][1].endswith("/node/nid[000009-000011,000013]")
+    assert all(SlurmRestHandler.are_quiet(xnames).values())
+    SlurmRestHandler.fail_many(xnames[:2], "test-failure")
+    assert "FAIL" in SlurmRestHandler.states(xnames[:1])[xnames[0]]
+    SlurmRestHandler.resume_many(xnames)
+    SlurmRestHandler.resume_many([])
+    updates = [request for request in requests if request[0] == "post"]
+    assert len(updates) == 3
+    assert all(SlurmRestHandler.are_ready(xnames).values())
+
+
+def test_single_node_operations():
+    """Test the single node operations, which use the batched requests.
+
+    """
+    xname = NodeTable.get_xname(15)
+    SlurmRestHandler.quiesce(xname)
+    assert SlurmRestHandler.is_quiet(xname)
+    SlurmRestHandler.fail(xname, "test-failure")
+    assert not SlurmRestHandler.is_quiet(xname)
+    SlurmRestHandler.resume(xname)
+    assert SlurmRestHandler.is_ready(xname)
+
+
+def test_update_error():
+    """Test that an update rejected by slurmrestd raises an error.
+
+    """
+    xname = NodeTable.get_xname(16)
+    with pytest.raises(ComputeUpgradeError):
+        slurm_rest._update_nodes(  # pylint: disable=protected-access
+            "test_update_error", [xname], {'state': ["DRAIN"]}, "quiesce"
+        )
@@ -0,0 +1,96 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the scontrol output parsers
+
+"""
+from crus.controllers.upgrade_agent.wlm.slurm_support import (
+    is_quiet_state,
+    is_ready_state,
+    parse_show_all_nodes,
+    iter_show_nodes,
+    SHOW_NODE_FIELDS
+)
+from crus.controllers.upgrade_agent.wlm.wrap_shell import shell
+from crus.controllers.upgrade_agent.node_table import NodeTable
+
+
+def test_one_line_matches():
+    """Test that the one line parser finds the same values as the multi
+    line parser for the fields it extracts, including reasons that
+    contain spaces.
+
+    """
+    xnames = [NodeTable.get_xname(nid) for nid in range(20, 24)]
+    nidnames = [NodeTable.get_nidname(xname) for xname in xnames]
+    drain = shell.shell(["scontrol", "update", "NodeName=%s" % nidnames[0],
+                         "State=DRAIN", "Reason=testing one line"])
+    assert list(drain.errors()) == []
+    multi = shell.shell(["scontrol", "show", "node", ",".join(nidnames)])
+    oneline = shell.shell(["scontrol", "-o", "show", "node", ",".join(nidnames)])
+    lines = list(multi.output())
+    nodes = parse_show_all_nodes(lines)
+    records = list(iter_show_nodes(oneline.output()))
+    assert [record['NodeName'] for record in records] == nidnames
+    for record in records:
+        nvps = nodes[record['NodeName']]
+        for name in ("State", "BootTime", "SlurmdStartTime"):
+            assert record[name] == nvps[name]
+    assert records[0]['Reason'].startswith("testing one line ")
+    assert 'Reason' not in records[1]
+    resume = shell.shell(["scontrol", "update", "NodeName=%s" % nidnames[0], "State=RESUME"])
+    assert list(resume.errors()) == []
+
+
+def test_input_unchanged():
+    """Test that parsing multi line output leaves the caller's list alone.
+
+    """
+    lines = ["NodeName=nid000001 Arch=x86_64", "   State=IDLE ThreadsPerCore=1"]
+    nodes = parse_show_all_nodes(lines)
+    assert nodes['nid000001']['State'] == "IDLE"
+    assert len(lines) == 2
+
+
+def test_requested_fields_only():
+    """Test that only the requested fields are extracted.
+
+    """
+    line = "NodeName=nid000001 Arch=x86_64 State=ALLOCATED Reason=x [root@now] CapWatts=n/a"
+    assert list(iter_show_nodes([line], fields=("State",))) == [{'State': "ALLOCATED"}]
+    record = next(iter_show_nodes(iter([line])))
+    assert set(record) <= set(SHOW_NODE_FIELDS)
+    assert record['Reason'] == "x [root@now]"
+
+
+def test_node_state_checks():
+    """Test deciding whether slurm node states are ready or quiet.
+
+    """
+    assert is_ready_state("IDLE")
+    assert not is_ready_state("IDLE*")
+    assert not is_ready_state("ALLOCATED")
+    assert is_quiet_state("IDLE+DRAIN")
+    assert is_quiet_state("DOWN+DRAIN")
+    assert not is_quiet_state("MIXED+DRAIN")
+    assert not is_quiet_state("IDLE")
@@ -0,0 +1,161 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the WLM node state snapshot shared by upgrade sessions
+
+"""
+import threading
+import pytest
+from crus.controllers.upgrade_agent.errors import ComputeUpgradeError
+from crus.controllers.upgrade_agent.wlm.state_poller import NodeStatePoller
+
+
+class FakeWLM:
+    """A stand-in for a WLM bulk state query that records the nodes asked
+    for in each query.
+
+    """
+    def __init__(self):
+        """Constructor
+
+        """
+        self.queries = []
+        self.state = "IDLE"
+
+    def fetch(self, xnames):
+        """Return the current state for each of 'xnames'.
+
+        """
+        self.queries.append(list(xnames))
+        return {xname: self.state for xname in xnames}
+
+
+def test_sessions_share_queries():
+    """Test that requests from several sessions within the staleness bound
+    are answered from one query covering all of their nodes.
+
+    """
+    wlm = FakeWLM()
+    poller = NodeStatePoller(wlm.fetch, max_age=5.0, interest=60.0)
+    assert poller.states(["x1", "x2"], now=100.0) == {"x1": "IDLE", "x2": "IDLE"}
+    # A new node forces a refresh, which also covers the earlier nodes.
+    assert poller.states(["x3"], now=101.0) == {"x3": "IDLE"}
+    assert wlm.queries[-1] == ["x1", "x2", "x3"]
+    wlm.state = "ALLOCATED"
+    for _ in range(10):
+        assert poller.states(["x1", "x3"], now=102.0) == {"x1": "IDLE", "x3": "IDLE"}
+    assert len(wlm.queries) == 2
+    # Once the snapshot is too old, it is refreshed.
+    assert poller.states(["x1"], now=106.5) == {"x1": "ALLOCATED"}
+    assert len(wlm.queries) == 3
+    assert poller.states([]) == {}
+
+
+def test_interest_expires():
+    """Test that nodes nobody has asked about recently drop out of the
+    bulk query.
+
+    """
+    wlm = FakeWLM()
+    poller = NodeStatePoller(wlm.fetch, max_age=5.0, interest=30.0)
+    poller.states(["x1"], now=0.0)
+    poller.states(["x2"], now=20.0)
+    assert wlm.queries[-1] == ["x1", "x2"]
+    poller.states(["x2"], now=40.0)
+    assert wlm.queries[-1] == ["x2"]
+
+
+def test_invalidate():
+    """Test that invalidating a changed node makes the next request for
+    it query the WLM.
+
+    """
+    wlm = FakeWLM()
+    poller = NodeStatePoller(wlm.fetch, max_age=5.0, interest=60.0)
+    poller.states(["x1", "x2"], now=0.0)
+    wlm.state = "DRAINED"
+    poller.invalidate(["x1"])
+    assert poller.states(["x2"], now=1.0) == {"x2": "IDLE"}
+    assert poller.states(["x1"], now=1.0) == {"x1": "DRAINED"}
+    assert len(wlm.queries) == 2
+
+
+def test_node_errors():
+    """Test that a node the WLM could not report on fails only the
+    requests that ask about it.
+
+    """
+    wlm = FakeWLM()
+    error = ComputeUpgradeError("node 'x2' not found")
+
+    def fetch(xnames):
+        states = wlm.fetch(xnames)
+        if "x2" in states:
+            states["x2"] = error
+        return states
+
+    poller = NodeStatePoller(fetch, max_age=5.0, interest=60.0)
+    assert poller.states(["x1"], now=0.0) == {"x1": "IDLE"}
+    with pytest.raises(ComputeUpgradeError, match="'x2' not found"):
+        poller.states(["x1", "x2"], now=1.0)
+    assert poller.states(["x1"], now=2.0) == {"x1": "IDLE"}
+    assert len(wlm.queries) == 2
+
+
+def test_query_outside_mutex():
+    """Test that the snapshot answers requests while a query is in flight,
+    that a request needing the query waits for it instead of making its
+    own, and that a node changed during the query is not kept.
+
+    """
+    wlm = FakeWLM()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_fetch(xnames):
+        if len(wlm.queries) == 1:
+            started.set()
+            assert release.wait(10.0)
+        return wlm.fetch(xnames)
+
+    poller = NodeStatePoller(slow_fetch, max_age=5.0, interest=60.0)
+    poller.states(["x1", "x2"], now=0.0)
+    results = {}
+    first = threading.Thread(
+        target=lambda: results.update(first=poller.states(["x1", "x3"], now=1.0))
+    )
+    first.start()
+    assert started.wait(10.0)
+    # x2 is still fresh, so it is answered without waiting
+    assert poller.states(["x2"], now=1.0) == {"x2": "IDLE"}
+    poller.invalidate(["x2"])
+    second = threading.Thread(
+        target=lambda: results.update(second=poller.states(["x3"], now=1.0))
+    )
+    second.start()
+    release.set()
+    first.join()
+    second.join()
+    assert results == {"first": {"x1": "IDLE", "x3": "IDLE"}, "second": {"x3": "IDLE"}}
+    assert len(wlm.queries) == 2
+    assert "x2" not in poller.snapshot
@@ -0,0 +1,121 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of composing the steps of an upgrade across the topology of
+the nodes.
+
+"""
+from collections import Counter
+import pytest
+from crus.models.upgrade_plan import UpgradePlan
+from crus.models.upgrade_session import QUIESCING
+from crus.controllers.upgrade_agent.upgrade_agent import start_watching
+from crus.controllers.upgrade_agent.errors import ComputeUpgradeError
+from crus.controllers.upgrade_agent.node_table import NodeTable
+from crus.controllers.upgrade_agent.step_layout import (
+    spread_by_topology,
+    compose_steps
+)
+from tests.controllers import test_compute_upgrade as scenarios
+
+
+def _steps(nodes, boundaries):
+    """Utility - split 'nodes' into steps at 'boundaries'.
+
+    """
+    ends = boundaries[1:] + [len(nodes)]
+    return [nodes[first:end] for first, end in zip(boundaries, ends)]
+
+
+def test_spread_by_topology():
+    """Test that spreading the nodes of the unit test system (16
+    cabinets of 4 chassis of 4 slots of 8 nodes) puts consecutive
+    nodes in different cabinets, chassis and slots.
+
+    """
+    xnames = NodeTable.get_all_xnames()
+    spread = spread_by_topology(xnames)
+    assert sorted(spread) == sorted(xnames)
+    for first in range(0, len(spread), 16):
+        cabinets = {NodeTable.get_topology(xname)[0] for xname in spread[first:first + 16]}
+        assert len(cabinets) == 16
+    for first in range(0, len(spread), 256):
+        slots = {NodeTable.get_topology(xname)[:3] for xname in spread[first:first + 256]}
+        assert len(slots) == 256
+    # Nodes in one slot keep their order.
+    assert [xname for xname in spread if xname.startswith("x3c1s2b0")] == \
+        ["x3c1s2b0n%d" % node for node in range(0, 8)]
+
+
+def test_compose_steps():
+    """Test that steps are consecutive nodes without a cabinet limit,
+    and hold no more than the limit from any cabinet with one.
+
+    """
+    xnames = NodeTable.get_all_xnames()[0:300]
+    assert compose_steps(xnames, 64) == (xnames, [0, 64, 128, 192, 256])
+    nodes, boundaries = compose_steps(xnames, 16, 4)
+    assert sorted(nodes) == sorted(xnames)
+    steps = _steps(nodes, boundaries)
+    for step in steps:
+        counts = Counter(NodeTable.get_topology(xname)[0] for xname in step)
+        assert max(counts.values()) <= 4
+    # Cabinets 0 and 1 are full (128 nodes each), cabinet 2 has the
+    # last 44, so each step takes 4 from each until cabinet 2 runs out.
+    assert [len(step) for step in steps] == [12] * 11 + [8] * 21
+    assert steps[0][0:4] == xnames[0:4]
+
+
+def test_unknown_node():
+    """Test that composing steps with a node that is not in the node
+    table fails with a ComputeUpgradeError naming the node.
+
+    """
+    xnames = NodeTable.get_all_xnames()[0:4] + ["x9999c0s0b0n0"]
+    with pytest.raises(ComputeUpgradeError, match="x9999c0s0b0n0"):
+        spread_by_topology(xnames)
+    with pytest.raises(ComputeUpgradeError, match="x9999c0s0b0n0"):
+        compose_steps(xnames, 2, 1)
+
+
+def test_spread_plan(monkeypatch):
+    """Test that an upgrade with 'spread' steps limited to one node per
+    cabinet plans steps across the cabinets and completes.
+
+    """
+    monkeypatch.setitem(scenarios.SESSION_OPTIONS, 'step_composition', "spread")
+    monkeypatch.setitem(scenarios.SESSION_OPTIONS, 'max_per_cabinet', 1)
+    queue, pending = start_watching()
+    xnames, _ = scenarios.setup_nodes([0, 1, 32, 33, 128, 129], [])
+    upgrade_id = scenarios.initiate_upgrade(xnames)
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending, stage=QUIESCING, step=0)
+    plan = UpgradePlan.get(upgrade_id)
+    assert _steps(plan.get_nodes(), plan.boundaries) == [
+        ["x0c0s0b0n0", "x1c0s0b0n0"],
+        ["x0c1s0b0n0", "x1c0s0b0n1"],
+        ["x0c0s0b0n1"],
+        ["x0c1s0b0n1"],
+    ]
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending)
+    scenarios.verify_failed_nodes(upgrade_id, [])
+    scenarios.delete_upgrade(upgrade_id, queue, pending)
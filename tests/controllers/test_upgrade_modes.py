@@ -0,0 +1,260 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the upgrade modes other than 'serial' and of direct
+dispatch, running the compute upgrade scenarios from
+test_compute_upgrade.py in each mode, followed by tests of the
+behavior particular to each mode.
+
+"""
+import time
+import pytest
+from crus.app import APP
+from crus.models.upgrade_session import (
+    ComputeUpgradeProgress,
+    UpgradeSession,
+    STARTING,
+    QUIESCED,
+    BOOTING,
+    PIPELINED,
+    STREAMED,
+    SLIDING,
+    STREAMING,
+    CLEANUP,
+    NODE_DRAINING,
+    NODE_BOOTING,
+    NODE_WAITING,
+    NODE_DONE,
+    NODE_FAILED
+)
+from crus.controllers.upgrade_agent import upgrade_agent
+from crus.controllers.upgrade_agent.upgrade_agent import start_watching
+from crus.controllers.mocking.slurm.slurm_state import SlurmNodeTable
+from crus.controllers.upgrade_agent.node_table import NodeTable
+from tests.controllers import test_compute_upgrade as scenarios
+
+# The window size used in 'sliding' mode.
+MAX_IN_FLIGHT = 4
+
+# The upgrade session options and agent configuration settings used
+# in each mode.  'direct' is 'serial' mode with the next stage run
+# directly when a stage advances a session (AGENT_DIRECT_DISPATCH).
+MODES = {
+    "pipelined": ({'upgrade_mode': PIPELINED}, {}),
+    "streaming": ({'upgrade_mode': STREAMED}, {}),
+    "sliding": ({'upgrade_mode': SLIDING, 'max_in_flight': MAX_IN_FLIGHT}, {}),
+    "direct": ({}, {'AGENT_DIRECT_DISPATCH': 8}),
+}
+
+# The modes that take each step through the QUIESCED and BOOTING
+# stages, as 'serial' mode does.
+STEPPED_MODES = ["pipelined", "direct"]
+
+# The scenarios that apply to every mode.
+SCENARIOS = [
+    "test_simple_upgrade",
+    "test_upgrade_half_fail",
+    "test_upgrade_half_fail_some_busy",
+    "test_upgrade_all_boot_sessions_fail",
+]
+
+
+@pytest.fixture(params=sorted(MODES))
+def mode(request, monkeypatch):
+    """Run the compute upgrade scenarios in each mode in MODES (or, when
+    used indirectly, the modes given).
+
+    """
+    options, settings = MODES[request.param]
+    for name, value in options.items():
+        monkeypatch.setitem(scenarios.SESSION_OPTIONS, name, value)
+    for name, value in settings.items():
+        monkeypatch.setitem(APP.config, name, value)
+    return request.param
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_scenario(mode, scenario):  # pylint: disable=unused-argument,redefined-outer-name
+    """Run each of the mode independent scenarios in each mode.
+
+    """
+    getattr(scenarios, scenario)()
+
+
+@pytest.mark.parametrize("mode", STEPPED_MODES, indirect=True)
+def test_delete_booting(mode):  # pylint: disable=unused-argument,redefined-outer-name
+    """Run the delete after booting scenario in the modes that have a
+    BOOTING stage.
+
+    """
+    scenarios.test_delete_after_booting()
+
+
+@pytest.mark.parametrize("mode", ["pipelined"], indirect=True)
+def test_lookahead_drain(mode):  # pylint: disable=unused-argument,redefined-outer-name
+    """Test that, while the first step boots, the nodes of the second
+    step (and only those) are already draining, then run the session
+    to completion.
+
+    """
+    queue, pending = start_watching()
+    success_xnames, _ = scenarios.setup_nodes([nid + 1 for nid in range(0, 7)], [])
+    upgrade_id = scenarios.initiate_upgrade(success_xnames)
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending, stage=BOOTING, step=0)
+    assert UpgradeSession.get(upgrade_id).upgrade_mode == PIPELINED
+    progress = ComputeUpgradeProgress.get(upgrade_id)
+    assert progress.lookahead_step == 1
+    for xname in success_xnames[3:6]:
+        _, substate, _ = SlurmNodeTable.get_state(NodeTable.get_nidname(xname))
+        assert substate == "DRAIN"
+    for xname in success_xnames[6:]:
+        _, substate, _ = SlurmNodeTable.get_state(NodeTable.get_nidname(xname))
+        assert substate is None
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending)
+    scenarios.verify_failed_nodes(upgrade_id, [])
+    scenarios.delete_upgrade(upgrade_id, queue, pending)
+
+
+@pytest.mark.parametrize("mode", ["streaming"], indirect=True)
+def test_straggler(mode):  # pylint: disable=unused-argument,redefined-outer-name
+    """Test that the other nodes in a step boot while one node in the step
+    is still busy, then run the session to completion.
+
+    """
+    queue, pending = start_watching()
+    xnames, _ = scenarios.setup_nodes([nid + 1 for nid in range(0, 6)], [])
+    straggler = xnames[0]
+    nidname = NodeTable.get_nidname(straggler)
+    for _ in range(50):
+        SlurmNodeTable.add_pending_state(nidname, "ALLOCATED")
+    SlurmNodeTable.add_pending_state(nidname, "IDLE")
+    upgrade_id = scenarios.initiate_upgrade(xnames)
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending, stage=STREAMING)
+
+    def others_moved_on():
+        progress = ComputeUpgradeProgress.get(upgrade_id)
+        states = progress.node_states
+        return (
+            states[straggler][0] == NODE_DRAINING and
+            all(states[xname][0] in (NODE_BOOTING, NODE_WAITING, NODE_DONE)
+                for xname in xnames[1:3])
+        )
+
+    timeout = time.time() + 60
+    while not others_moved_on():
+        assert time.time() < timeout
+        scenarios.process_upgrade(queue, pending)
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending)
+    scenarios.verify_failed_nodes(upgrade_id, [])
+    scenarios.delete_upgrade(upgrade_id, queue, pending)
+
+
+@pytest.mark.parametrize("mode", ["streaming"], indirect=True)
+def test_delete_streaming(mode):  # pylint: disable=unused-argument,redefined-outer-name
+    """Test that deleting a streaming session part way through its second
+    step works correctly.
+
+    """
+    queue, pending = start_watching()
+    xnames, _ = scenarios.setup_nodes([nid + 1 for nid in range(0, 20)], [])
+    upgrade_id = scenarios.initiate_upgrade(xnames)
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending, stage=STREAMING, step=1)
+    scenarios.delete_upgrade(upgrade_id, queue, pending)
+
+
+@pytest.mark.parametrize("mode", ["sliding"], indirect=True)
+def test_window_stays_full(mode):  # pylint: disable=unused-argument,redefined-outer-name
+    """Test that the window never holds more than max_in_flight nodes,
+    that every node goes through it and that the session runs to
+    completion.
+
+    """
+    queue, pending = start_watching()
+    xnames, _ = scenarios.setup_nodes([nid + 1 for nid in range(0, 10)], [])
+    upgrade_id = scenarios.initiate_upgrade(xnames)
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending, stage=STREAMING)
+    timeout = time.time() + 60
+    while True:
+        progress = ComputeUpgradeProgress.get(upgrade_id)
+        if progress.stage == CLEANUP:
+            break
+        in_flight = [
+            xname for xname, state in progress.node_states.items()
+            if state[0] not in (NODE_DONE, NODE_FAILED)
+        ]
+        assert len(in_flight) <= MAX_IN_FLIGHT
+        assert progress.admitted <= len(xnames)
+        assert time.time() < timeout
+        scenarios.process_upgrade(queue, pending)
+    assert progress.admitted == len(xnames)
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending)
+    scenarios.verify_failed_nodes(upgrade_id, [])
+    scenarios.delete_upgrade(upgrade_id, queue, pending)
+
+
+@pytest.mark.parametrize("mode", ["sliding"], indirect=True)
+def test_delete_sliding(mode):  # pylint: disable=unused-argument,redefined-outer-name
+    """Test that deleting a sliding window session part way through
+    fails the nodes that have not finished and cleans up.
+
+    """
+    queue, pending = start_watching()
+    xnames, _ = scenarios.setup_nodes([nid + 1 for nid in range(0, 20)], [])
+    upgrade_id = scenarios.initiate_upgrade(xnames)
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending, stage=STREAMING)
+    scenarios.delete_upgrade(upgrade_id, queue, pending)
+
+
+@pytest.mark.parametrize("mode", ["direct"], indirect=True)
+def test_stages_chain(mode, monkeypatch):  # pylint: disable=unused-argument,redefined-outer-name
+    """Test that the pass that starts a session runs the following stages
+    in the same pass, as long as they need no wait, and never stops at
+    QUIESCED, which always moves on to booting right away.
+
+    """
+    stages = []
+    run_stage = upgrade_agent.run_stage
+
+    def recording_run_stage(upgrade_session, upgrade_progress):
+        stages.append(upgrade_progress.stage)
+        return run_stage(upgrade_session, upgrade_progress)
+
+    monkeypatch.setattr(upgrade_agent, "run_stage", recording_run_stage)
+    queue, pending = start_watching()
+    xnames, _ = scenarios.setup_nodes([nid + 1 for nid in range(0, 6)], [])
+    upgrade_id = scenarios.initiate_upgrade(xnames)
+    timeout = time.time() + 60
+    while True:
+        progress = ComputeUpgradeProgress.get(upgrade_id)
+        if progress is not None and progress.stage != STARTING:
+            break
+        assert time.time() < timeout
+        del stages[:]
+        upgrade_agent.process_upgrade(queue, pending)
+    # The pass that left STARTING went on to run (at least) QUIESCING
+    assert stages[0] == STARTING
+    assert len(stages) > 1
+    assert progress.stage != QUIESCED
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending)
+    scenarios.verify_failed_nodes(upgrade_id, [])
+    scenarios.delete_upgrade(upgrade_id, queue, pending)
@@ -0,0 +1,90 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the frozen upgrade plan of an upgrade session.
+
+"""
+from crus.models.upgrade_plan import UpgradePlan
+from crus.models.upgrade_session import QUIESCING
+from crus.controllers.upgrade_agent import upgrade_agent
+from crus.controllers.upgrade_agent.upgrade_agent import start_watching
+from crus.controllers.upgrade_agent.node_group import NodeGroup
+from tests.controllers import test_compute_upgrade as scenarios
+
+
+def test_step_nodes():
+    """Test that the steps of a plan are cut at its boundaries.
+
+    """
+    nodes = ["x%d" % i for i in range(0, 7)]
+    plan = UpgradePlan(upgrade_id="test-plan", boundaries=[0, 3, 6])
+    plan.set_nodes(nodes)
+    assert plan.get_nodes() == nodes
+    assert plan.step_nodes(0) == nodes[0:3]
+    assert plan.step_nodes(1) == nodes[3:6]
+    assert plan.step_nodes(2) == nodes[6:]
+    assert plan.step_nodes(3) == []
+    assert plan.nodes_from(1) == nodes[3:]
+    assert plan.nodes_from(3) == []
+    empty = UpgradePlan(upgrade_id="test-empty-plan")
+    assert empty.get_nodes() == []
+    assert empty.step_nodes(0) == []
+    assert empty.nodes_from(0) == []
+
+
+def test_plan_is_frozen():
+    """Test that removing a node from the starting node group part way
+    through an upgrade does not change the steps of the upgrade, and
+    that the plan is removed with the session.
+
+    """
+    queue, pending = start_watching()
+    xnames, _ = scenarios.setup_nodes([nid + 1 for nid in range(0, 7)], [])
+    upgrade_id = scenarios.initiate_upgrade(xnames)
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending, stage=QUIESCING, step=1)
+    NodeGroup("test-starting").remove_member(xnames[0])
+    plan = UpgradePlan.get(upgrade_id)
+    assert plan.get_nodes() == xnames
+    assert plan.step_nodes(1) == xnames[3:6]
+    assert plan.step_nodes(2) == xnames[6:]
+    scenarios.wait_for_upgrade(upgrade_id, queue, pending)
+    scenarios.verify_failed_nodes(upgrade_id, [])
+    scenarios.delete_upgrade(upgrade_id, queue, pending)
+    assert UpgradePlan.get(upgrade_id) is None
+
+
+def test_plan_cache_bounded(monkeypatch):
+    """Test that only the most recently used plans are cached.
+
+    """
+    # pylint: disable=protected-access
+    monkeypatch.setattr(upgrade_agent, "MAX_CACHED_PLANS", 2)
+    monkeypatch.setattr(upgrade_agent, "_PLANS", type(upgrade_agent._PLANS)())
+    plans = {upgrade_id: UpgradePlan(upgrade_id=upgrade_id) for upgrade_id in ["a", "b", "c"]}
+    upgrade_agent._cache_plan("a", plans["a"])
+    upgrade_agent._cache_plan("b", plans["b"])
+    assert upgrade_agent._cached_plan("a") is plans["a"]
+    upgrade_agent._cache_plan("c", plans["c"])
+    assert upgrade_agent._cached_plan("b") is None
+    assert upgrade_agent._cached_plan("a") is plans["a"]
+    assert upgrade_agent._cached_plan("c") is plans["c"]
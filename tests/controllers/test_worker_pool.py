@@ -0,0 +1,137 @@
+#
+# MIT License
+#
+# (C) Copyright 2022 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Tests of the upgrade session worker pool used by the Compute
+Rolling Upgrade Agent.
+
+"""
+import threading
+import time
+from crus.controllers.upgrade_agent.worker_pool import SessionWorkerPool
+from crus.controllers.upgrade_agent.upgrade_agent import (
+    dispatch_upgrade,
+    handle_session
+)
+from tests.controllers import test_compute_upgrade as scenarios
+
+
+class FakeSession:  # pylint: disable=too-few-public-methods
+    """Stand-in for an upgrade session event, only the Upgrade ID is
+    needed by the pool.
+
+    """
+    def __init__(self, upgrade_id):
+        self.upgrade_id = upgrade_id
+
+
+class Recorder:
+    """Handler that records how many sessions are being handled at once,
+    both overall and per Upgrade ID.
+
+    """
+    def __init__(self, delay):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = 0
+        self.max_per_id = 0
+        self.handled = []
+
+    def __call__(self, upgrade_session):
+        upgrade_id = upgrade_session.upgrade_id
+        with self.lock:
+            self.running[upgrade_id] = self.running.get(upgrade_id, 0) + 1
+            self.max_per_id = max(self.max_per_id, self.running[upgrade_id])
+            self.max_running = max(self.max_running, sum(self.running.values()))
+        time.sleep(self.delay)
+        with self.lock:
+            self.running[upgrade_id] -= 1
+            self.handled.append(upgrade_id)
+
+
+def test_sessions_overlap():
+    """Test that different sessions are handled concurrently, bounded by
+    the number of workers.
+
+    """
+    recorder = Recorder(0.1)
+    pool = SessionWorkerPool(recorder, 3)
+    for upgrade_id in ["a", "b", "c", "d", "e", "f"]:
+        pool.submit(FakeSession(upgrade_id))
+    assert pool.wait_idle(timeout=10)
+    assert not pool.busy()
+    assert sorted(recorder.handled) == ["a", "b", "c", "d", "e", "f"]
+    assert recorder.max_running > 1
+    assert recorder.max_running <= 3
+    pool.shutdown()
+
+
+def test_one_worker_per_session():
+    """Test that events for the same session are never handled by two
+    workers at once and that events arriving while a session is busy
+    collapse into a single follow-up pass.
+
+    """
+    recorder = Recorder(0.1)
+    pool = SessionWorkerPool(recorder, 4)
+    assert pool.submit(FakeSession("a"))
+    assert not pool.submit(FakeSession("a"))
+    assert not pool.submit(FakeSession("a"))
+    assert pool.wait_idle(timeout=10)
+    assert recorder.max_per_id == 1
+    assert recorder.handled == ["a", "a"]
+    pool.shutdown()
+
+
+def test_handler_failure():
+    """Test that an exception in the handler does not stall the pool.
+
+    """
+    def explode(upgrade_session):
+        raise RuntimeError("boom in %s" % upgrade_session.upgrade_id)
+
+    pool = SessionWorkerPool(explode, 1)
+    pool.submit(FakeSession("a"))
+    pool.submit(FakeSession("b"))
+    assert pool.wait_idle(timeout=10)
+    pool.shutdown()
+
+
+def test_pooled_upgrade(monkeypatch):
+    """Test that an upgrade session runs to completion when its events are
+    processed by the worker pool.
+
+    """
+    pool = SessionWorkerPool(None, 4)
+
+    def pooled_process_upgrade(queue, pending):
+        """Drop in for process_upgrade() that uses the pool.
+
+        """
+        pool.handler = lambda upgrade_session: handle_session(upgrade_session, pending)
+        dispatch_upgrade(queue, pending, pool)
+        pool.wait_idle(timeout=60)
+
+    monkeypatch.setattr(scenarios, "process_upgrade", pooled_process_upgrade)
+    scenarios.test_upgrade_half_fail()
+    pool.shutdown()